@@ -2,12 +2,21 @@
 
 #  Copyright (c) 2019 AgentElement
 
-from src.generator import JuliaGenerator, MandelbrotGenerator
-from src.imager import Imager
-from src.color_functions import color_function_dict
+from src.generator import DTYPES, DeepMandelbrotGenerator, JuliaGenerator, MandelbrotGenerator, warmup
+from src.imager import Imager, frame_name, write_image
+from src.instrumentation import Timings
+from src.color_functions import build_palette, color_function_dict
+from src.precision import PRECISIONS
+from src.sweep import circle_path, line_path
+from src.tile_cache import TileCache
+from PIL import Image
 import time
+import os
 import sys
 import argparse
+import cProfile
+import json
+import pstats
 import re
 
 
@@ -18,13 +27,19 @@ def convert_to_complex(z):
     return complex(z)
 
 
-def parse():
+def complex_string(z):
+    # Checks that z is a complex number, but keeps all of its digits.
+    convert_to_complex(z)
+    return z
+
+
+def parse(argv=None):
     parser = argparse.ArgumentParser()
 
     parser.add_argument('-f', '--focus',
                         help='Focus of the generator.',
                         required=True,
-                        type=convert_to_complex)
+                        type=complex_string)
 
     generator = parser.add_mutually_exclusive_group(required=True)
 
@@ -69,6 +84,11 @@ def parse():
                         choices=color_function_dict.keys(),
                         default='linear')
 
+    parser.add_argument('--freeze-histogram',
+                        help='With the \'histogram\' color function and --sequence, colors every frame with the '
+                             'histogram of the first one, so that colors don\'t flicker.',
+                        action='store_true')
+
     parser.add_argument('--cutoff',
                         help='Number of iterations after which the colorization function repeats itself. '
                              'Only used when the \'sin\' option is selected as the color function.',
@@ -80,6 +100,142 @@ def parse():
                         default=[1920, 1080],
                         type=int)
 
+    parser.add_argument('--sequence',
+                        help='Renders a zoom of FRAMES frames, starting at --zoom and zooming in by one step every '
+                             'frame, or a sweep of FRAMES julia sets with --sweep-line or --sweep-circle. '
+                             'The frames are saved as NAME_000, NAME_001, ...',
+                        type=int,
+                        metavar='FRAMES')
+
+    parser.add_argument('--frame-range',
+                        help='With --sequence, only renders frames START to STOP - 1 of the FRAMES frames. '
+                             'Saved frames keep their number in the whole sequence.',
+                        nargs=2,
+                        type=int,
+                        metavar=('START', 'STOP'))
+
+    parser.add_argument('--video',
+                        help='With --sequence, encodes the frames into the video FILE (.mp4, .mkv, .mov, .webm, '
+                             '.avi or .gif) as they are rendered, with ffmpeg if it is on the PATH and imageio '
+                             'otherwise. The video plays at --framerate, or 30 frames per second.',
+                        metavar='FILE')
+
+    sweep = parser.add_mutually_exclusive_group()
+
+    sweep.add_argument('--sweep-line',
+                       help='With --julia and --sequence, renders the julia sets of c moving in a straight line '
+                            'from C to END, instead of a zoom.',
+                       type=convert_to_complex,
+                       metavar='END')
+
+    sweep.add_argument('--sweep-circle',
+                       help='With --julia and --sequence, renders the julia sets of c moving once around a circle '
+                            'centered on CENTER and going through C, instead of a zoom.',
+                       type=convert_to_complex,
+                       metavar='CENTER')
+
+    parser.add_argument('--workers',
+                        help='Number of threads used to render the image. Defaults to the number of cores.',
+                        type=int)
+
+    parser.add_argument('--no-interior-check',
+                        help='Iterate every point up to the iteration limit, even ones that are known to be '
+                             'in the set. With --precision float64, matches the output of older versions '
+                             'exactly.',
+                        action='store_false',
+                        dest='interior_check')
+
+    parser.add_argument('--no-symmetry',
+                        help='Compute every pixel, instead of copying the pixels whose mirror image (about the real '
+                             'axis for mandelbrot sets, about 0 for julia sets) is also in the image.',
+                        action='store_false',
+                        dest='symmetry')
+
+    parser.add_argument('--precision',
+                        help='Arithmetic used to compute the image. By default, float32 is used at shallow zooms, '
+                             'and double-double (about 32 digits) once pixels are too close together for float64.',
+                        choices=PRECISIONS,
+                        default='auto')
+
+    parser.add_argument('--dtype',
+                        help='Type of the iteration counts. By default, the smallest type that holds --iterations.',
+                        choices=DTYPES,
+                        default='auto')
+
+    parser.add_argument('--smooth',
+                        help='Colors continuous escape counts instead of whole iterations, which removes the '
+                             'bands of constant color.',
+                        action='store_true')
+
+    parser.add_argument('--antialias',
+                        help='Anti-aliases the edges of the image: pixels whose iteration count differs strongly '
+                             'from a neighbour\'s get SAMPLES jittered subsamples, and are colored with the mean '
+                             'color of their samples.',
+                        type=int,
+                        default=0,
+                        metavar='SAMPLES')
+
+    parser.add_argument('--sample-budget',
+                        help='Maximum number of subsamples of --antialias per image. Defaults to half the number '
+                             'of pixels. The edges with the most contrast are refined first.',
+                        type=int,
+                        metavar='N')
+
+    parser.add_argument('--deep',
+                        help='Renders the mandelbrot set by perturbation around the focus, which can have any '
+                             'number of digits. Use for zooms past 45.',
+                        action='store_true')
+
+    parser.add_argument('--subdivide',
+                        help='Only compute the borders of regions with a constant number of iterations, '
+                             'and fill them in.',
+                        action='store_true')
+
+    parser.add_argument('--verify-subdivision',
+                        help='Print the number of pixels that differ between --subdivide and a full render.',
+                        action='store_true')
+
+    parser.add_argument('--cache',
+                        help='Directory in which computed tiles are cached. Images that share tiles with earlier '
+                             'images (same focus, zoom and iterations) are only partially computed.',
+                        metavar='DIR')
+
+    parser.add_argument('--cache-size',
+                        help='Maximum size of the cache in megabytes. Defaults to 1024.',
+                        type=int,
+                        default=1024,
+                        metavar='MB')
+
+    parser.add_argument('--cache-compress',
+                        help='Compresses the cached tiles.',
+                        action='store_true')
+
+    parser.add_argument('--resume',
+                        help='Keeps the orbits of the pixels that haven\'t escaped in FILE. If FILE holds the same '
+                             'image with fewer iterations, only those pixels are iterated further.',
+                        metavar='FILE')
+
+    parser.add_argument('--stream',
+                        help='Renders the image to NAME (a PNG file) in horizontal strips, without ever holding '
+                             'the whole image in memory. Use for images larger than the memory.',
+                        action='store_true')
+
+    parser.add_argument('--memory',
+                        help='Memory used by a strip of --stream, in megabytes. Defaults to 256.',
+                        type=int,
+                        default=256,
+                        metavar='MB')
+
+    parser.add_argument('--raw',
+                        help='With --stream, also writes the iteration counts to FILE, as a (height, width) '
+                             'numpy array.',
+                        metavar='FILE')
+
+    parser.add_argument('--fused',
+                        help='Color each pixel as soon as it is computed instead of storing the iteration counts. '
+                             'Uses less memory.',
+                        action='store_true')
+
     parser.add_argument('--save',
                         help='Saves the image as NAME',
                         dest='NAME')
@@ -89,10 +245,31 @@ def parse():
                         action='store_true')
 
     parser.add_argument('--time',
-                        help='Return the required time to compute an image',
+                        help='Return the required time to compute an image, and the time spent in every stage',
+                        action='store_true')
+
+    parser.add_argument('--time-json',
+                        help='Saves the time spent in every stage in FILE, as JSON.',
+                        metavar='FILE')
+
+    parser.add_argument('--stats',
+                        help='Counts the iterations executed, the pixels that reached the iteration limit and '
+                             'the cost of every tile, and prints them. Every pixel is computed in float64, without '
+                             '--subdivide, --cache, symmetry or float32 lanes, so both the counters and the time '
+                             'are those of an unoptimised render.',
                         action='store_true')
 
-    args = sys.argv
+    parser.add_argument('--cost-map',
+                        help='Saves the number of iterations executed for every tile as a grayscale image, '
+                             'where white is the most expensive tile.',
+                        metavar='FILE')
+
+    parser.add_argument('--profile',
+                        help='Profiles the render with cProfile, prints the slowest functions and saves the '
+                             'statistics in FILE. Use with --workers 1 to profile the kernels.',
+                        metavar='FILE')
+
+    args = list(sys.argv[1:] if argv is None else argv)
 
     for i, j in enumerate(args):
         if len(j) < 2:
@@ -100,21 +277,294 @@ def parse():
         if (j[1].isdigit() or j[1] == '.') and j[0] == '-':
             args[i] = '@' + j[1:]
 
-    return parser.parse_args(args[1:])
+    parsed = parser.parse_args(args)
+    if parsed.deep and (not parsed.mandelbrot or parsed.subdivide or parsed.verify_subdivision):
+        parser.error('--deep only renders mandelbrot sets, and can\'t be used with --subdivide')
+    if parsed.resume is not None and (parsed.deep or parsed.fused):
+        parser.error('--resume can\'t be used with --deep or --fused')
+    if parsed.stream and (parsed.NAME is None or not parsed.NAME.lower().endswith('.png')):
+        parser.error('--stream needs --save with a .png file')
+    if parsed.stream and (parsed.sequence is not None or parsed.resume is not None or parsed.fused):
+        parser.error('--stream can\'t be used with --sequence, --resume or --fused')
+    if parsed.raw is not None and not parsed.stream:
+        parser.error('--raw needs --stream')
+    if (parsed.stats or parsed.cost_map is not None) and \
+            (parsed.deep or parsed.fused or parsed.stream or parsed.sequence is not None or parsed.resume is not None):
+        parser.error('--stats and --cost-map can\'t be used with --deep, --fused, --stream, --sequence or --resume')
+    if parsed.smooth and (parsed.deep or parsed.stream or parsed.sequence is not None or parsed.resume is not None
+                          or parsed.stats or parsed.cost_map is not None):
+        parser.error('--smooth can\'t be used with --deep, --stream, --sequence, --resume, --stats or --cost-map')
+    if parsed.antialias and (parsed.deep or parsed.stream or parsed.sequence is not None or parsed.smooth):
+        parser.error('--antialias can\'t be used with --deep, --stream, --sequence or --smooth')
+    if parsed.color == 'histogram' and (parsed.fused or parsed.stream):
+        parser.error('The histogram color function needs the whole frame, and can\'t be used with --fused or --stream')
+    if parsed.sequence is not None and (parsed.deep or (parsed.NAME is None and parsed.video is None)):
+        parser.error('--sequence needs --save or --video, and can\'t be used with --deep')
+    if (parsed.frame_range is not None or parsed.video is not None) and parsed.sequence is None:
+        parser.error('--frame-range and --video need --sequence')
+    if parsed.frame_range is not None and not 0 <= parsed.frame_range[0] < parsed.frame_range[1] <= parsed.sequence:
+        parser.error('--frame-range needs 0 <= START < STOP <= FRAMES')
+    if parsed.video is not None:
+        # Imported only for videos, to keep plain renders starting fast
+        from src.video import is_video
+        if not is_video(parsed.video):
+            parser.error('--video needs a .mp4, .mkv, .mov, .webm, .avi or .gif file')
+    if (parsed.sweep_line is not None or parsed.sweep_circle is not None) and \
+            (parsed.c is None or parsed.sequence is None or parsed.subdivide or parsed.cache is not None
+             or parsed.resume is not None or parsed.fused or parsed.antialias):
+        parser.error('--sweep-line and --sweep-circle need --julia and --sequence, and can\'t be used with '
+                     '--subdivide, --cache, --resume, --fused or --antialias')
+
+    return parsed
+
+
+def parse_batch(argv):
+    parser = argparse.ArgumentParser(description='Renders every job of a manifest on a pool of processes.')
+
+    parser.add_argument('--batch',
+                        help='JSON lines (.jsonl) or CSV file with one job per line. Keys are the long names of '
+                             'the options above, and every job needs a \'save\' path.',
+                        required=True,
+                        metavar='MANIFEST')
 
+    parser.add_argument('--processes',
+                        help='Number of worker processes. Defaults to the number of cores.',
+                        type=int)
 
-def main():
-    args = parse()
+    parser.add_argument('--summary',
+                        help='JSON file receiving the time and result of every job. '
+                             'Defaults to MANIFEST_summary.json',
+                        metavar='FILE')
+
+    return parser.parse_args(argv)
+
+
+def parse_serve(argv):
+    from src.tile_server import DEFAULT_ITERATIONS
 
+    parser = argparse.ArgumentParser(description='Serves the sets as map tiles, /{mandelbrot,julia}/{z}/{x}/{y}.png. '
+                                                 'Tiles take the iterations, color and (julia) c query parameters.')
+
+    parser.add_argument('--serve',
+                        help='Runs the tile server until interrupted.',
+                        action='store_true',
+                        required=True)
+
+    parser.add_argument('--host',
+                        help='Address to listen on. Defaults to 127.0.0.1, which only accepts local connections.',
+                        default='127.0.0.1')
+
+    parser.add_argument('--port',
+                        help='Port to listen on. Defaults to 8000.',
+                        type=int,
+                        default=8000)
+
+    parser.add_argument('--threads',
+                        help='Number of tiles rendered at once. Defaults to the number of cores.',
+                        type=int)
+
+    parser.add_argument('--lru',
+                        help='Memory used to keep encoded tiles, in megabytes. Defaults to 64.',
+                        type=int,
+                        default=64,
+                        metavar='MB')
+
+    parser.add_argument('--iterations',
+                        help='Iteration limit of tiles that don\'t set one. Defaults to {}.'.format(DEFAULT_ITERATIONS),
+                        type=int,
+                        default=DEFAULT_ITERATIONS)
+
+    parser.add_argument('--color',
+                        help='Color function of tiles that don\'t set one.',
+                        choices=[name for name, function in color_function_dict.items()
+                                 if function is not None and name != 'histogram'],
+                        default='linear')
+
+    parser.add_argument('--verbose',
+                        help='Logs every request.',
+                        action='store_true')
+
+    return parser.parse_args(argv)
+
+
+def serve(argv):
+    # The server is only imported when it runs, to keep plain renders starting fast
+    from src.tile_server import TileRenderer, make_server
+
+    args = parse_serve(argv)
+    warmup()
+
+    renderer = TileRenderer(threads=args.threads, max_bytes=args.lru << 20, iterations=args.iterations,
+                            color=args.color)
+    server = make_server(renderer, host=args.host, port=args.port, verbose=args.verbose)
+    print('Serving tiles on http://{}:{}/mandelbrot/0/0/0.png, statistics on /stats'.format(*server.server_address))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        renderer.close()
+        print(json.dumps(renderer.stats(), indent=2))
+
+
+def render_job(job):
+    """
+    Renders one job of a batch manifest. Jobs render on a single thread unless
+    they set 'workers', since the batch already runs one job per core.
+
+    :param job: Dictionary of options
+    :return: Path of the saved image
+    """
+
+    from src.batch import job_arguments
+
+    job = dict({'workers': 1}, **job)
+    args = parse(job_arguments(job) + ['--hide'])
+    if args.NAME is None:
+        raise ValueError('The job has no \'save\' path')
+
+    render(args)
+    return args.NAME
+
+
+def batch(argv):
+    # Imported only for batches, to keep plain renders starting fast
+    from src.batch import read_manifest, run_batch
+
+    args = parse_batch(argv)
+    summary = args.summary
+    if summary is None:
+        summary = os.path.splitext(args.batch)[0] + '_summary.json'
+
+    report = run_batch(render_job, read_manifest(args.batch), processes=args.processes, initializer=warmup,
+                       summary=summary)
+
+    print('{} jobs rendered in {} seconds, {} failed. Summary saved as {}'.format(
+        report['jobs'], report['seconds'], report['failed'], summary))
+
+
+def render(args):
     start_time = time.time()
 
-    if args.mandelbrot:
+    profiler = None
+    if args.profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        with Timings() as timings:
+            description, cache, image = render_image(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+    total = time.time() - start_time
+
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+
+    if args.time:
+        print('{} in {} seconds'.format(description, round(total, 3)))
+        print(timings.report(total))
+        if cache is not None:
+            print('Tile cache: {hits} hits, {misses} misses, {tiles} tiles, {bytes} bytes'.format(**cache.stats()))
+
+    if args.time_json is not None:
+        with open(args.time_json, 'w') as file:
+            json.dump({'description': description, 'seconds': total, 'spans': timings.as_dict(),
+                       'cache': None if cache is None else cache.stats()}, file, indent=2)
+
+    if image is not None and not args.hide:
+        image.show()
+
+
+def report_work(generator, args):
+    stats = generator.work_stats
+    if stats is None:
+        print('Work counters are only collected with float64 precision')
+        return
+
+    if args.stats:
+        for name, value in stats.as_dict().items():
+            print('{:<24} {}'.format(name, round(value, 3)))
+
+    if args.cost_map is not None:
+        write_image(Image.fromarray(stats.cost_image(args.resolution)), args.cost_map)
+
+
+def write_sequence(frames, args):
+    """
+    Saves the frames of a sequence as numbered images (--save) and encodes
+    them into a video (--video) as they are rendered.
+
+    :param frames: Iterator over (height, width, 3) uint8 arrays
+    :return: Number of frames written.
+    """
+
+    first = 0 if args.frame_range is None else args.frame_range[0]
+    video = None
+    if args.video is not None:
+        from src.video import DEFAULT_FRAMERATE, VideoWriter
+        video = VideoWriter(args.video, framerate=DEFAULT_FRAMERATE if args.framerate == -1 else args.framerate)
+
+    count = 0
+    try:
+        for count, rgb in enumerate(frames, 1):
+            if video is not None:
+                video.write_frame(rgb)
+            if args.NAME is not None:
+                write_image(Image.fromarray(rgb), frame_name(args.NAME, first + count - 1))
+    finally:
+        if video is not None:
+            video.close()
+
+    return count
+
+
+def render_image(args):
+    """
+    Renders (and saves) the image, sequence or stream described by args.
+
+    :return: Description of what was rendered, tile cache (or None), and the
+    image to be shown (or None).
+    """
+
+    cache = None
+    if args.cache is not None:
+        cache = TileCache(args.cache, max_bytes=args.cache_size * 2 ** 20, compress=args.cache_compress)
+
+    if args.deep:
+        generator = DeepMandelbrotGenerator(focus=args.focus,
+                                            zoom=args.zoom,
+                                            resolution=args.resolution,
+                                            framerate=args.framerate,
+                                            speed=args.speed,
+                                            iterations=args.iterations,
+                                            workers=args.workers,
+                                            dtype=args.dtype)
+
+    elif args.mandelbrot:
         generator = MandelbrotGenerator(focus=args.focus,
                                         zoom=args.zoom,
                                         resolution=args.resolution,
                                         framerate=args.framerate,
                                         speed=args.speed,
-                                        iterations=args.iterations)
+                                        iterations=args.iterations,
+                                        workers=args.workers,
+                                        interior_check=args.interior_check,
+                                        subdivide=args.subdivide,
+                                        precision=args.precision,
+                                        cache=cache,
+                                        resumable=args.resume is not None,
+                                        collect_stats=args.stats or args.cost_map is not None,
+                                        dtype=args.dtype,
+                                        smooth=args.smooth,
+                                        symmetry=args.symmetry,
+                                        antialias=args.antialias,
+                                        sample_budget=args.sample_budget)
 
     else:
         generator = JuliaGenerator(focus=args.focus,
@@ -123,21 +573,97 @@ def main():
                                    framerate=args.framerate,
                                    speed=args.speed,
                                    iterations=args.iterations,
-                                   c=args.c)
+                                   c=args.c,
+                                   workers=args.workers,
+                                   interior_check=args.interior_check,
+                                   subdivide=args.subdivide,
+                                   precision=args.precision,
+                                   cache=cache,
+                                   resumable=args.resume is not None,
+                                   collect_stats=args.stats or args.cost_map is not None,
+                                   dtype=args.dtype,
+                                   smooth=args.smooth,
+                                   symmetry=args.symmetry,
+                                   antialias=args.antialias,
+                                   sample_budget=args.sample_budget)
+
+    if args.verify_subdivision:
+        different, computed, total = generator.compare_subdivision()
+        print('Subdivision: {} of {} pixels differ from a full render, {}% of the pixels were computed'.format(
+            different, total, round(100 * computed / total, 2)))
+
+    if args.resume is not None and os.path.exists(args.resume):
+        generator.load_state(args.resume)
+
+    imager = Imager(generator, fused=args.fused)
+
+    if args.sweep_line is not None or args.sweep_circle is not None:
+        if args.sweep_line is not None:
+            cs = line_path(args.c, args.sweep_line, args.sequence)
+        else:
+            cs = circle_path(args.c, args.sweep_circle, args.sequence)
+        frames = write_sequence(imager.generate_sweep(cs, color_type=args.color,
+                                                      freeze_histogram=args.freeze_histogram,
+                                                      frame_range=args.frame_range, rgb=True, cutoff=args.cutoff),
+                                args)
+        return '{} frames generated'.format(frames), cache, None
+
+    if args.sequence is not None:
+        frames = write_sequence(imager.generate_zoom(args.sequence, color_type=args.color,
+                                                     freeze_histogram=args.freeze_histogram,
+                                                     frame_range=args.frame_range, rgb=True, cutoff=args.cutoff),
+                                args)
+        return '{} frames generated'.format(frames), cache, None
+
+    if args.stream:
+        strips = imager.stream_image(args.NAME, color_type=args.color, memory=args.memory * 2 ** 20, raw=args.raw,
+                                     cutoff=args.cutoff)
+        return 'Image streamed in {} strips'.format(strips), cache, None
 
-    imager = Imager(generator)
     image = imager.generate_image(color_type=args.color, cutoff=args.cutoff)
 
-    if args.time:
-        print('{} set generated in {} seconds'.format(
-            'Mandelbrot' if args.mandelbrot else 'Julia',
-            round(time.time() - start_time, 3)))
+    if args.resume is not None:
+        generator.save_state(args.resume)
 
-    if not args.hide:
-        image.show()
+    if args.stats or args.cost_map is not None:
+        report_work(generator, args)
 
     if args.NAME is not None:
-        image.save(args.NAME)
+        write_image(image, args.NAME)
+
+    return '{} set generated'.format('Mandelbrot' if args.mandelbrot else 'Julia'), cache, image
+
+
+def precompile():
+    """
+    Compiles every kernel and color function, and caches them on disk. Run
+    this once when building an image (such as a container) that renders sets,
+    so that no run has to compile anything.
+    """
+
+    start_time = time.time()
+    warmup()
+    for color_function in color_function_dict.values():
+        if color_function is not None:
+            build_palette(color_function, 16)
+
+    print('Kernels compiled in {} seconds'.format(round(time.time() - start_time, 3)))
+
+
+def main():
+    if sys.argv[1:] == ['--warmup']:
+        precompile()
+        return
+
+    if '--batch' in sys.argv[1:]:
+        batch(sys.argv[1:])
+        return
+
+    if '--serve' in sys.argv[1:]:
+        serve(sys.argv[1:])
+        return
+
+    render(parse())
 
 
 if __name__ == '__main__':
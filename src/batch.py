@@ -0,0 +1,124 @@
+#  Copyright (c) 2019 AgentElement
+
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import csv
+import io
+import json
+import os
+import time
+import traceback
+
+################################################################################
+# BATCH RENDERING
+################################################################################
+
+# Starting Python, importing numba and compiling the kernels takes longer than
+# rendering a typical frame. A batch runs many jobs (one image each) on a pool
+# of worker processes instead, which pay these costs once and are then reused
+# for every job they are given.
+
+
+def read_manifest(path):
+    """
+    Reads the jobs of a batch. A manifest is either a JSON lines file (.jsonl),
+    with one object per job, or a CSV file with one row per job. Keys are the
+    long names of the command line options ('focus', 'iterations', 'save'...).
+    Options without a value ('mandelbrot', 'subdivide'...) are set with true.
+    In CSV files, options with several values ('resolution') are separated by
+    spaces, and empty cells are ignored.
+
+    :param path: Path of the manifest.
+    :return: List of dictionaries.
+    """
+
+    with open(path, newline='') as file:
+        if path.lower().endswith('.csv'):
+            return [dict(row) for row in csv.DictReader(file)]
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def job_arguments(job):
+    """
+    Converts a job of a manifest to command line arguments.
+
+    :param job: Dictionary of options, see read_manifest()
+    :return: List of arguments, such as ['--focus', '-0.75', '--mandelbrot']
+    """
+
+    arguments = []
+    for key, value in job.items():
+        option = '--' + key.replace('_', '-')
+
+        if isinstance(value, str):
+            if value.lower() in ('true', 'false'):
+                value = value.lower() == 'true'
+            elif ' ' in value.strip():
+                value = value.split()
+
+        if value is None or value is False or value == '':
+            continue
+        if value is True:
+            arguments.append(option)
+        elif isinstance(value, (list, tuple)):
+            arguments += [option] + [str(item) for item in value]
+        else:
+            arguments += [option, str(value)]
+
+    return arguments
+
+
+def _run_job(render, index, job):
+    start = time.perf_counter()
+    errors = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(errors):
+            output = render(job)
+    except (Exception, SystemExit) as error:
+        message = ''.join(traceback.format_exception_only(type(error), error)).strip()
+        if isinstance(error, SystemExit) and errors.getvalue().strip():
+            # argparse reports invalid options on stderr before exiting
+            message = errors.getvalue().strip().splitlines()[-1]
+        return {'job': index, 'status': 'failed', 'error': message, 'output': job.get('save'),
+                'seconds': round(time.perf_counter() - start, 3)}
+
+    return {'job': index, 'status': 'ok', 'output': output, 'seconds': round(time.perf_counter() - start, 3)}
+
+
+def run_batch(render, jobs, processes=None, initializer=None, summary=None):
+    """
+    Runs jobs on a pool of worker processes. A failing job is recorded in the
+    summary and doesn't stop the others.
+
+    :param render: Function rendering one job, called as render(job) in a
+    worker process. It returns the path of the result. It must be picklable
+    (defined at the top level of a module).
+    :param jobs: List of jobs, see read_manifest()
+    :param processes: Number of worker processes. Defaults to the number of
+    cores.
+    :param initializer: Optional function called once by every worker when it
+    starts, for instance to compile the kernels.
+    :param summary: Optional path of a JSON file receiving the summary.
+    :return: Summary dictionary, with the result and time of every job.
+    """
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes, initializer=initializer) as executor:
+        results = list(executor.map(_run_job, [render] * len(jobs), range(len(jobs)), jobs))
+
+    report = {
+        'jobs': len(jobs),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'processes': processes,
+        'seconds': round(time.perf_counter() - start, 3),
+        'results': results,
+    }
+
+    if summary is not None:
+        with open(summary, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    return report
@@ -3,7 +3,6 @@
 import numpy as np
 from PIL import Image
 from numba import jit
-import matplotlib.pyplot as plt
 import colorsys
 
 
@@ -12,7 +11,7 @@ import colorsys
 ################################################################################
 
 
-@jit
+@jit(cache=True)
 def colorize_sinusoidal(x, max_iter):
     """
     Returns a 3-tuple (red, green, blue) depending on the fraction x/max_iter,
@@ -39,7 +38,7 @@ def colorize_sinusoidal(x, max_iter):
     return red, green, blue
 
 
-@jit
+@jit(cache=True)
 def colorize_sinusoidal_squared(x, max_iter, cutoff=1024):
     """
     Similar to colorize_sinusoidal, but the sinusoidal functions are squared,
@@ -64,7 +63,7 @@ def colorize_sinusoidal_squared(x, max_iter, cutoff=1024):
     return red, green, blue
 
 
-@jit
+@jit(cache=True)
 def colorize_sinusoidal_long(x, max_iter, red_factor=2, green_factor=1, blue_factor=2):
     """
     Similar to colorize_sinusoidal, except the sinusoidal functions are halved
@@ -91,7 +90,7 @@ def colorize_sinusoidal_long(x, max_iter, red_factor=2, green_factor=1, blue_fac
     return red, green, blue
 
 
-@jit
+@jit(cache=True)
 def linear_colorize(x, max_iter):
     """
     Mimics colorize_sinusoidal() with linear functions. Use this for
@@ -113,7 +112,7 @@ def linear_colorize(x, max_iter):
     return red, green, blue
 
 
-@jit
+@jit(cache=True)
 def three_linear_colorize(x, max_iter):
     if x == max_iter:
         return 0, 0, 0
@@ -139,7 +138,7 @@ def three_linear_colorize(x, max_iter):
         return red, green, blue
 
 
-@jit
+# Not compiled: numba has no colorsys. It is only called to build the palette.
 def HSV_colorize(x, max_iter, cutoff=1024):
     if x == max_iter:
         return 0, 0, 0
@@ -153,7 +152,7 @@ def HSV_colorize(x, max_iter, cutoff=1024):
     return red, green, blue
 
 
-@jit
+@jit(cache=True)
 def colorize_mono(x, max_iter):
     """
     Returns a linear, direct, monochromatic tuple proportional to x / max_iter
@@ -169,7 +168,7 @@ def colorize_mono(x, max_iter):
     return color, color, color
 
 
-@jit
+@jit(cache=True)
 def colorize_mono_squared(x, max_iter):
     """
     Returns a linear, direct, monochromatic tuple proportional to (x/max_iter)^2\
@@ -189,6 +188,32 @@ def colorize_mono_squared(x, max_iter):
     return color, color, color
 
 
+def histogram_colorize(x, max_iter, cdf=None):
+    """
+    Colors like linear_colorize(), but by the rank of x among the counts of
+    the frame rather than by x / max_iter (histogram equalization): every
+    color is used by as many pixels, however the counts are distributed, so
+    the palette isn't wasted on rare counts. Not compiled, as it is only
+    called to build the palette.
+
+    :param x: Current iteration
+    :param max_iter: Maximum iterations allowed
+    :param cdf: Cumulative distribution of the counts of the frame, see
+    cumulative_distribution(). Without it, x / max_iter is used.
+    :return: RGB tuple
+    """
+
+    if x == max_iter:
+        return 0, 0, 0
+
+    intensity = x / max_iter if cdf is None else cdf[x]
+
+    red = int(intensity * 256)
+    green = int(512 * (intensity if intensity < 0.5 else 1 - intensity))
+    blue = int((1 - intensity) * 256)
+    return red, green, blue
+
+
 color_function_dict = {
             'sin': colorize_sinusoidal_squared,
             'linear_sin': colorize_sinusoidal,
@@ -196,9 +221,115 @@ color_function_dict = {
             'linear_mono': colorize_mono,
             'linear': linear_colorize,
             'linear_long': None,
-            'full': HSV_colorize
+            'full': HSV_colorize,
+            'histogram': histogram_colorize
         }
 
+################################################################################
+# VECTORIZED COLORIZATION
+################################################################################
+
+
+def build_palette(color_function, max_iter, **kwargs):
+    """
+    Evaluates a color function once for every possible iteration count and
+    stores the result in a lookup table. Channels are clipped to 0-255, which
+    is what PIL does with out of range values.
+
+    :param color_function: One of the functions in color_function_dict
+    :param max_iter: Maximum iterations allowed
+    :param kwargs: Passed to the color function
+    :return: (max_iter + 1, 3) uint8 array, indexed by iteration count
+    """
+
+    palette = np.array([color_function(x, max_iter, **kwargs) for x in range(max_iter + 1)], dtype=np.int64)
+    return np.clip(palette, 0, 255).astype(np.uint8)
+
+
+def histogram(arr, max_iter):
+    """
+    Counts the pixels of every iteration count, in a single pass over arr.
+
+    :param arr: Iteration array of a generator
+    :param max_iter: Maximum iterations allowed
+    :return: (max_iter + 1) int64 array
+    """
+
+    return np.bincount(arr.ravel(), minlength=max_iter + 1)[:max_iter + 1]
+
+
+def cumulative_distribution(counts, max_iter):
+    """
+    Turns a histogram into the lookup table of histogram_colorize(). Pixels
+    at max_iter (in the set) aren't counted, so the colors are spread over
+    the pixels that escaped.
+
+    :param counts: Histogram of a frame, see histogram(). A histogram can be
+    kept and reused for later frames, so that their colors don't change.
+    :param max_iter: Maximum iterations allowed
+    :return: (max_iter + 1) float64 array, holding for every count the
+    fraction of the escaped pixels that escaped in fewer iterations.
+    """
+
+    escaped = np.cumsum(counts[:max_iter], dtype=np.float64)
+    cdf = np.zeros(max_iter + 1)
+    if max_iter and escaped[-1]:
+        cdf[1:] = escaped / escaped[-1]
+    return cdf
+
+
+def frame_kwargs(arr, color_function, max_iter, **kwargs):
+    """
+    Adds the arguments a color function takes from the frame itself to
+    kwargs: the cumulative distribution of histogram_colorize(), unless one
+    was given.
+
+    :return: Keyword arguments for build_palette()
+    """
+
+    if color_function is histogram_colorize and kwargs.get('cdf') is None:
+        kwargs['cdf'] = cumulative_distribution(histogram(arr, max_iter), max_iter)
+    return kwargs
+
+
+def colorize(arr, color_function, max_iter, **kwargs):
+    """
+    Colorizes a whole iteration array with a single lookup into the palette of
+    color_function. Histogram equalization (see histogram_colorize()) takes a
+    single pass over arr to build the palette, and another to look it up.
+
+    :param arr: Iteration array of a generator, indexed [x, y]
+    :param color_function: One of the functions in color_function_dict
+    :param max_iter: Maximum iterations allowed
+    :param kwargs: Passed to the color function
+    :return: (height, width, 3) uint8 array, ready for Image.fromarray()
+    """
+
+    return build_palette(color_function, max_iter, **frame_kwargs(arr, color_function, max_iter, **kwargs))[arr.T]
+
+
+def colorize_smooth(smooth, color_function, max_iter, **kwargs):
+    """
+    Colorizes continuous escape counts (see Generator.smooth_arr) by
+    interpolating between the palette colors of the two nearest iteration
+    counts, which removes the bands of constant color.
+
+    :param smooth: float32 array of escape counts, indexed [x, y]
+    :param color_function: One of the functions in color_function_dict
+    :param max_iter: Maximum iterations allowed
+    :param kwargs: Passed to the color function
+    :return: (height, width, 3) uint8 array, ready for Image.fromarray()
+    """
+
+    palette = build_palette(color_function, max_iter, **kwargs).astype(np.float32)
+    smooth = np.clip(smooth.T, 0, max_iter)
+
+    lower = smooth.astype(np.int64)
+    upper = np.minimum(lower + 1, max_iter)
+    fraction = (smooth - lower)[..., np.newaxis]
+    return (palette[lower] * (1 - fraction) + palette[upper] * fraction + 0.5).astype(np.uint8)
+
+
 ################################################################################
 # COLOR SPECTRUM TESTING
 ################################################################################
@@ -222,6 +353,9 @@ def generate_varied_spectrum_images():
 
 
 def plot_color_function(color_function=colorize_sinusoidal, max_iter=1024, scale_factor=1, **kwargs):
+    # Imported here, as matplotlib is slow to import and only needed for testing
+    import matplotlib.pyplot as plt
+
     color_array = [color_function(value, max_iter // scale_factor, **kwargs) for value in range(max_iter)]
     plt.plot([color_array[red][0] for red in range(max_iter)], color='red')
     plt.plot([color_array[green][1] for green in range(max_iter)], color='green')
@@ -231,4 +365,6 @@ def plot_color_function(color_function=colorize_sinusoidal, max_iter=1024, scale
 if __name__ == '__main__':
     generate_image(color_function=HSV_colorize, scale_factor=1).show()
     plot_color_function(color_function=HSV_colorize, scale_factor=1)
+
+    import matplotlib.pyplot as plt
     plt.show()
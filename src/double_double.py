@@ -0,0 +1,146 @@
+#  Copyright (c) 2019 AgentElement
+
+from decimal import Decimal
+from numba import jit
+from src import kernels
+
+################################################################################
+# DOUBLE-DOUBLE ARITHMETIC
+################################################################################
+
+# A double-double number is the unevaluated sum hi + lo of two float64 numbers,
+# with |lo| <= ulp(hi) / 2. This gives about 106 bits of precision (32 decimal
+# digits), enough for zooms of up to about 95, while staying far cheaper than
+# arbitrary precision arithmetic. The algorithms are the usual error-free
+# transformations of Dekker and Knuth, see:
+# Hida, Li, Bailey - Library for Double-Double and Quad-Double Arithmetic.
+
+# Splits a float64 into two 26-bit halves
+SPLITTER = 134217729.0  # 2 ** 27 + 1
+
+
+def split(x):
+    """
+    Rounds a number to the nearest double-double.
+
+    :param x: Decimal (or anything Decimal() accepts).
+    :return: (hi, lo) tuple of floats.
+    """
+
+    x = Decimal(x)
+    hi = float(x)
+    return hi, float(x - Decimal(hi))
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def two_sum(a, b):
+    s = a + b
+    v = s - a
+    return s, (a - (s - v)) + (b - v)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def quick_two_sum(a, b):
+    # Requires |a| >= |b|
+    s = a + b
+    return s, b - (s - a)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def two_prod(a, b):
+    p = a * b
+
+    t = SPLITTER * a
+    a_hi = t - (t - a)
+    a_lo = a - a_hi
+    t = SPLITTER * b
+    b_hi = t - (t - b)
+    b_lo = b - b_hi
+
+    return p, ((a_hi * b_hi - p) + a_hi * b_lo + a_lo * b_hi) + a_lo * b_lo
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def add(a_hi, a_lo, b_hi, b_lo):
+    s, e = two_sum(a_hi, b_hi)
+    t, f = two_sum(a_lo, b_lo)
+    s, e = quick_two_sum(s, e + t)
+    return quick_two_sum(s, e + f)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def mul(a_hi, a_lo, b_hi, b_lo):
+    p, e = two_prod(a_hi, b_hi)
+    return quick_two_sum(p, e + (a_hi * b_lo + a_lo * b_hi))
+
+
+################################################################################
+# ESCAPE-TIME FUNCTIONS
+################################################################################
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def iterate(zr_hi, zr_lo, zi_hi, zi_lo, cr_hi, cr_lo, ci_hi, ci_lo, max_iter):
+    """
+    Double-double version of kernels.iterate(), without cycle detection.
+
+    :return: Number of iterations for divergence (if divergence occurs),
+    else max_iter.
+    """
+
+    for i in range(max_iter):
+        if zr_hi * zr_hi + zi_hi * zi_hi > 4:
+            return i
+
+        rr_hi, rr_lo = mul(zr_hi, zr_lo, zr_hi, zr_lo)
+        ii_hi, ii_lo = mul(zi_hi, zi_lo, zi_hi, zi_lo)
+        ri_hi, ri_lo = mul(zr_hi, zr_lo, zi_hi, zi_lo)
+
+        zr_hi, zr_lo = add(rr_hi, rr_lo, -ii_hi, -ii_lo)
+        zr_hi, zr_lo = add(zr_hi, zr_lo, cr_hi, cr_lo)
+        zi_hi, zi_lo = add(2 * ri_hi, 2 * ri_lo, ci_hi, ci_lo)
+    return max_iter
+
+
+# The tile kernels take the focus as two double-doubles, and the pixel grid as
+# float64 offsets from it (see Generator.generate_double_double()). Offsets are
+# small numbers, so they keep their relative precision at any zoom, and the
+# pixel coordinates are only formed as double-doubles.
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def mandelbrot_tile(arr, x0, y0, re_hi, re_lo, im_hi, im_lo, min_x, x_step, min_y, y_step, max_iter,
+                    interior_check):
+    """
+    Double-double version of kernels.mandelbrot_tile(). The interior check is
+    reduced to the main cardioid and period-2 bulb test.
+
+    :return: None
+    """
+
+    for x in range(arr.shape[0]):
+        cr_hi, cr_lo = add(re_hi, re_lo, min_x + (x0 + x) * x_step, 0.0)
+        for y in range(arr.shape[1]):
+            ci_hi, ci_lo = add(im_hi, im_lo, min_y + (y0 + y) * y_step, 0.0)
+            if interior_check and kernels.in_main_bulbs(cr_hi, ci_hi):
+                arr[x, y] = max_iter
+            else:
+                arr[x, y] = iterate(cr_hi, cr_lo, ci_hi, ci_lo, cr_hi, cr_lo, ci_hi, ci_lo, max_iter)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def julia_tile(arr, x0, y0, re_hi, re_lo, im_hi, im_lo, min_x, x_step, min_y, y_step, max_iter,
+               interior_check, c):
+    """
+    Double-double version of kernels.julia_tile(). There is no interior
+    check at this precision: interior_check is accepted for the signature of
+    the float64 kernel, and ignored.
+
+    :return: None
+    """
+
+    for x in range(arr.shape[0]):
+        zr_hi, zr_lo = add(re_hi, re_lo, min_x + (x0 + x) * x_step, 0.0)
+        for y in range(arr.shape[1]):
+            zi_hi, zi_lo = add(im_hi, im_lo, min_y + (y0 + y) * y_step, 0.0)
+            arr[x, y] = iterate(zr_hi, zr_lo, zi_hi, zi_lo, c.real, 0.0, c.imag, 0.0, max_iter)
@@ -0,0 +1,80 @@
+#  Copyright (c) 2019 AgentElement
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+from src.instrumentation import span
+
+# Tiles are small compared to a frame so that expensive (interior-heavy)
+# regions are spread over many tasks. Idle workers pull the next tile from
+# the executor's queue, which balances the load dynamically.
+DEFAULT_TILE_SIZE = (128, 128)
+
+
+def default_workers():
+    """
+    :return: Number of workers used when none is specified (one per core).
+    """
+
+    return os.cpu_count() or 1
+
+
+def tiles(shape, tile_size=DEFAULT_TILE_SIZE, region=None):
+    """
+    Splits a 2D array into rectangular tiles.
+
+    :param shape: Shape of the array.
+    :param tile_size: Maximum (x, y) size of a tile.
+    :param region: Optional (x0, x1, y0, y1) sub-rectangle to split instead of
+    the whole array.
+    :return: List of (x0, x1, y0, y1) tuples.
+    """
+
+    if region is None:
+        region = (0, shape[0], 0, shape[1])
+    start_x, stop_x, start_y, stop_y = region
+
+    return [(x0, min(x0 + tile_size[0], stop_x), y0, min(y0 + tile_size[1], stop_y))
+            for x0 in range(start_x, stop_x, tile_size[0])
+            for y0 in range(start_y, stop_y, tile_size[1])]
+
+
+def render_tiles(kernel, arr, args, workers=None, tile_size=DEFAULT_TILE_SIZE, region=None, tile_list=None,
+                 origin=(0, 0)):
+    """
+    Runs a tile kernel over arr. The kernel is called as
+    kernel(view, x0, y0, *args) for every tile, where view is arr[x0:x1, y0:y1].
+
+    :param kernel: Jitted tile kernel. It must release the GIL to run in
+    parallel.
+    :param arr: Array to be filled.
+    :param args: Extra arguments passed to the kernel.
+    :param workers: Number of threads. Defaults to the number of cores.
+    :param tile_size: Maximum (x, y) size of a tile.
+    :param region: Optional (x0, x1, y0, y1) sub-rectangle to be rendered.
+    :param tile_list: Optional list of (x0, x1, y0, y1) tiles to be rendered,
+    instead of splitting the array (or region) into tiles.
+    :param origin: Pixel of the image held by arr[0, 0], when arr is only part
+    of the image. It is added to the x0, y0 passed to the kernel.
+    :return: List of the kernel's return values, in tile order.
+    """
+
+    if tile_list is None:
+        tile_list = tiles(arr.shape, tile_size, region)
+
+    def run(tile):
+        x0, x1, y0, y1 = tile
+        return kernel(arr[x0:x1, y0:y1], origin[0] + x0, origin[1] + y0, *args)
+
+    if workers is None:
+        workers = default_workers()
+
+    # Calling the kernel on an empty tile compiles it, without doing any work
+    with span('compile'):
+        kernel(arr[:0, :0], 0, 0, *args)
+
+    with span('iterate'):
+        if workers <= 1 or len(tile_list) <= 1:
+            return [run(tile) for tile in tile_list]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, tile_list))
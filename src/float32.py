@@ -0,0 +1,229 @@
+#  Copyright (c) 2019 AgentElement
+
+import numpy as np
+from numba import jit
+from src import kernels
+
+################################################################################
+# FLOAT32 KERNELS
+################################################################################
+
+# At shallow zooms (the default view, thumbnails), pixels are far enough apart
+# that float32 tells them apart as well as float64 does. float32 halves the
+# size of every number, so twice as many fit in a SIMD register. To let the
+# compiler use them, these kernels iterate LANES pixels at once, with the same
+# branch-free steps for every lane. Every STEPS iterations, the lanes whose
+# pixel escaped (or was found in the set) are handed the next pixel of the
+# tile, so a slow pixel doesn't hold up the others.
+
+LANES = 16
+
+# Iterations between two refills of the lanes.
+STEPS = 8
+
+# Two orbit points closer than this are equal for the periodicity check, a
+# few float32 ulps around 1 (see kernels.PERIODICITY_TOLERANCE).
+PERIODICITY_TOLERANCE = np.float32(2.0 ** -20)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def lanes(image, columns, rows, x0, y0, x_stride, y_stride, min_x, x_step, min_y, y_step, max_iter,
+          interior_check, julia, c):
+    """
+    Fills pixels [columns[x], rows[y]] of image like kernels.mandelbrot_tile()
+    or kernels.julia_tile(), in float32 arithmetic. Pixel coordinates are
+    computed in float64, like the other kernels, and only then rounded to
+    float32.
+
+    :param image: Iteration array receiving the pixels.
+    :param columns: Columns of image to be filled.
+    :param rows: Rows of image to be filled.
+    :param x0: x-index in the grid of column 0 of image.
+    :param y0: y-index in the grid of row 0 of image.
+    :param x_stride: Distance in the grid between two columns of image.
+    :param y_stride: Distance in the grid between two rows of image.
+    :param julia: Computes the julia set of c if set, the mandelbrot set
+    otherwise.
+    :return: None
+    """
+
+    height = len(rows)
+    pixels = len(columns) * height
+
+    zr = np.zeros(LANES, dtype=np.float32)
+    zi = np.zeros(LANES, dtype=np.float32)
+    cr = np.zeros(LANES, dtype=np.float32)
+    ci = np.zeros(LANES, dtype=np.float32)
+    saved_r = np.zeros(LANES, dtype=np.float32)
+    saved_i = np.zeros(LANES, dtype=np.float32)
+    counts = np.zeros(LANES, dtype=np.int32)
+    steps = np.zeros(LANES, dtype=np.int32)
+    period = np.ones(LANES, dtype=np.int32)
+    alive = np.zeros(LANES, dtype=np.bool_)
+    lane_pixel = np.full(LANES, -1, dtype=np.int64)
+
+    four = np.float32(4.0)
+    # Without the check, no distance is below the tolerance
+    tolerance = PERIODICITY_TOLERANCE if interior_check else np.float32(-1.0)
+
+    next_pixel = 0
+    while True:
+        active = 0
+        for k in range(LANES):
+            if alive[k]:
+                active += 1
+                continue
+
+            if lane_pixel[k] >= 0:
+                image[columns[lane_pixel[k] // height], rows[lane_pixel[k] % height]] = counts[k]
+                lane_pixel[k] = -1
+
+            while next_pixel < pixels:
+                x, y = columns[next_pixel // height], rows[next_pixel % height]
+                next_pixel += 1
+                re = min_x + (x0 + x * x_stride) * x_step
+                im = min_y + (y0 + y * y_stride) * y_step
+                if max_iter <= 0 or (interior_check and not julia and kernels.in_main_bulbs(re, im)):
+                    image[x, y] = max_iter
+                    continue
+
+                zr[k], zi[k] = np.float32(re), np.float32(im)
+                # Pixels outside the escape radius don't take a lane
+                if zr[k] * zr[k] + zi[k] * zi[k] > four:
+                    image[x, y] = 0
+                    continue
+
+                if julia:
+                    cr[k], ci[k] = np.float32(c.real), np.float32(c.imag)
+                else:
+                    cr[k], ci[k] = zr[k], zi[k]
+                saved_r[k], saved_i[k] = zr[k], zi[k]
+                counts[k], steps[k], period[k] = 0, 0, 1
+                lane_pixel[k] = next_pixel - 1
+                alive[k] = True
+                active += 1
+                break
+
+        if active == 0:
+            return
+
+        for _ in range(STEPS):
+            for k in range(LANES):
+                r, i = zr[k], zi[k]
+                r2, i2 = r * r, i * i
+                inside = alive[k] & (r2 + i2 <= four)
+                r, i = r2 - i2 + cr[k], (r + r) * i + ci[k]
+
+                # Brent's cycle detection, see kernels.iterate()
+                periodic = inside & (abs(r - saved_r[k]) < tolerance) & (abs(i - saved_i[k]) < tolerance)
+                count = counts[k] + inside
+                counts[k] = max_iter if periodic else count
+                alive[k] = inside & (not periodic) & (count < max_iter)
+                zr[k], zi[k] = r, i
+
+                step = steps[k] + 1
+                refresh = step == period[k]
+                steps[k] = 0 if refresh else step
+                period[k] = 2 * period[k] if refresh else period[k]
+                saved_r[k] = r if refresh else saved_r[k]
+                saved_i[k] = i if refresh else saved_i[k]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def lanes_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, julia, c):
+    """
+    Fills a tile of the image, see lanes().
+
+    :return: None
+    """
+
+    lanes(arr, np.arange(arr.shape[0]), np.arange(arr.shape[1]), x0, y0, 1, 1, min_x, x_step, min_y, y_step,
+          max_iter, interior_check, julia, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def indexed_tile(tile, x0, y0, image, columns, rows, min_x, x_step, min_y, y_step, max_iter, interior_check,
+                 julia, c):
+    """
+    float32 variant of kernels.indexed_tile().
+
+    :return: None
+    """
+
+    lanes(image, columns[x0:x0 + tile.shape[0]], rows[y0:y0 + tile.shape[1]], 0, 0, 1, 1, min_x, x_step, min_y,
+          y_step, max_iter, interior_check, julia, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def strided_tile(arr, x0, y0, origin_x, origin_y, x_stride, y_stride, min_x, x_step, min_y, y_step, max_iter,
+                 interior_check, julia, c):
+    """
+    float32 variant of kernels.strided_tile().
+
+    :return: None
+    """
+
+    lanes(arr, np.arange(arr.shape[0]), np.arange(arr.shape[1]), origin_x + x0 * x_stride,
+          origin_y + y0 * y_stride, x_stride, y_stride, min_x, x_step, min_y, y_step, max_iter, interior_check,
+          julia, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def rgb_tile(rgb, x0, y0, palette, min_x, x_step, min_y, y_step, max_iter, interior_check, julia, c):
+    """
+    Fills rgb with the colors of the pixels it covers, like
+    kernels.mandelbrot_tile_rgb(). The iteration counts of the tile are only
+    held in a buffer of the size of the tile.
+
+    :return: None
+    """
+
+    counts = np.empty((rgb.shape[0], rgb.shape[1]), dtype=np.int64)
+    lanes_tile(counts, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, julia, c)
+    for x in range(rgb.shape[0]):
+        for y in range(rgb.shape[1]):
+            rgb[x, y, :] = palette[counts[x, y]]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def mandelbrot_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check):
+    """
+    float32 variant of kernels.mandelbrot_tile().
+
+    :return: None
+    """
+
+    lanes_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, False, 0j)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def julia_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, c):
+    """
+    float32 variant of kernels.julia_tile().
+
+    :return: None
+    """
+
+    lanes_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, True, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def mandelbrot_tile_rgb(rgb, x0, y0, palette, min_x, x_step, min_y, y_step, max_iter, interior_check):
+    """
+    float32 variant of kernels.mandelbrot_tile_rgb().
+
+    :return: None
+    """
+
+    rgb_tile(rgb, x0, y0, palette, min_x, x_step, min_y, y_step, max_iter, interior_check, False, 0j)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def julia_tile_rgb(rgb, x0, y0, palette, min_x, x_step, min_y, y_step, max_iter, interior_check, c):
+    """
+    float32 variant of kernels.julia_tile_rgb().
+
+    :return: None
+    """
+
+    rgb_tile(rgb, x0, y0, palette, min_x, x_step, min_y, y_step, max_iter, interior_check, True, c)
@@ -1,24 +1,127 @@
 #  Copyright (c) 2019 AgentElement
 
+from decimal import Decimal
 import numpy as np
 from numba import jit
+from src import double_double, engine, float32, kernels, perturbation, supersampling, sweep
+from src.work_stats import WorkStats
+from src import precision as precision_module
+from src.instrumentation import span
+
+DTYPES = ('auto', 'uint8', 'uint16', 'uint32')
+
+# Mirroring is only worth its overhead if it spares this fraction of the image.
+MIN_MIRRORED_FRACTION = 0.05
+
+
+def iteration_dtype(max_iter):
+    """
+    :param max_iter: Iteration limit.
+    :return: Smallest unsigned integer type that holds every iteration count.
+    """
+
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_iter <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def mirror_indices(values):
+    """
+    Pairs up the pixel coordinates that are exact opposites. Only exact
+    opposites are paired, so coordinates that are off by a fraction of a pixel
+    (or by a rounding error) are left alone.
+
+    :param values: Coordinates of the pixels along one axis.
+    :return: Integer array, holding for every coordinate the index of its
+    opposite, or -1 if there is none.
+    """
+
+    index = {value: i for i, value in enumerate(values.tolist())}
+    return np.array([index.get(-value, -1) for value in values.tolist()], dtype=np.int64)
 
 
 class Generator:
-    def __init__(self, focus=0 + 0j, zoom=1, resolution=(3840, 2160), framerate=24, speed=2, iterations=256):
+
+    _tile_kernel = None
+    _rgb_kernel = None
+    _subdivide_kernel = None
+    _double_double_kernel = None
+    _float32_kernel = None
+    _float32_rgb_kernel = None
+
+    def __init__(self, focus=0 + 0j, zoom=1, resolution=(3840, 2160), framerate=24, speed=2, iterations=256,
+                 workers=None, interior_check=True, subdivide=False, precision='auto', cache=None,
+                 resumable=False, collect_stats=False, dtype='auto', smooth=False, symmetry=True,
+                 antialias=0, sample_budget=None):
         self.zoom = zoom
-        self._focus = focus
+        # The focus may be a string with more digits than a complex can hold.
+        self._focus_decimal = precision_module.decimal_pair(focus)
+        self._focus = complex(float(self._focus_decimal[0]), float(self._focus_decimal[1]))
         self._resolution = resolution
         self.speed = speed
         self.framerate = framerate
         self.iterations = iterations
-        self.arr = np.zeros(resolution, dtype=np.uint16)
+        self.workers = workers
+        self.interior_check = interior_check
+        self.subdivide = subdivide
+        self.precision = precision
+        self.cache = cache
+        self.resumable = resumable
+        self.resumed_pixels = 0
+        self.collect_stats = collect_stats
+        self.work_stats = None
+        self._dtype = None if dtype in (None, 'auto') else np.dtype(dtype).type
+        if self._dtype is not None and iterations > np.iinfo(self._dtype).max:
+            raise ValueError('{} iterations don\'t fit in {}'.format(iterations, np.dtype(dtype).name))
+        self.smooth = smooth
+        self.smooth_arr = None
+        self.symmetry = symmetry
+        self.mirrored_pixels = 0
+        self.antialias = antialias
+        self.sample_budget = sample_budget
+        self.edge_threshold = supersampling.EDGE_THRESHOLD
+        self.edge_samples = None
+        self._arr = None
+        self._orbits = None
+        self._orbit_key = None
+        self._orbit_iterations = 0
 
     def __str__(self):
         return self.__repr__()
 
+    @property
+    def arr(self):
+        """
+        The iteration array. It is only allocated once it is first used, so
+        generators that render straight to RGB (see generate_rgb()) never hold
+        one.
+        """
+
+        if self._arr is None:
+            self._arr = np.zeros(self._resolution, dtype=self.dtype)
+        elif self.iterations > np.iinfo(self._arr.dtype).max:
+            # The iteration limit was raised, keeping the pixels of a resumable render
+            self._arr = self._arr.astype(iteration_dtype(self.iterations))
+        return self._arr
+
+    @arr.setter
+    def arr(self, value):
+        self._arr = value
+
+    @property
+    def dtype(self):
+        """
+        Type of the iteration counts. Unless one was given, the smallest
+        unsigned integer type that holds the iteration limit.
+        """
+
+        if self._dtype is not None and self.iterations <= np.iinfo(self._dtype).max:
+            return self._dtype
+        return iteration_dtype(self.iterations)
+
     @staticmethod
-    @jit
+    @jit(cache=True)
     def range_from_resolution(resolution=(3840, 2160), zoom=1, focus=0 + 0j, framerate=-1, speed=2):
         """
         Takes a resolution and generates the four bounding numbers used by
@@ -26,6 +129,10 @@ class Generator:
         will be zoomed in by a factor of zoom/speed. By default, this generates a 4K
         image.
 
+        With focus=0, the bounds are offsets from the focus. These keep their
+        precision at any zoom, and are added to the focus in higher precision
+        by the double-double and perturbation kernels.
+
         :param resolution: Resolution of the image.
         :param zoom: Factor by which the image must be exponentially zoomed in.
         :param focus: Point around which the image is focused.
@@ -61,119 +168,589 @@ class Generator:
 
         return min_x, max_x, min_y, max_y
 
-    @jit
-    def complex_from_pixel(self, x_pixel, y_pixel):
+    def complex_from_pixel(self, x_pixel, y_pixel, exact=False):
         """
         returns a complex number corresponding to a pixel of a generated image,
         provided that the zoom and focus of the image correspond to that of the
         generator.
-        :param x_pixel: The x-value of the pixel to be converted
+        :param x_pixel: The x-value of the pixel to be converted. It may be
+        fractional, and both values may be arrays of pixels.
         :param y_pixel: The y-value of the pixel to be converted
-        :return: Complex
+        :param exact: Returns the coordinates as Decimals, added to every digit
+        of the focus, instead of rounding them to a complex.
+        :return: Complex (complex array for arrays of pixels), or (real,
+        imaginary) tuple of Decimals if exact.
         """
         max_x_pixel, max_y_pixel = self._resolution[0], self._resolution[1]
 
         buffer_zone = 2 * (max_x_pixel - max_y_pixel) / max_y_pixel
 
-        scaled_zoom = self.zoom * self.speed / self.framerate
+        framerate, speed = (1, 1) if self.framerate == -1 else (self.framerate, self.speed)
+        scaled_zoom = float(np.real(self.zoom)) * speed / framerate
 
         width = (2 + buffer_zone) / 2 ** (scaled_zoom - 1)  # Width of the image in complex space
         height = 1 / 2 ** (scaled_zoom - 2)  # Height of the image in complex space
 
-        re = width * ((x_pixel / max_x_pixel) - 0.5) + self._focus.real
-        im = height * ((y_pixel / max_y_pixel) - 0.5) + self._focus.imag
+        re = width * ((x_pixel / max_x_pixel) - 0.5)
+        im = height * ((y_pixel / max_y_pixel) - 0.5)
+
+        if exact:
+            return self._focus_decimal[0] + Decimal(re), self._focus_decimal[1] + Decimal(im)
+
+        # The coordinates of whole pixels are those the kernels compute
+        bounds = self.range_from_resolution(self._resolution, self.zoom, self._focus, self.framerate, self.speed)
+        min_x, x_step, min_y, y_step = self._pixel_grid(*bounds)
+        re, im = min_x + x_pixel * x_step, min_y + y_pixel * y_step
+
+        if np.ndim(re) or np.ndim(im):
+            return re + 1j * im
 
         return complex(re, im)
 
     def generate_set(self, min_x, max_x, min_y, max_y, iterations):
-        pass
 
-    def generate(self):
-        pass
+        """
+        Generates the set in self.arr with each element carrying the number
+        of iterations. The array is bounded by four numbers
+        (min_x, max_x, min_y, max_y) each determining the maximum and minimum
+        real/imaginary values that are computed. Each element in the array
+        directly corresponds to one pixel. The array is split into tiles that
+        are rendered on self.workers threads. If self.subdivide is set, the
+        tiles are rendered by Mariani-Silver subdivision, which fills regions
+        of constant iteration count without computing their inside. If
+        self.cache is set, tiles are looked up in the cache first, and only
+        the missing ones are computed. If self.collect_stats is set, every
+        pixel is computed by a float64 kernel that counts the work done in
+        self.work_stats (without subdivision, cache, symmetry or float32
+        lanes, so the counters describe that render, not an optimised one).
+        If self.smooth is set, the same pass also fills self.smooth_arr with
+        continuous escape counts. Otherwise, if self.symmetry is set, pixels
+        that mirror an other pixel of the image are copied from it instead of
+        being computed (see generate_mirrored()).
 
+        :param min_x: Minimum x-value to be computed.
+        :param max_x: Maximum x-value to be computed.
+        :param min_y: Minimum y-value to be computed.
+        :param max_y: Maximum x-value to be computed.
+        :param iterations: number of iterations before the program determines
+        convergence
+        :return: None
+        """
 
-class MandelbrotGenerator(Generator):
+        kernel = self._subdivide_kernel if self.subdivide else self._tile_kernel
+        with span('setup'):
+            args = self._pixel_grid(min_x, max_x, min_y, max_y) + (iterations,) + self._kernel_args()
+            if not self.subdivide and self._float32_kernel is not None and self.resolve_precision() == 'float32':
+                kernel = self._float32_kernel
+
+        if self.collect_stats:
+            self.generate_counted(args[:4], iterations)
+            return
+
+        if self.smooth:
+            self.generate_smooth(args[:4], iterations)
+            return
+
+        if self.symmetry and kernel in (self._tile_kernel, self._float32_kernel) and self.cache is None:
+            self.generate_mirrored(kernel, args)
+            return
+
+        if self.cache is None:
+            engine.render_tiles(kernel, self.arr, args, workers=self.workers)
+            return
+
+        missing = []
+        for tile in engine.tiles(self.arr.shape, self.cache.tile_size):
+            x0, x1, y0, y1 = tile
+            key = self.cache.key(type(self).__name__, kernel.__module__, kernel.__name__, str(self.arr.dtype), tile,
+                                 *args)
+            cached = self.cache.get(key)
+            if cached is None:
+                missing.append((tile, key))
+            else:
+                self.arr[x0:x1, y0:y1] = cached
+
+        engine.render_tiles(kernel, self.arr, args, workers=self.workers, tile_list=[tile for tile, _ in missing])
+        for (x0, x1, y0, y1), key in missing:
+            self.cache.put(key, self.arr[x0:x1, y0:y1])
+
+    def generate_counted(self, grid, iterations):
 
-    def __init__(self, focus=0 + 0j, zoom=1, resolution=(3840, 2160), framerate=24, speed=2, iterations=256):
-        super().__init__(
-            focus=focus, zoom=zoom, resolution=resolution, framerate=framerate, speed=speed, iterations=iterations
-        )
+        """
+        Generates the set in self.arr, counting the iterations executed for
+        every tile. The counters are stored in self.work_stats.
 
-    def __repr__(self):
-        return "<mandelbrot_generator res: {}, framerate: {}, speed: {}, iterations: {}>".format(
-            self._resolution, self.framerate, self.speed, self.iterations)
+        Every pixel is iterated in float64, whatever the precision would be
+        otherwise, and none is mirrored: the counters are those of the
+        unoptimised render, which takes up to twice as long as the render
+        without collect_stats in the default view.
 
-    def __str__(self):
-        return self.__repr__()
+        :param grid: min_x, x_step, min_y, y_step of the image.
+        :param iterations: Iteration limit.
+        :return: None
+        """
 
-    @staticmethod
-    @jit(nopython=True)
-    def compute_mandelbrot(z: complex, max_iter: int):
+        tile_list = engine.tiles(self.arr.shape)
+        costs = engine.render_tiles(kernels.counting_tile, self.arr,
+                                    tuple(grid) + (iterations,) + self._escape_args(),
+                                    workers=self.workers, tile_list=tile_list)
+
+        tile_width, tile_height = engine.DEFAULT_TILE_SIZE
+        shape = (-(-self.arr.shape[0] // tile_width), -(-self.arr.shape[1] // tile_height))
+        cost_map = np.array(costs, dtype=np.int64).reshape(shape)
+        self.work_stats = WorkStats(self.arr, iterations, cost_map, engine.DEFAULT_TILE_SIZE)
+
+    def generate_smooth(self, grid, iterations):
 
         """
-        Computes if a complex number z is in the set, returning the number of
-        iterations required for divergence, up to max_iter.
+        Generates the set in self.arr, and the continuous escape counts of
+        every pixel in self.smooth_arr, in a single pass.
 
-        :param z: Complex number to be tested for divergence.
-        :param max_iter: Maximum number of iterations before z is declared to
-        be in the set.
-        :return: Number of iterations for divergence (if divergence occurs),
-        else max_iter.
+        :param grid: min_x, x_step, min_y, y_step of the image.
+        :param iterations: Iteration limit.
+        :return: None
         """
 
-        c = z
-        for i in range(max_iter):
-            if z.real * z.real + z.imag * z.imag > 4:
-                return i
-            z = z * z + c
-        return max_iter
+        if self.smooth_arr is None or self.smooth_arr.shape != self.arr.shape:
+            self.smooth_arr = np.zeros(self.arr.shape, dtype=np.float32)
 
-    @jit
-    def generate_set(self, min_x, max_x, min_y, max_y, iterations):
+        engine.render_tiles(kernels.smooth_tile, self.arr,
+                            (self.smooth_arr,) + tuple(grid) + (iterations,) + self._escape_args(),
+                            workers=self.workers)
 
+    def _mirror_columns(self, columns):
         """
-        Generates a mandelbrot set in self.arr with each element carrying
-        the number of iterations. The array is bounded by four numbers
-        (min_x, max_x, min_y, max_y) each determining the maximum and minimum
-        real/imaginary values that are computed. Each element in the array
-        directly corresponds to one pixel. *args are passed to the computation
-        function.
+        Describes the symmetry of the set: pixel [x, y] has the same value as
+        pixel [mirror[x], y'], where y' is the row of the opposite imaginary
+        part.
 
-        :param min_x: Minimum x-value to be computed.
-        :param max_x: Maximum x-value to be computed.
-        :param min_y: Minimum y-value to be computed.
-        :param max_y: Maximum x-value to be computed.
-        :param iterations: number of iterations before the program determines
-        convergence
+        :param columns: Real part of every column.
+        :return: mirror (-1 for columns without one), or None if the set has
+        no such symmetry.
+        """
+
+        return None
+
+    def generate_mirrored(self, kernel, args):
+
+        """
+        Generates the set in self.arr, copying the pixels whose mirror image
+        (see _mirror_columns()) lies in the image instead of computing them.
+        Both coordinates of a pixel and of its mirror are exact opposites, and
+        the kernels only negate intermediate values for opposite inputs, so the
+        image is identical to a full render. The number of copied pixels is
+        stored in self.mirrored_pixels.
+
+        :param kernel: Tile kernel, float64 or float32.
+        :param args: Arguments of the tile kernel, starting with the grid.
         :return: None
         """
 
-        # arr is a 2D np array containing the image.
-        height = self.arr.shape[0]
-        width = self.arr.shape[1]
+        min_x, x_step, min_y, y_step = args[:4]
+        width, height = self.arr.shape
+        self.mirrored_pixels = 0
+
+        with span('setup'):
+            rows = min_y + np.arange(height) * y_step
+            row_mirror = mirror_indices(rows)
+            column_mirror = self._mirror_columns(min_x + np.arange(width) * x_step)
+
+        # Rows above the real axis are copied from those below it
+        copied_rows = (row_mirror >= 0) & (rows > 0)
+        copied_columns = column_mirror >= 0 if column_mirror is not None else np.zeros(width, dtype=np.bool_)
+        copied = (np.nonzero(copied_columns)[0], np.nonzero(copied_rows)[0])
+
+        if len(copied[0]) * len(copied[1]) < MIN_MIRRORED_FRACTION * self.arr.size:
+            engine.render_tiles(kernel, self.arr, args, workers=self.workers)
+            return
+
+        # The remaining pixels are tiled as if they were packed together, so
+        # that they are rendered in as few tiles as a full image.
+        indexed_tile = float32.indexed_tile if kernel is self._float32_kernel else kernels.indexed_tile
+        escape_args = (min_x, x_step, min_y, y_step) + (args[4],) + self._escape_args()
+        for columns, rows in ((np.arange(width), np.nonzero(~copied_rows)[0]),
+                              (np.nonzero(~copied_columns)[0], copied[1])):
+            if len(columns) == 0 or len(rows) == 0:
+                continue
+            # Never written, only gives the extent of the tiles
+            packed = np.empty((len(columns), len(rows)), dtype=np.uint8)
+            engine.render_tiles(indexed_tile, packed, (self.arr, columns, rows) + escape_args,
+                                workers=self.workers)
+
+        x, y = copied
+        self.arr[np.ix_(x, y)] = self.arr[np.ix_(column_mirror[x], row_mirror[y])]
+        self.mirrored_pixels = len(x) * len(y)
+
+    def refine_edges(self):
+
+        """
+        Adds jittered subsamples to the edge pixels of self.arr, the pixels
+        whose iteration count differs from a neighbour's by at least
+        self.edge_threshold. Every edge pixel gets self.antialias subsamples,
+        placed with complex_from_pixel(), and the edges with the highest
+        contrast are refined first until self.sample_budget subsamples were
+        computed. The subsamples are stored in self.edge_samples, as a
+        (columns, rows, counts) tuple where counts is a (pixels, antialias)
+        array (see supersampling.blend()).
+
+        :return: Number of subsamples computed.
+        """
+
+        with span('setup'):
+            budget = self.sample_budget
+            if budget is None:
+                budget = supersampling.SAMPLE_BUDGET * self.arr.size
+            columns, rows = supersampling.select_edges(self.arr, self.antialias, budget, self.edge_threshold)
+
+            x, y = supersampling.jitter(len(columns), self.antialias)
+            points = self.complex_from_pixel(columns[:, None] + x, rows[:, None] + y)
+            counts = np.zeros(points.shape, dtype=self.dtype)
+
+        engine.render_tiles(kernels.sample_tile, counts, (points, self.iterations) + self._escape_args(),
+                            workers=self.workers)
+        self.edge_samples = columns, rows, counts
+        return counts.size
+
+    def compare_subdivision(self):
+
+        """
+        Renders the image by subdivision and exhaustively, and compares the
+        two. self.arr is left holding the subdivided image.
+
+        :return: Number of pixels that differ, number of pixels that the
+        subdivision actually computed, and total number of pixels.
+        """
+
+        bounds = self.range_from_resolution(self._resolution, self.zoom, self._focus, self.framerate, self.speed)
+        args = self._pixel_grid(*bounds) + (self.iterations,) + self._kernel_args()
+
+        exhaustive = np.zeros_like(self.arr)
+        engine.render_tiles(self._tile_kernel, exhaustive, args, workers=self.workers)
+        computed = sum(engine.render_tiles(self._subdivide_kernel, self.arr, args, workers=self.workers))
+
+        return int(np.count_nonzero(self.arr != exhaustive)), computed, self.arr.size
+
+    def generate_rgb(self, palette):
+
+        """
+        Renders the image straight to RGB. Each iteration count is mapped
+        through palette as soon as it is computed, so no iteration array is
+        allocated and the frame is walked only once. The counts are computed
+        in the arithmetic picked by resolve_precision(), so the image is the
+        one generate() would give.
+
+        :param palette: (iterations + 1, 3) uint8 lookup table, see
+        color_functions.build_palette()
+        :return: (height, width, 3) uint8 array
+        """
+
+        if self._rgb_kernel is None or self.resumable or self.collect_stats or self.smooth or self.antialias \
+                or self.resolve_precision() == 'double-double':
+            self.generate()
+            if self.edge_samples is not None:
+                return supersampling.blend(palette[self.arr.T], *self.edge_samples, palette)
+            return palette[self.arr.T]
+
+        rgb = np.empty((self._resolution[1], self._resolution[0], 3), dtype=np.uint8)
+        with span('setup'):
+            bounds = self.range_from_resolution(self._resolution, self.zoom, self._focus, self.framerate, self.speed)
+            args = (palette,) + self._pixel_grid(*bounds) + (self.iterations,) + self._kernel_args()
+            kernel = self._rgb_kernel
+            if not self.subdivide and self._float32_rgb_kernel is not None and self.resolve_precision() == 'float32':
+                kernel = self._float32_rgb_kernel
+
+        # The kernels index pixels as [x, y], like the iteration array.
+        engine.render_tiles(kernel, rgb.transpose(1, 0, 2), args, workers=self.workers)
+        return rgb
+
+    def _pixel_grid(self, min_x, max_x, min_y, max_y):
+        """
+        Converts the bounds of the image into the value of pixel 0 and the
+        step value of a pixel along both axes.
+
+        :return: min_x, x_step, min_y, y_step
+        """
+
+        # The bounds are complex if the zoom was given as a complex number.
+        min_x, max_x, min_y, max_y = (float(np.real(bound)) for bound in (min_x, max_x, min_y, max_y))
 
         # This is the step value of a pixel.
-        x_pixel = (max_x - min_x) / height
-        y_pixel = (max_y - min_y) / width
+        x_pixel = (max_x - min_x) / self._resolution[0]
+        y_pixel = (max_y - min_y) / self._resolution[1]
+
+        return min_x, x_pixel, min_y, y_pixel
+
+    def _kernel_args(self):
+        """
+        :return: Arguments passed to the tile kernel after the iteration limit.
+        """
+
+        return self.interior_check,
+
+    def _escape_args(self):
+        """
+        :return: Arguments of kernels.escape_time() after the iteration limit.
+        """
 
-        # computes the value for the mandelbrot set at each pixel.
-        for x in range(height):
-            re = min_x + x * x_pixel
-            for y in range(width):
-                im = min_y + y * y_pixel
-                z = complex(re, im)
-                self.arr[x, y] = self.compute_mandelbrot(z, iterations)
+        return self.interior_check, False, 0j
+
+    def _offset_grid(self):
+        """
+        :return: min_x, x_step, min_y, y_step of the image, as offsets from the
+        focus.
+        """
+
+        return self._pixel_grid(
+            *self.range_from_resolution(self._resolution, self.zoom, 0j, self.framerate, self.speed))
+
+    def resolve_precision(self):
+        """
+        Picks the arithmetic used by generate(). In 'auto' mode, float32 is
+        used while pixels are far enough apart for it (at shallow zooms), and
+        double-double once the distance between two pixels gets too small for
+        float64 to tell them apart. Plain, mirrored, fused (generate_rgb()),
+        progressive and strip renders have float32 kernels. Subdivision, the
+        work counters, smooth and resumable renders compute float32 images in
+        float64.
+
+        :return: 'float32', 'float64' or 'double-double'
+        """
+
+        if self.precision != 'auto':
+            return self.precision
+
+        min_x, x_step, min_y, y_step = self._offset_grid()
+        magnitude = max(abs(self._focus.real), abs(self._focus.imag)) + max(abs(min_x), abs(min_y))
+        spacing = min(abs(x_step), abs(y_step))
+        if spacing < magnitude * precision_module.FLOAT64_SPACING:
+            return 'double-double'
+        if self._float32_kernel is not None and spacing >= magnitude * precision_module.FLOAT32_SPACING:
+            return 'float32'
+        return 'float64'
+
+    def generate_double_double(self):
+
+        """
+        Generates the set in self.arr with double-double arithmetic. Pixel
+        coordinates are formed by adding float64 offsets to the focus as
+        double-doubles, so they are never rounded to float64.
+
+        :return: None
+        """
+
+        with span('setup'):
+            focus = double_double.split(self._focus_decimal[0]) + double_double.split(self._focus_decimal[1])
+            args = focus + self._offset_grid() + (self.iterations,) + self._kernel_args()
+
+        engine.render_tiles(self._double_double_kernel, self.arr, args, workers=self.workers)
+
+    def generate_progressive(self, start_step=8):
+
+        """
+        Generates the set in self.arr in passes of increasing resolution. The
+        first pass computes every start_step-th pixel along both axes, and
+        every following pass halves the step, computing only the pixels that
+        are new. A preview is yielded after every pass, so a caller can show a
+        coarse image right away and stop iterating to cancel the render. The
+        last preview is self.arr itself, identical to the one of generate().
+
+        :param start_step: Step of the first pass, rounded down to a power of 2.
+        :return: Iterator over (step, preview) tuples. The preview is a full
+        size iteration array, where every pixel holds the value of the
+        closest computed pixel above and to the left of it.
+        """
+
+        if self._tile_kernel is None or self.resolve_precision() == 'double-double':
+            self.generate()
+            yield 1, self.arr
+            return
+
+        with span('setup'):
+            bounds = self.range_from_resolution(self._resolution, self.zoom, self._focus, self.framerate, self.speed)
+            grid = self._pixel_grid(*bounds) + (self.iterations,) + self._escape_args()
+            strided_tile = kernels.strided_tile
+            if not self.subdivide and self._float32_kernel is not None and self.resolve_precision() == 'float32':
+                strided_tile = float32.strided_tile
+        width, height = self.arr.shape
+
+        step = 1 << (max(int(start_step), 1).bit_length() - 1)
+        passes = [(0, 0, step, step)]
+        while step >= 1:
+            # Powers of 2 keep pixel coordinates identical to those of generate()
+            for origin_x, origin_y, x_stride, y_stride in passes:
+                engine.render_tiles(strided_tile, self.arr[origin_x::x_stride, origin_y::y_stride],
+                                    (origin_x, origin_y, x_stride, y_stride) + grid, workers=self.workers)
+
+            if step == 1:
+                yield step, self.arr
+            else:
+                yield step, self.arr[::step, ::step].repeat(step, axis=0).repeat(step, axis=1)[:width, :height]
+
+            step //= 2
+            passes = [(step, 0, 2 * step, step), (0, step, 2 * step, 2 * step)]
+
+    def generate_resumable(self):
+
+        """
+        Generates the set in self.arr, keeping the orbit of every pixel that
+        hasn't escaped. If the previous call rendered the same image with
+        fewer iterations, only those pixels are continued, from where they
+        stopped. Raising the iteration limit then costs time proportional to
+        the number of pixels in the set, instead of the whole image.
+
+        :return: None
+        """
+
+        with span('setup'):
+            bounds = self.range_from_resolution(self._resolution, self.zoom, self._focus, self.framerate, self.speed)
+            grid = self._pixel_grid(*bounds)
+        key = repr((type(self).__name__, tuple(self._resolution), grid, self._escape_args()))
+
+        start = 0
+        if self._orbits is not None and self._orbit_key == key and self._orbit_iterations <= self.iterations:
+            start = self._orbit_iterations
+        else:
+            # The array may have been loaded for another image
+            self._arr = None
+            self._orbits = np.empty(self.arr.shape, dtype=np.complex128)
+
+        self.resumed_pixels = sum(engine.render_tiles(
+            kernels.resumable_tile, self.arr,
+            (self._orbits,) + grid + (start, self.iterations) + self._escape_args(), workers=self.workers))
+        self._orbit_key, self._orbit_iterations = key, self.iterations
+
+    def save_state(self, path):
+        """
+        Saves the iteration array and orbits of a resumable generator, so
+        another process can continue the render with more iterations.
+
+        :param path: Path of the .npz file.
+        """
+
+        np.savez(path, arr=self.arr, orbits=self._orbits, key=self._orbit_key, iterations=self._orbit_iterations)
+
+    def load_state(self, path):
+        """
+        Loads the state saved by save_state(). The next call to
+        generate_resumable() continues it if it describes the same image.
+
+        :param path: Path of the .npz file.
+        :return: None
+        """
+
+        with np.load(path) as state:
+            self.arr = state['arr']
+            self._orbits = state['orbits']
+            self._orbit_key = str(state['key'])
+            self._orbit_iterations = int(state['iterations'])
+
+    def _strip_kernel(self):
+        """
+        :return: (kernel, args) tuple that renders any part of the image with
+        engine.render_tiles(), in the arithmetic picked by resolve_precision().
+        """
+
+        if self._double_double_kernel is not None and self.resolve_precision() == 'double-double':
+            focus = double_double.split(self._focus_decimal[0]) + double_double.split(self._focus_decimal[1])
+            return self._double_double_kernel, focus + self._offset_grid() + (self.iterations,) + self._kernel_args()
+
+        bounds = self.range_from_resolution(self._resolution, self.zoom, self._focus, self.framerate, self.speed)
+        kernel = self._subdivide_kernel if self.subdivide else self._tile_kernel
+        if not self.subdivide and self._float32_kernel is not None and self.resolve_precision() == 'float32':
+            kernel = self._float32_kernel
+        return kernel, self._pixel_grid(*bounds) + (self.iterations,) + self._kernel_args()
+
+    def generate_strip(self, y0, y1, out=None):
+
+        """
+        Generates the rows y0 to y1 of the image, without touching self.arr.
+        Rendering an image strip by strip keeps the memory used independent of
+        its size (see streaming.render_strips()). The pixels are identical to
+        those of generate().
+
+        :param y0: First row of the strip.
+        :param y1: Row after the last row of the strip.
+        :param out: Optional (width, y1 - y0) array to be filled.
+        :return: Iteration array of the strip, indexed [x, y - y0].
+        """
+
+        if out is None:
+            out = np.zeros((self._resolution[0], y1 - y0), dtype=self.dtype)
+
+        with span('setup'):
+            kernel, args = self._strip_kernel()
+        engine.render_tiles(kernel, out, args, workers=self.workers, origin=(0, y0))
+        return out
 
     def generate(self):
-        self.generate_set(
-            *self.range_from_resolution(
-                self._resolution, self.zoom, self._focus, self.framerate, self.speed), self.iterations)
+        # The first call of a jitted function compiles it (or loads it from the
+        # disk cache), and initializes numba itself.
+        with span('compile'):
+            self.range_from_resolution(self._resolution, self.zoom, self._focus, self.framerate, self.speed)
+
+        with span('setup'):
+            precision = self.resolve_precision()
+        self.edge_samples = None
+
+        if self._double_double_kernel is not None and precision == 'double-double':
+            self.generate_double_double()
+            return
+
+        if self.resumable and self._tile_kernel is not None:
+            self.generate_resumable()
+        else:
+            with span('setup'):
+                bounds = self.range_from_resolution(self._resolution, self.zoom, self._focus, self.framerate,
+                                                    self.speed)
+            self.generate_set(*bounds, self.iterations)
+
+        if self.antialias and self._tile_kernel is not None:
+            self.refine_edges()
+
+
+class MandelbrotGenerator(Generator):
+
+    def __init__(self, focus=0 + 0j, zoom=1, resolution=(3840, 2160), framerate=24, speed=2, iterations=256,
+                 workers=None, interior_check=True, subdivide=False, precision='auto', cache=None,
+                 resumable=False, collect_stats=False, dtype='auto', smooth=False, symmetry=True,
+                 antialias=0, sample_budget=None):
+        super().__init__(
+            focus=focus, zoom=zoom, resolution=resolution, framerate=framerate, speed=speed, iterations=iterations,
+            workers=workers, interior_check=interior_check, subdivide=subdivide, precision=precision,
+            cache=cache, resumable=resumable, collect_stats=collect_stats, dtype=dtype, smooth=smooth,
+            symmetry=symmetry, antialias=antialias, sample_budget=sample_budget
+        )
+
+    def __repr__(self):
+        return "<mandelbrot_generator res: {}, framerate: {}, speed: {}, iterations: {}>".format(
+            self._resolution, self.framerate, self.speed, self.iterations)
+
+    def __str__(self):
+        return self.__repr__()
+
+    compute_mandelbrot = staticmethod(kernels.compute_mandelbrot)
+    _tile_kernel = staticmethod(kernels.mandelbrot_tile)
+    _rgb_kernel = staticmethod(kernels.mandelbrot_tile_rgb)
+    _subdivide_kernel = staticmethod(kernels.mandelbrot_tile_subdivide)
+    _double_double_kernel = staticmethod(double_double.mandelbrot_tile)
+    _float32_kernel = staticmethod(float32.mandelbrot_tile)
+    _float32_rgb_kernel = staticmethod(float32.mandelbrot_tile_rgb)
+
+    def _mirror_columns(self, columns):
+        # The set is symmetric about the real axis
+        return np.arange(len(columns))
 
 
 class JuliaGenerator(Generator):
-    def __init__(self, focus=0 + 0j, zoom=1, resolution=(3840, 2160), framerate=24, speed=2, iterations=256, c=0 + 0j):
+    def __init__(self, focus=0 + 0j, zoom=1, resolution=(3840, 2160), framerate=24, speed=2, iterations=256, c=0 + 0j,
+                 workers=None, interior_check=True, subdivide=False, precision='auto', cache=None,
+                 resumable=False, collect_stats=False, dtype='auto', smooth=False, symmetry=True,
+                 antialias=0, sample_budget=None):
         super().__init__(
-            focus=focus, zoom=zoom, resolution=resolution, framerate=framerate, speed=speed, iterations=iterations
+            focus=focus, zoom=zoom, resolution=resolution, framerate=framerate, speed=speed, iterations=iterations,
+            workers=workers, interior_check=interior_check, subdivide=subdivide, precision=precision,
+            cache=cache, resumable=resumable, collect_stats=collect_stats, dtype=dtype, smooth=smooth,
+            symmetry=symmetry, antialias=antialias, sample_budget=sample_budget
         )
         self._c = c
 
@@ -181,65 +758,155 @@ class JuliaGenerator(Generator):
         return "<julia_generator res: {}, framerate: {}, speed: {}, iterations: {}, c: {}>".format(
             self._resolution, self.framerate, self.speed, self.iterations, self._c)
 
-    @staticmethod
-    @jit(nopython=True)
-    def compute_julia(z: complex, c: complex, max_iter: int):
+    compute_julia = staticmethod(kernels.compute_julia)
+    _tile_kernel = staticmethod(kernels.julia_tile)
+    _rgb_kernel = staticmethod(kernels.julia_tile_rgb)
+    _subdivide_kernel = staticmethod(kernels.julia_tile_subdivide)
+    _double_double_kernel = staticmethod(double_double.julia_tile)
+    _float32_kernel = staticmethod(float32.julia_tile)
+    _float32_rgb_kernel = staticmethod(float32.julia_tile_rgb)
+
+    def _kernel_args(self):
+        return self.interior_check, self._c
+
+    def _escape_args(self):
+        return self.interior_check, True, self._c
+
+    def _mirror_columns(self, columns):
+        # Julia sets are symmetric about 0
+        return mirror_indices(columns)
 
+
+class DeepMandelbrotGenerator(Generator):
+    def __init__(self, focus='0+0j', zoom=1, resolution=(3840, 2160), framerate=24, speed=2, iterations=256,
+                 workers=None, series_approximation=True, dtype='auto'):
+        """
+        Renders the mandelbrot set by perturbation around a reference orbit at
+        the focus, which allows zooms far beyond the precision of float64 (up
+        to a zoom of about 1000).
+
+        :param focus: Focus of the image, as a string with any number of
+        digits (or as a complex number).
+        :param series_approximation: Skips the first iterations of every
+        pixel with a series approximation.
+        """
+
+        super().__init__(
+            focus=focus, zoom=zoom, resolution=resolution, framerate=framerate, speed=speed,
+            iterations=iterations, workers=workers, interior_check=False, dtype=dtype
+        )
+        self.series_approximation = series_approximation
+        self.skipped_iterations = 0
+        self.rebases = 0
+        self._orbit = None
+
+    def __repr__(self):
+        return "<deep_mandelbrot_generator res: {}, framerate: {}, speed: {}, iterations: {}, focus: {}>".format(
+            self._resolution, self.framerate, self.speed, self.iterations, self._focus_decimal)
+
+    def reference_orbit(self, iterations, digits):
         """
-        Computes if a complex number z is in the julia set of c, returning the
-        number of iterations required for divergence, up to max_iter.
+        Returns the orbit of the focus, reusing the last one if it was
+        computed with enough iterations and digits (as it is in a zoom).
 
-        :param z: Complex number to be tested for divergence.
-        :param c: Constant around which a julia set is constructed
-        :param max_iter: Maximum number of iterations before z is declared to
-        be in the set.
-        :return: Number of iterations for divergence (if divergence occurs),
-        else max_iter.
+        :param iterations: Maximum number of iterations.
+        :param digits: Number of significant digits needed.
+        :return: Reference orbit, see perturbation.reference_orbit()
         """
 
-        for i in range(max_iter):
-            if z.real * z.real + z.imag * z.imag > 4:
-                return i
-            z = z * z + c
-        return max_iter
+        if self._orbit is None or self._orbit[0] != iterations or self._orbit[1] < digits:
+            orbit = perturbation.reference_orbit(*self._focus_decimal, iterations, digits)
+            self._orbit = (iterations, digits, orbit)
+        return self._orbit[2]
 
-    @jit
     def generate_set(self, min_x, max_x, min_y, max_y, iterations):
 
         """
-        Generates a julia set in self.arr with each element carrying
-        the number of iterations. The array is bounded by four numbers
-        (min_x, max_x, min_y, max_y) each determining the maximum and minimum
-        real/imaginary values that are computed. Each element in the array
-        directly corresponds to one pixel. *args are passed to the computation
-        function.
-
-        :param min_x: Minimum x-value to be computed.
-        :param max_x: Maximum x-value to be computed.
-        :param min_y: Minimum y-value to be computed.
-        :param max_y: Maximum x-value to be computed.
+        Generates the mandelbrot set in self.arr, like Generator.generate_set().
+        The four bounds are offsets from the focus rather than absolute
+        values, so they don't need more precision than a float64.
+
+        :param min_x: Minimum x-offset to be computed.
+        :param max_x: Maximum x-offset to be computed.
+        :param min_y: Minimum y-offset to be computed.
+        :param max_y: Maximum y-offset to be computed.
         :param iterations: number of iterations before the program determines
         convergence
         :return: None
         """
 
-        # arr is a 2D np array containing the image.
-        height = self.arr.shape[0]
-        width = self.arr.shape[1]
+        with span('setup'):
+            args = self._perturbation_args(min_x, max_x, min_y, max_y, iterations)
+        self.skipped_iterations = args[-4] - 1
+        self.rebases = sum(engine.render_tiles(perturbation.perturbation_tile, self.arr, args, workers=self.workers))
 
-        # This is the step value of a pixel.
-        x_pixel = (max_x - min_x) / height
-        y_pixel = (max_y - min_y) / width
+    def _perturbation_args(self, min_x, max_x, min_y, max_y, iterations):
+        """
+        Computes the reference orbit and series approximation of an image.
+
+        :return: Arguments of perturbation.perturbation_tile().
+        """
+
+        min_x, x_step, min_y, y_step = self._pixel_grid(min_x, max_x, min_y, max_y)
+        orbit = self.reference_orbit(iterations, perturbation.digits_for_step(min(x_step, y_step)))
+
+        skip, a, b, c = 1, 1 + 0j, 0j, 0j
+        if self.series_approximation:
+            max_x = min_x + (self._resolution[0] - 1) * x_step
+            max_y = min_y + (self._resolution[1] - 1) * y_step
+            corners = np.array([complex(min_x, min_y), complex(min_x, max_y),
+                                complex(max_x, min_y), complex(max_x, max_y)])
+            skip, a, b, c = perturbation.series_approximation(orbit, corners, iterations)
+
+        return min_x, x_step, min_y, y_step, iterations, orbit, skip, a, b, c
 
-        # computes the value for the mandelbrot set at each pixel.
-        for x in range(height):
-            re = min_x + x * x_pixel
-            for y in range(width):
-                im = min_y + y * y_pixel
-                z = complex(re, im)
-                self.arr[x, y] = self.compute_julia(z, self._c, iterations)
+    def _strip_kernel(self):
+        bounds = self.range_from_resolution(self._resolution, self.zoom, 0j, self.framerate, self.speed)
+        return perturbation.perturbation_tile, self._perturbation_args(*bounds, self.iterations)
 
     def generate(self):
-        self.generate_set(
-            *self.range_from_resolution(
-                self._resolution, self.zoom, self._focus, self.framerate, self.speed), self.iterations)
+        with span('setup'):
+            bounds = self.range_from_resolution(self._resolution, self.zoom, 0j, self.framerate, self.speed)
+        self.generate_set(*bounds, self.iterations)
+
+
+def warmup():
+    """
+    Compiles the kernels of every generator by rendering tiny images in every
+    mode. Compiled kernels are cached on disk (in __pycache__), so later runs,
+    and other processes, load them instead of compiling them again.
+
+    :return: None
+    """
+
+    options = dict(resolution=(16, 16), framerate=-1, iterations=16, workers=1)
+    palette = np.zeros((options['iterations'] + 1, 3), dtype=np.uint8)
+
+    for generator_type in (MandelbrotGenerator, JuliaGenerator):
+        # The command line passes the zoom as an int or as a complex
+        for zoom in (0, 0j):
+            generator = generator_type(zoom=zoom, **options)
+            generator.generate()
+            generator.generate_rgb(palette)
+            generator_type(zoom=zoom, precision='float64', **options).generate_rgb(palette)
+
+        # Kernels are compiled for every type of iteration array
+        for dtype in DTYPES[1:]:
+            generator_type(dtype=dtype, **options).generate()
+            generator_type(dtype=dtype, precision='float64', symmetry=False, **options).generate()
+            generator_type(dtype=dtype, subdivide=True, **options).generate()
+            generator_type(dtype=dtype, precision='double-double', **options).generate()
+            generator_type(dtype=dtype, precision='float64', **options).generate()
+            generator_type(dtype=dtype, resumable=True, **options).generate()
+            generator_type(dtype=dtype, collect_stats=True, **options).generate()
+            generator_type(dtype=dtype, smooth=True, **options).generate()
+            generator_type(dtype=dtype, antialias=4, **options).generate()
+
+    # Imported here, as zooms are built on generators
+    from src.zoom import ExponentialZoom
+
+    for dtype in DTYPES[1:]:
+        DeepMandelbrotGenerator(dtype=dtype, **options).generate()
+        sweep.JuliaSweep(JuliaGenerator(dtype=dtype, **options)).render([0j, 1j])
+        for generator_type in (MandelbrotGenerator, JuliaGenerator):
+            list(ExponentialZoom(generator_type(dtype=dtype, precision='float64', **options), 2))
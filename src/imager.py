@@ -2,15 +2,20 @@
 
 from PIL import Image
 from src.generator import Generator
-from src import color_functions
+from src.zoom import zoom_frames
+from src import color_functions, streaming, supersampling, sweep
+from src.instrumentation import span
+import io
+import os
 import sys
 
 
 class Imager:
 
-    def __init__(self, generator: Generator):
+    def __init__(self, generator: Generator, fused=False):
         self.__generator = generator
         self.__save_ctr = 0
+        self.fused = fused
 
     def __repr__(self):
         return "<Imager containing: {} on counter {}>".format(self.__generator, self.__save_ctr)
@@ -22,7 +27,9 @@ class Imager:
 
         """
         This is a wrapper function that generates the numpy array and turns it
-        into a colorized image. Returns the image as a byte array.
+        into a colorized image. Returns the image as a byte array. If the
+        imager is fused, the generator writes colors directly and no iteration
+        array is kept.
 
         :param color_type: Short string representations of a color function
         :param kwargs: Passed to the color function
@@ -32,12 +39,124 @@ class Imager:
         if kwargs['cutoff'] is None:
             del kwargs['cutoff']
 
-        resolution = self.__generator._resolution
+        color_function = self.__color_function(color_type)
         iterations = self.__generator.iterations
-        image = Image.new("RGB", resolution)
+
+        if self.fused:
+            # The generator colors each pixel as it is computed
+            with span('colorize'):
+                palette = color_functions.build_palette(color_function, iterations, **kwargs)
+            return Image.fromarray(self.__generator.generate_rgb(palette))
+
         self.__generator.generate()
         generated_array = self.__generator.arr
 
+        with span('colorize'):
+            kwargs = color_functions.frame_kwargs(generated_array, color_function, iterations, **kwargs)
+            if self.__generator.smooth_arr is not None:
+                rgb = color_functions.colorize_smooth(self.__generator.smooth_arr, color_function, iterations, **kwargs)
+            elif self.__generator.edge_samples is not None:
+                palette = color_functions.build_palette(color_function, iterations, **kwargs)
+                rgb = supersampling.blend(palette[generated_array.T], *self.__generator.edge_samples, palette)
+            else:
+                rgb = color_functions.colorize(generated_array, color_function, iterations, **kwargs)
+            image = Image.fromarray(rgb)
+
+        return image
+
+    def stream_image(self, path, color_type='sin', memory=1 << 28, raw=None, **kwargs):
+
+        """
+        Renders the image straight to a PNG file in horizontal strips, so
+        images larger than the memory can be rendered. See
+        streaming.render_strips().
+
+        :param path: Path of the PNG file.
+        :param color_type: Short string representations of a color function
+        :param memory: Approximate number of bytes used by a strip.
+        :param raw: Optional path of a .npy file for the iteration counts.
+        :param kwargs: Passed to the color function
+        :return: Number of strips.
+        """
+
+        if kwargs.get('cutoff', 0) is None:
+            del kwargs['cutoff']
+
+        iterations = self.__generator.iterations
+        palette = color_functions.build_palette(self.__color_function(color_type), iterations, **kwargs)
+
+        return streaming.render_strips(self.__generator, palette, path, memory=memory, raw=raw)
+
+    def generate_zoom(self, frames, color_type='sin', freeze_histogram=False, frame_range=None, rgb=False, **kwargs):
+
+        """
+        Generates the frames of a zoom into the focus, starting at the zoom of
+        the generator and zooming in by one step every frame. Frames are
+        resampled from an exponential map while that is cheaper than
+        rendering them, and rendered like single images otherwise (see
+        zoom.zoom_frames()).
+
+        :param frames: Number of frames.
+        :param color_type: Short string representations of a color function
+        :param freeze_histogram: With the 'histogram' color function, colors
+        every frame with the histogram of the first one instead of its own,
+        so that colors don't flicker from one frame to the next.
+        :param frame_range: Optional (start, stop) range of the frames to be
+        generated. The frames before start are never computed.
+        :param rgb: Yields (height, width, 3) uint8 arrays instead of PIL
+        images, for video encoders.
+        :param kwargs: Passed to the color function
+        :return: Iterator over PIL images
+        """
+
+        start, stop = frame_range or (0, frames)
+        return self.__color_frames(zoom_frames(self.__generator, frames, start, stop), color_type, freeze_histogram,
+                                   rgb, **kwargs)
+
+    def generate_sweep(self, cs, color_type='sin', freeze_histogram=False, frame_range=None, rgb=False, **kwargs):
+
+        """
+        Generates the julia sets of many values of c, in the view of the
+        generator (see sweep.JuliaSweep). The frames are rendered a batch at
+        a time.
+
+        :param cs: Sequence of values of c.
+        :param color_type: Short string representations of a color function
+        :param freeze_histogram: See generate_zoom()
+        :param frame_range: Optional (start, stop) range of the frames to be
+        generated.
+        :param rgb: See generate_zoom()
+        :param kwargs: Passed to the color function
+        :return: Iterator over PIL images
+        """
+
+        start, stop = frame_range or (0, len(cs))
+        frames = (arr.T for arr in sweep.JuliaSweep(self.__generator).frames(cs[start:stop]))
+        return self.__color_frames(frames, color_type, freeze_histogram, rgb, **kwargs)
+
+    def __color_frames(self, frames, color_type, freeze_histogram, rgb, **kwargs):
+        if kwargs.get('cutoff', 0) is None:
+            del kwargs['cutoff']
+
+        color_function = self.__color_function(color_type)
+        iterations = self.__generator.iterations
+        # Histogram equalization depends on the frame, so it gets a palette per frame
+        per_frame = color_function is color_functions.histogram_colorize and kwargs.get('cdf') is None
+
+        palette = None
+        for arr in frames:
+            with span('colorize'):
+                if palette is None or (per_frame and not freeze_histogram):
+                    palette = color_functions.build_palette(
+                        color_function, iterations, **color_functions.frame_kwargs(arr, color_function, iterations,
+                                                                                  **kwargs))
+                image = palette[arr.T]
+                if not rgb:
+                    image = Image.fromarray(image)
+            yield image
+
+    @staticmethod
+    def __color_function(color_type):
         if color_type not in color_functions.color_function_dict.keys():
             raise Exception('Not a valid colorization function!')
 
@@ -46,12 +165,7 @@ class Imager:
             print('ERROR: {} has not been implemented yet.'.format(color_type))
             sys.exit(0)
 
-        # -2.0, 1.0, -1.25, 1.25
-        for x in range(resolution[1]):
-            for y in range(resolution[0]):
-                image.putpixel((y, x), color_function(generated_array[y][x], iterations, **kwargs))
-
-        return image
+        return color_function
 
     def save_image(self, image):
 
@@ -61,5 +175,45 @@ class Imager:
         :param image: PIL image
         """
 
-        image.save(r"mandelbrot_demo\mandelbrot_set_{}.png".format(str(self.__save_ctr).zfill(3)))
+        os.makedirs('mandelbrot_demo', exist_ok=True)
+        write_image(image, frame_name(os.path.join('mandelbrot_demo', 'mandelbrot_set.png'), self.__save_ctr))
         self.__save_ctr += 1
+
+
+def frame_name(name, index):
+    """
+    Returns the file name of one frame of a sequence. '{}' in name is replaced
+    by the frame number, otherwise the number is appended to the name.
+
+    :param name: File name, such as 'zoom.png' or 'zoom_{:04d}.png'
+    :param index: Frame number
+    :return: File name of the frame, such as 'zoom_007.png'
+    """
+
+    if '{' in name:
+        return name.format(index)
+
+    root, extension = os.path.splitext(name)
+    return '{}_{}{}'.format(root, str(index).zfill(3), extension)
+
+
+def write_image(image, path):
+    """
+    Saves an image, timing its encoding and the writing of the file as two
+    spans (see instrumentation).
+
+    :param image: PIL image
+    :param path: File name. The extension determines the format.
+    :return: None
+    """
+
+    image_format = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+    if image_format is None:
+        raise ValueError('Unknown image format: {}'.format(path))
+
+    encoded = io.BytesIO()
+    with span('encode'):
+        image.save(encoded, format=image_format)
+    with span('save'):
+        with open(path, 'wb') as file:
+            file.write(encoded.getbuffer())
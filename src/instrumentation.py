@@ -0,0 +1,124 @@
+#  Copyright (c) 2019 AgentElement
+
+from collections import OrderedDict
+import contextlib
+import time
+
+################################################################################
+# INSTRUMENTATION
+################################################################################
+
+# The stages of a render are wrapped in named spans:
+#
+#   compile  - compiling (or loading from the disk cache) a kernel
+#   setup    - bounds, pixel grid, reference orbit and series approximation
+#   iterate  - running the tile kernels
+#   colorize - building the palette and coloring the iteration counts
+#   encode   - compressing the image (PNG...)
+#   save     - writing the file
+#
+# When a span ends, every registered hook is called with its name and duration.
+# Without hooks, a span only costs two calls to perf_counter().
+
+SPANS = ('compile', 'setup', 'iterate', 'colorize', 'encode', 'save')
+
+_hooks = []
+
+
+def add_hook(hook):
+    """
+    Registers a function called as hook(name, seconds) whenever a span ends.
+
+    :param hook: Function, or Timings instance.
+    :return: hook, so it can be removed later.
+    """
+
+    _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    """
+    Unregisters a hook added by add_hook().
+
+    :param hook: Hook to remove.
+    :return: None
+    """
+
+    _hooks.remove(hook)
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Times the code it wraps, and reports it to the hooks under name:
+
+    with instrumentation.span('colorize'):
+        ...
+
+    :param name: Name of the span, usually one of SPANS.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        for hook in list(_hooks):
+            hook(name, seconds)
+
+
+class Timings:
+
+    def __init__(self):
+        """
+        Hook adding up the time and number of calls of every span. Use it with
+        add_hook(), or as a context manager that registers it while active:
+
+        with Timings() as timings:
+            imager.generate_image()
+        print(timings.report())
+        """
+
+        self.spans = OrderedDict((name, [0.0, 0]) for name in SPANS)
+
+    def __repr__(self):
+        return "<timings: {}>".format(
+            ', '.join('{} {}s'.format(name, round(seconds, 3)) for name, (seconds, _) in self.spans.items()))
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __call__(self, name, seconds):
+        total = self.spans.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+
+    def __enter__(self):
+        return add_hook(self)
+
+    def __exit__(self, *exception):
+        remove_hook(self)
+
+    def as_dict(self):
+        """
+        :return: {name: {'seconds': total time, 'calls': number of spans}}
+        """
+
+        return OrderedDict((name, {'seconds': seconds, 'calls': calls})
+                           for name, (seconds, calls) in self.spans.items())
+
+    def report(self, total=None):
+        """
+        :param total: Optional wall time of the whole render, printed with the
+        time not covered by any span.
+        :return: Human readable table of the spans.
+        """
+
+        lines = ['{:<10} {:>10.3f} s {:>6} calls'.format(name, seconds, calls)
+                 for name, (seconds, calls) in self.spans.items()]
+        if total is not None:
+            covered = sum(seconds for seconds, _ in self.spans.values())
+            lines.append('{:<10} {:>10.3f} s'.format('other', max(total - covered, 0.0)))
+            lines.append('{:<10} {:>10.3f} s'.format('total', total))
+        return '\n'.join(lines)
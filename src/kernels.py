@@ -0,0 +1,679 @@
+#  Copyright (c) 2019 AgentElement
+
+import numpy as np
+from numba import jit
+
+
+################################################################################
+# ESCAPE-TIME FUNCTIONS
+################################################################################
+
+
+# Two orbit points closer than this (in both coordinates) are considered equal
+# by the periodicity check.
+PERIODICITY_TOLERANCE = 1e-13
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def in_main_bulbs(re, im):
+    """
+    Tests if a point lies in the main cardioid or the period-2 bulb of the
+    mandelbrot set. Both are known analytically, so their points don't need
+    to be iterated.
+
+    :param re: Real part of the point.
+    :param im: Imaginary part of the point.
+    :return: True if the point is in the main cardioid or the period-2 bulb.
+    """
+
+    q = (re - 0.25) * (re - 0.25) + im * im
+    if q * (q + (re - 0.25)) <= 0.25 * im * im:
+        return True
+    return (re + 1) * (re + 1) + im * im <= 0.0625
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def iterate(z, c, max_iter, periodicity_check):
+    """
+    Iterates z -> z^2 + c until z escapes or max_iter is reached.
+
+    If periodicity_check is set, the orbit is compared against a saved point
+    whose distance (in steps) doubles every time it is refreshed (Brent's
+    cycle detection). An orbit that returns to the saved point is periodic and
+    will never escape, so max_iter is returned immediately.
+
+    :param z: Starting point of the orbit.
+    :param c: Constant added on every iteration.
+    :param max_iter: Maximum number of iterations.
+    :param periodicity_check: Enables the cycle detection.
+    :return: Number of iterations for divergence (if divergence occurs),
+    else max_iter.
+    """
+
+    if not periodicity_check:
+        for i in range(max_iter):
+            if z.real * z.real + z.imag * z.imag > 4:
+                return i
+            z = z * z + c
+        return max_iter
+
+    saved = z
+    steps = 0
+    period = 1
+    for i in range(max_iter):
+        if z.real * z.real + z.imag * z.imag > 4:
+            return i
+        z = z * z + c
+
+        if abs(z.real - saved.real) < PERIODICITY_TOLERANCE and abs(z.imag - saved.imag) < PERIODICITY_TOLERANCE:
+            return max_iter
+
+        steps += 1
+        if steps == period:
+            saved = z
+            steps = 0
+            period *= 2
+    return max_iter
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def compute_mandelbrot(z: complex, max_iter: int, interior_check=False):
+
+    """
+    Computes if a complex number z is in the set, returning the number of
+    iterations required for divergence, up to max_iter.
+
+    :param z: Complex number to be tested for divergence.
+    :param max_iter: Maximum number of iterations before z is declared to
+    be in the set.
+    :param interior_check: Skips points in the main cardioid and period-2
+    bulb, and stops iterating periodic orbits.
+    :return: Number of iterations for divergence (if divergence occurs),
+    else max_iter.
+    """
+
+    if interior_check and in_main_bulbs(z.real, z.imag):
+        return max_iter
+    return iterate(z, z, max_iter, interior_check)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def compute_julia(z: complex, c: complex, max_iter: int, interior_check=False):
+
+    """
+    Computes if a complex number z is in the julia set of c, returning the
+    number of iterations required for divergence, up to max_iter.
+
+    :param z: Complex number to be tested for divergence.
+    :param c: Constant around which a julia set is constructed
+    :param max_iter: Maximum number of iterations before z is declared to
+    be in the set.
+    :param interior_check: Stops iterating periodic orbits.
+    :return: Number of iterations for divergence (if divergence occurs),
+    else max_iter.
+    """
+
+    return iterate(z, c, max_iter, interior_check)
+
+
+################################################################################
+# TILE KERNELS
+################################################################################
+
+# Every tile kernel takes a (possibly non-contiguous) view into the iteration
+# array together with the pixel offset (x0, y0) of the view's first element.
+# Coordinates are always computed from the global pixel index, so a frame
+# rendered as many tiles is bit-identical to one rendered in a single pass.
+# The kernels release the GIL, which lets the engine run them on threads.
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def mandelbrot_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check):
+    """
+    Fills arr with the mandelbrot iteration counts of the pixels it covers.
+
+    :param arr: View into the iteration array.
+    :param x0: x-index of arr[0, 0] in the full array.
+    :param y0: y-index of arr[0, 0] in the full array.
+    :param min_x: Real value of pixel 0.
+    :param x_step: Real distance between two pixels.
+    :param min_y: Imaginary value of pixel 0.
+    :param y_step: Imaginary distance between two pixels.
+    :param max_iter: Maximum number of iterations.
+    :param interior_check: Enables the interior short-circuits, see
+    compute_mandelbrot().
+    :return: None
+    """
+
+    for x in range(arr.shape[0]):
+        re = min_x + (x0 + x) * x_step
+        for y in range(arr.shape[1]):
+            im = min_y + (y0 + y) * y_step
+            arr[x, y] = compute_mandelbrot(complex(re, im), max_iter, interior_check)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def julia_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, c):
+    """
+    Fills arr with the julia iteration counts of the pixels it covers. See
+    mandelbrot_tile() for the meaning of the parameters.
+
+    :param c: Constant around which a julia set is constructed
+    :return: None
+    """
+
+    for x in range(arr.shape[0]):
+        re = min_x + (x0 + x) * x_step
+        for y in range(arr.shape[1]):
+            im = min_y + (y0 + y) * y_step
+            arr[x, y] = compute_julia(complex(re, im), c, max_iter, interior_check)
+
+
+# The rgb kernels are fused variants of the tile kernels above. Instead of
+# storing the iteration count they look it up in a palette (see
+# color_functions.build_palette()) and write the color straight into an
+# [x, y, channel] view of the image buffer.
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def mandelbrot_tile_rgb(rgb, x0, y0, palette, min_x, x_step, min_y, y_step, max_iter, interior_check):
+    """
+    Fills rgb with the colors of the mandelbrot iteration counts of the pixels
+    it covers. See mandelbrot_tile() for the meaning of the parameters.
+
+    :param rgb: [x, y, channel] view into the image buffer.
+    :param palette: (max_iter + 1, 3) lookup table of colors.
+    :return: None
+    """
+
+    for x in range(rgb.shape[0]):
+        re = min_x + (x0 + x) * x_step
+        for y in range(rgb.shape[1]):
+            im = min_y + (y0 + y) * y_step
+            rgb[x, y, :] = palette[compute_mandelbrot(complex(re, im), max_iter, interior_check)]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def julia_tile_rgb(rgb, x0, y0, palette, min_x, x_step, min_y, y_step, max_iter, interior_check, c):
+    """
+    Fills rgb with the colors of the julia iteration counts of the pixels it
+    covers. See mandelbrot_tile_rgb() for the meaning of the parameters.
+
+    :return: None
+    """
+
+    for x in range(rgb.shape[0]):
+        re = min_x + (x0 + x) * x_step
+        for y in range(rgb.shape[1]):
+            im = min_y + (y0 + y) * y_step
+            rgb[x, y, :] = palette[compute_julia(complex(re, im), c, max_iter, interior_check)]
+
+
+# Mariani-Silver subdivision. A rectangle whose border has a single iteration
+# count is filled with that count without computing its inside. Otherwise it
+# is split in two along its longer side, and both halves (which share the
+# dividing line) are processed the same way.
+
+# Rectangles with a side this short are computed pixel by pixel.
+MIN_SUBDIVISION = 6
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def escape_time(re, im, max_iter, interior_check, julia, c):
+    """
+    Computes a single pixel of either set.
+
+    :param julia: Computes the julia set of c if set, the mandelbrot set
+    otherwise.
+    :return: Number of iterations for divergence, else max_iter.
+    """
+
+    if julia:
+        return compute_julia(complex(re, im), c, max_iter, interior_check)
+    return compute_mandelbrot(complex(re, im), max_iter, interior_check)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def subdivide_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, julia, c):
+    """
+    Fills arr by Mariani-Silver subdivision. See mandelbrot_tile() and
+    escape_time() for the meaning of the parameters.
+
+    :return: Number of pixels that were actually computed.
+    """
+
+    width, height = arr.shape[0], arr.shape[1]
+    done = np.zeros((width, height), dtype=np.bool_)
+    computed = 0
+
+    stack = [(0, width, 0, height)]
+    while len(stack) > 0:
+        start_x, stop_x, start_y, stop_y = stack.pop()
+
+        # Computes the border, checking if it has a single value
+        uniform = True
+        value = -1
+        for x in range(start_x, stop_x):
+            for y in (start_y, stop_y - 1):
+                if not done[x, y]:
+                    arr[x, y] = escape_time(min_x + (x0 + x) * x_step, min_y + (y0 + y) * y_step,
+                                            max_iter, interior_check, julia, c)
+                    done[x, y] = True
+                    computed += 1
+                if value == -1:
+                    value = arr[x, y]
+                elif arr[x, y] != value:
+                    uniform = False
+        for y in range(start_y, stop_y):
+            for x in (start_x, stop_x - 1):
+                if not done[x, y]:
+                    arr[x, y] = escape_time(min_x + (x0 + x) * x_step, min_y + (y0 + y) * y_step,
+                                            max_iter, interior_check, julia, c)
+                    done[x, y] = True
+                    computed += 1
+                if arr[x, y] != value:
+                    uniform = False
+
+        if uniform:
+            for x in range(start_x + 1, stop_x - 1):
+                for y in range(start_y + 1, stop_y - 1):
+                    arr[x, y] = value
+                    done[x, y] = True
+
+        elif stop_x - start_x <= MIN_SUBDIVISION or stop_y - start_y <= MIN_SUBDIVISION:
+            for x in range(start_x + 1, stop_x - 1):
+                for y in range(start_y + 1, stop_y - 1):
+                    if not done[x, y]:
+                        arr[x, y] = escape_time(min_x + (x0 + x) * x_step, min_y + (y0 + y) * y_step,
+                                                max_iter, interior_check, julia, c)
+                        done[x, y] = True
+                        computed += 1
+
+        elif stop_x - start_x >= stop_y - start_y:
+            middle = (start_x + stop_x) // 2
+            stack.append((start_x, middle + 1, start_y, stop_y))
+            stack.append((middle, stop_x, start_y, stop_y))
+
+        else:
+            middle = (start_y + stop_y) // 2
+            stack.append((start_x, stop_x, start_y, middle + 1))
+            stack.append((start_x, stop_x, middle, stop_y))
+
+    return computed
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def mandelbrot_tile_subdivide(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check):
+    """
+    Subdividing variant of mandelbrot_tile().
+
+    :return: Number of pixels that were actually computed.
+    """
+
+    return subdivide_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, False, 0j)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def julia_tile_subdivide(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, c):
+    """
+    Subdividing variant of julia_tile().
+
+    :return: Number of pixels that were actually computed.
+    """
+
+    return subdivide_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, True, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def polar_tile(arr, x0, y0, focus_re, focus_im, outer_radius, log_step, angle_step, max_iter, interior_check,
+               julia, c):
+    """
+    Fills arr with the iteration counts of points on concentric rings around
+    the focus. Ring x has a radius of outer_radius * exp(-x * log_step), and
+    point y of a ring lies at an angle of y * angle_step.
+
+    :param arr: [ring, angle] view into the array of samples.
+    :param x0: Ring index of arr[0, 0].
+    :param y0: Angle index of arr[0, 0].
+    :param focus_re: Real value of the center of the rings.
+    :param focus_im: Imaginary value of the center of the rings.
+    :param outer_radius: Radius of ring 0.
+    :param log_step: Logarithmic distance between two rings.
+    :param angle_step: Angular distance between two points of a ring.
+    :return: None
+    """
+
+    for x in range(arr.shape[0]):
+        radius = outer_radius * np.exp(-(x0 + x) * log_step)
+        for y in range(arr.shape[1]):
+            angle = (y0 + y) * angle_step
+            arr[x, y] = escape_time(focus_re + radius * np.cos(angle), focus_im + radius * np.sin(angle),
+                                    max_iter, interior_check, julia, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def polar_lookup(arr, rings, first, shift, columns, rows, ring, angle, next_angle):
+    """
+    Copies the counts of the pixels of a frame whose 4x4 closest samples in
+    the rings are equal (see zoom.ExponentialZoom.frame()).
+
+    :param arr: Iteration array of the frame.
+    :param rings: [ring, angle] array of samples, starting at ring first.
+    :param first: Index of the first ring of rings.
+    :param shift: Added to the ring position of every pixel to get its ring.
+    :param columns: Column of every pixel.
+    :param rows: Row of every pixel.
+    :param ring: Position of every pixel between the rings, in the first
+    frame.
+    :param angle: Index of the closest angle below the angle of every pixel.
+    :param next_angle: Index of the closest angle above it.
+    :return: Indices of the pixels whose samples differ, which were left
+    unset.
+    """
+
+    missing = np.empty(len(columns), dtype=np.int64)
+    count = 0
+    for i in range(len(columns)):
+        r = int(np.floor(ring[i] + shift)) - first
+        a, b = angle[i], next_angle[i]
+        value = rings[r, a]
+        equal = True
+        for s in range(max(r - 1, 0), r + 3):
+            for t in (a - 1, a, b, (b + 1) % rings.shape[1]):
+                if rings[s, t] != value:
+                    equal = False
+                    break
+            if not equal:
+                break
+        if equal:
+            arr[columns[i], rows[i]] = value
+        else:
+            missing[count] = i
+            count += 1
+    return missing[:count]
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def strided_tile(arr, x0, y0, origin_x, origin_y, x_stride, y_stride, min_x, x_step, min_y, y_step, max_iter,
+                 interior_check, julia, c):
+    """
+    Fills a strided view of the iteration array, where element [x, y] of the
+    view is pixel [origin_x + x * x_stride, origin_y + y * y_stride]. The pixel
+    coordinates are computed exactly like mandelbrot_tile() does.
+
+    :param arr: View into the strided view of the iteration array.
+    :param x0: x-index of arr[0, 0] in the strided view.
+    :param y0: y-index of arr[0, 0] in the strided view.
+    :return: None
+    """
+
+    for x in range(arr.shape[0]):
+        re = min_x + (origin_x + (x0 + x) * x_stride) * x_step
+        for y in range(arr.shape[1]):
+            im = min_y + (origin_y + (y0 + y) * y_stride) * y_step
+            arr[x, y] = escape_time(re, im, max_iter, interior_check, julia, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def indexed_tile(tile, x0, y0, image, columns, rows, min_x, x_step, min_y, y_step, max_iter, interior_check,
+                 julia, c):
+    """
+    Fills scattered pixels of the iteration array. The pixels are treated as
+    a packed array, where element [x, y] is pixel [columns[x], rows[y]] of the
+    image, so they can be split into tiles like a full image. The pixel
+    coordinates are computed exactly like mandelbrot_tile() does.
+
+    :param tile: View into an array of the size of the packed array. Only its
+    shape is used, giving the extent of the tile.
+    :param x0: x-index of tile[0, 0] in the packed array.
+    :param y0: y-index of tile[0, 0] in the packed array.
+    :param image: Full iteration array, which receives the pixels.
+    :param columns: Column of the image of every column of the packed array.
+    :param rows: Row of the image of every row of the packed array.
+    :return: None
+    """
+
+    for x in range(tile.shape[0]):
+        column = columns[x0 + x]
+        re = min_x + column * x_step
+        for y in range(tile.shape[1]):
+            row = rows[y0 + y]
+            image[column, row] = escape_time(re, min_y + row * y_step, max_iter, interior_check, julia, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def scattered_tile(tile, x0, y0, image, columns, rows, min_x, x_step, min_y, y_step, max_iter, interior_check,
+                   julia, c):
+    """
+    Fills a list of scattered pixels of the iteration array: element [x, 0]
+    of the packed (pixels, 1) array is pixel [columns[x], rows[x]] of the
+    image. The pixel coordinates are computed exactly like mandelbrot_tile()
+    does.
+
+    :param tile: View into an array of the size of the packed array. Only its
+    shape is used, giving the extent of the tile.
+    :param x0: Index of tile[0, 0] in the packed array.
+    :param y0: Always 0.
+    :param image: Full iteration array, which receives the pixels.
+    :param columns: Column of the image of every pixel.
+    :param rows: Row of the image of every pixel.
+    :return: None
+    """
+
+    for x in range(tile.shape[0]):
+        column, row = columns[x0 + x], rows[x0 + x]
+        image[column, row] = escape_time(min_x + column * x_step, min_y + row * y_step, max_iter, interior_check,
+                                         julia, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def sample_tile(arr, x0, y0, points, max_iter, interior_check, julia, c):
+    """
+    Computes arbitrary points of either set, such as the subsamples of an
+    anti-aliased image (see supersampling).
+
+    :param arr: View into the array of iteration counts of the points.
+    :param x0: x-index of arr[0, 0] in the full array.
+    :param y0: y-index of arr[0, 0] in the full array.
+    :param points: complex array of the shape of the full array, holding the
+    point of every count.
+    :return: None
+    """
+
+    for x in range(arr.shape[0]):
+        for y in range(arr.shape[1]):
+            z = points[x0 + x, y0 + y]
+            arr[x, y] = escape_time(z.real, z.imag, max_iter, interior_check, julia, c)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def sweep_tile(arr, x0, y0, columns, rows, cs, max_iter, interior_check):
+    """
+    Fills part of a stack of julia sets that share their pixel grid, and only
+    differ in c (see sweep.JuliaSweep).
+
+    :param arr: View into the iteration arrays of all frames, stacked along
+    the x-axis: element [frame * width + x, y] is pixel [x, y] of a frame.
+    :param x0: x-index of arr[0, 0] in the stack.
+    :param y0: y-index of arr[0, 0] in the stack.
+    :param columns: Real part of every column of a frame.
+    :param rows: Imaginary part of every row of a frame.
+    :param cs: c of every frame.
+    :return: None
+    """
+
+    width = columns.shape[0]
+    for x in range(arr.shape[0]):
+        frame, column = divmod(x0 + x, width)
+        c = cs[frame]
+        re = columns[column]
+        for y in range(arr.shape[1]):
+            arr[x, y] = compute_julia(complex(re, rows[y0 + y]), c, max_iter, interior_check)
+
+
+# Smooth (continuous) escape counts. The iteration count n of an escaping
+# pixel is refined by how far past the escape radius its orbit went:
+#
+#   n + 1 - log2(ln|z_n| / ln 2)
+#
+# which varies continuously across the bands of constant n. Pixels that don't
+# escape are given max_iter.
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def smooth_tile(arr, x0, y0, smooth, min_x, x_step, min_y, y_step, max_iter, interior_check, julia, c):
+    """
+    Fills arr like mandelbrot_tile() or julia_tile(), and the same pixels of
+    smooth with their continuous escape counts, in the same pass.
+
+    :param smooth: float32 array of the size of the full iteration array.
+    :return: None
+    """
+
+    for x in range(arr.shape[0]):
+        re = min_x + (x0 + x) * x_step
+        for y in range(arr.shape[1]):
+            z = complex(re, min_y + (y0 + y) * y_step)
+            if interior_check and not julia and in_main_bulbs(z.real, z.imag):
+                count = max_iter
+            else:
+                count, z, _ = resume_orbit(z, c if julia else z, 0, max_iter, interior_check)
+
+            arr[x, y] = count
+            if count < max_iter:
+                smooth[x0 + x, y0 + y] = max(count + 1 - np.log2(np.log(abs(z)) / np.log(2.0)), 0.0)
+            else:
+                smooth[x0 + x, y0 + y] = max_iter
+
+
+# Work counters. These kernels compute the same iteration counts as
+# mandelbrot_tile() and julia_tile(), but also count the iterations that were
+# actually executed, which the interior checks make lower than the counts.
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def counted_escape_time(re, im, max_iter, interior_check, julia, c):
+    """
+    escape_time() that also counts the iterations executed.
+
+    :return: (iterations for divergence or max_iter, iterations executed)
+    """
+
+    z = complex(re, im)
+    if not julia:
+        if interior_check and in_main_bulbs(re, im):
+            return max_iter, 0
+        c = z
+
+    saved = z
+    steps = 0
+    period = 1
+    for i in range(max_iter):
+        if z.real * z.real + z.imag * z.imag > 4:
+            return i, i
+        z = z * z + c
+
+        if interior_check:
+            if abs(z.real - saved.real) < PERIODICITY_TOLERANCE and abs(z.imag - saved.imag) < PERIODICITY_TOLERANCE:
+                return max_iter, i + 1
+
+            steps += 1
+            if steps == period:
+                saved = z
+                steps = 0
+                period *= 2
+    return max_iter, max_iter
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def counting_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, interior_check, julia, c):
+    """
+    Fills arr like mandelbrot_tile() or julia_tile().
+
+    :return: Number of iterations executed for the tile.
+    """
+
+    executed = 0
+    for x in range(arr.shape[0]):
+        re = min_x + (x0 + x) * x_step
+        for y in range(arr.shape[1]):
+            count, work = counted_escape_time(re, min_y + (y0 + y) * y_step, max_iter, interior_check, julia, c)
+            arr[x, y] = count
+            executed += work
+    return executed
+
+
+# Resumable rendering keeps the orbit of every pixel that hasn't escaped, so a
+# later render with a higher iteration limit continues from where it stopped.
+# Orbits that are known never to escape are marked with a NaN.
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def resume_orbit(z, c, start, max_iter, periodicity_check):
+    """
+    Continues iterating z -> z^2 + c from iteration start, like iterate().
+
+    :return: (iterations, z, periodic) where z is the last point of the orbit
+    and periodic tells if the orbit was found to be periodic.
+    """
+
+    saved = z
+    steps = 0
+    period = 1
+    for i in range(start, max_iter):
+        if z.real * z.real + z.imag * z.imag > 4:
+            return i, z, False
+        z = z * z + c
+
+        if periodicity_check:
+            if abs(z.real - saved.real) < PERIODICITY_TOLERANCE and abs(z.imag - saved.imag) < PERIODICITY_TOLERANCE:
+                return max_iter, z, True
+
+            steps += 1
+            if steps == period:
+                saved = z
+                steps = 0
+                period *= 2
+    return max_iter, z, False
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def resumable_tile(arr, x0, y0, orbits, min_x, x_step, min_y, y_step, start, max_iter, interior_check, julia, c):
+    """
+    Fills arr like mandelbrot_tile() or julia_tile(), keeping the orbit of
+    every pixel in orbits. If start is 0, every pixel is computed. Otherwise,
+    only the pixels that hadn't escaped after start iterations are continued
+    from their saved orbit.
+
+    :param orbits: Complex array of the size of the full iteration array.
+    :param start: Iteration limit of the previous render, or 0.
+    :return: Number of pixels that were iterated.
+    """
+
+    iterated = 0
+    nan = complex(np.nan, np.nan)
+
+    for x in range(arr.shape[0]):
+        re = min_x + (x0 + x) * x_step
+        for y in range(arr.shape[1]):
+            if start > 0:
+                z = orbits[x0 + x, y0 + y]
+                if arr[x, y] != start:
+                    continue
+                if z.real != z.real:
+                    arr[x, y] = max_iter
+                    continue
+            else:
+                z = complex(re, min_y + (y0 + y) * y_step)
+                if interior_check and not julia and in_main_bulbs(z.real, z.imag):
+                    arr[x, y] = max_iter
+                    orbits[x0 + x, y0 + y] = nan
+                    continue
+
+            pixel_c = c if julia else complex(re, min_y + (y0 + y) * y_step)
+            count, z, periodic = resume_orbit(z, pixel_c, start, max_iter, interior_check)
+            arr[x, y] = count
+            orbits[x0 + x, y0 + y] = nan if periodic else z
+            iterated += 1
+
+    return iterated
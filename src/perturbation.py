@@ -0,0 +1,155 @@
+#  Copyright (c) 2019 AgentElement
+
+from decimal import Decimal, localcontext
+import math
+import numpy as np
+from numba import jit
+
+################################################################################
+# PERTURBATION THEORY
+################################################################################
+
+# Past a zoom of about 50, neighbouring pixels can no longer be told apart as
+# float64 numbers. Instead, one reference orbit Z_n is computed at the focus with
+# as many digits as needed, and every pixel c = C + dc is iterated as a small
+# float64 difference dz_n = z_n - Z_n:
+#
+#   dz_(n+1) = 2 * Z_n * dz_n + dz_n ^ 2 + dc
+#
+# The reference orbit starts at Z_0 = 0, so z_(n + 1) is the n-th point of the
+# orbit of compute_mandelbrot().
+#
+# When the pixel comes closer to 0 than its own difference (|z_n| < |dz_n|), the
+# difference would lose its precision (a 'glitch'). The pixel is then rebased:
+# dz is replaced by z itself, and the reference orbit is restarted at Z_0 = 0.
+# The same happens when the reference orbit escapes before the pixel does.
+
+# Digits added to those needed to tell two pixels apart.
+GUARD_DIGITS = 20
+
+# Relative error tolerated by the series approximation. It is kept within a
+# few dozen roundings of float64, so that skipping iterations doesn't move more
+# counts than iterating them would (see tests/perturbation_test.py).
+SERIES_TOLERANCE = 1e-14
+
+
+def reference_orbit(c_real: Decimal, c_imag: Decimal, max_iter, digits):
+    """
+    Computes the orbit of C = c_real + c_imag * j with the given number of
+    significant digits, stopping once it escapes.
+
+    :param c_real: Real part of the reference point.
+    :param c_imag: Imaginary part of the reference point.
+    :param max_iter: Maximum number of iterations.
+    :param digits: Number of significant digits used for the computation.
+    :return: complex128 array holding Z_0 = 0, Z_1 = C, ... rounded to float64.
+    """
+
+    orbit = np.zeros(max_iter + 2, dtype=np.complex128)
+    with localcontext() as context:
+        context.prec = digits
+        z_real, z_imag = Decimal(0), Decimal(0)
+        for n in range(1, max_iter + 2):
+            z_real, z_imag = z_real * z_real - z_imag * z_imag + c_real, 2 * z_real * z_imag + c_imag
+            orbit[n] = complex(float(z_real), float(z_imag))
+            if z_real * z_real + z_imag * z_imag > 4:
+                return orbit[:n + 1]
+    return orbit
+
+
+def digits_for_step(step):
+    """
+    :param step: Distance between two pixels.
+    :return: Number of digits needed to compute the reference orbit.
+    """
+
+    return max(int(-math.log10(step)), 0) + GUARD_DIGITS
+
+
+@jit(nopython=True, cache=True)
+def series_approximation(orbit, probes, max_iter):
+    """
+    Finds how many iterations can be skipped by approximating
+    dz_n = A_n * dc + B_n * dc^2 + C_n * dc^3. The approximation is checked
+    against probe points (usually the corners of the image), which are
+    iterated exactly alongside the coefficients.
+
+    :param orbit: Reference orbit, see reference_orbit().
+    :param probes: Array of dc values to check the approximation against.
+    :param max_iter: Maximum number of iterations.
+    :return: (n, A_n, B_n, C_n) for the last valid iteration n. Pixels start at
+    n = 1 with A = 1, B = C = 0 if nothing can be skipped.
+    """
+
+    a, b, c = 1 + 0j, 0j, 0j
+    probe_dz = probes.copy()
+
+    n = 1
+    while n < min(max_iter, len(orbit) - 2):
+        z = orbit[n]
+        next_a = 2 * z * a + 1
+        next_b = 2 * z * b + a * a
+        next_c = 2 * z * c + 2 * a * b
+
+        valid = True
+        for i in range(len(probes)):
+            dc = probes[i]
+            probe_dz[i] = (2 * z + probe_dz[i]) * probe_dz[i] + dc
+            approximation = next_a * dc + next_b * dc * dc + next_c * dc * dc * dc
+            full = orbit[n + 1] + probe_dz[i]
+            if abs(approximation - probe_dz[i]) > SERIES_TOLERANCE * abs(probe_dz[i]) \
+                    or abs(full) < abs(probe_dz[i]) or full.real * full.real + full.imag * full.imag > 4:
+                valid = False
+        if not valid:
+            break
+
+        a, b, c = next_a, next_b, next_c
+        n += 1
+
+    return n, a, b, c
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def perturbation_tile(arr, x0, y0, min_x, x_step, min_y, y_step, max_iter, orbit, skip, a, b, c):
+    """
+    Fills arr with the mandelbrot iteration counts of the pixels it covers,
+    relative to the reference orbit. The coordinates are offsets from the
+    reference point, see mandelbrot_tile() for the meaning of the other
+    parameters.
+
+    :param orbit: Reference orbit, see reference_orbit().
+    :param skip: Iteration at which the series approximation is used.
+    :param a: First series coefficient at iteration skip.
+    :param b: Second series coefficient at iteration skip.
+    :param c: Third series coefficient at iteration skip.
+    :return: Number of rebased pixel iterations.
+    """
+
+    last = len(orbit) - 1
+    rebases = 0
+
+    for x in range(arr.shape[0]):
+        re = min_x + (x0 + x) * x_step
+        for y in range(arr.shape[1]):
+            im = min_y + (y0 + y) * y_step
+            dc = complex(re, im)
+
+            dz = ((c * dc + b) * dc + a) * dc
+            m = skip
+            count = max_iter
+            for i in range(skip - 1, max_iter):
+                z = orbit[m] + dz
+                if z.real * z.real + z.imag * z.imag > 4:
+                    count = i
+                    break
+
+                if z.real * z.real + z.imag * z.imag < dz.real * dz.real + dz.imag * dz.imag or m == last:
+                    dz = z
+                    m = 0
+                    rebases += 1
+
+                dz = (2 * orbit[m] + dz) * dz + dc
+                m += 1
+            arr[x, y] = count
+
+    return rebases
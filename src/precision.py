@@ -0,0 +1,67 @@
+#  Copyright (c) 2019 AgentElement
+
+from decimal import Decimal, InvalidOperation
+import re
+
+# Float64 kernels are used while the distance between two pixels is larger than
+# this fraction of the coordinates' magnitude. That leaves 10 bits of headroom
+# for the rounding errors accumulated by the orbit.
+FLOAT64_SPACING = 2.0 ** -42
+
+# Float32 kernels are used while the distance between two pixels is larger than
+# this fraction, which leaves the same headroom within float32's 24 bits.
+FLOAT32_SPACING = 2.0 ** -13
+
+PRECISIONS = ('auto', 'float32', 'float64', 'double-double')
+
+
+def parse_complex_decimal(z):
+    """
+    Parses a complex number without rounding it to a float. The same notations
+    as the command line arguments are accepted ('@' for a leading minus sign,
+    'i', 'I', 'J' or 'j' for the imaginary unit).
+
+    :param z: String representation of a complex number.
+    :return: (real, imaginary) tuple of Decimals.
+    """
+
+    z = re.sub(r'@', '-', str(z))
+    z = re.sub(r'[iIJ]', 'j', z)
+    z = re.sub(r'[\'\" \t()]', '', z)
+
+    if not z.endswith('j'):
+        return _to_decimal(z), Decimal(0)
+
+    # The imaginary part starts at the last sign that isn't part of an exponent
+    split = 0
+    for i in range(1, len(z)):
+        if z[i] in '+-' and z[i - 1] not in 'eE':
+            split = i
+
+    real, imag = z[:split], z[split:-1]
+    if imag in ('', '+', '-'):
+        imag += '1'
+
+    return _to_decimal(real or '0'), _to_decimal(imag)
+
+
+def _to_decimal(x):
+    try:
+        return Decimal(x)
+    except InvalidOperation:
+        raise ValueError('Not a number: {}'.format(x))
+
+
+def decimal_pair(z):
+    """
+    Converts a complex number, or its string representation, to Decimals
+    without losing any digits.
+
+    :param z: Number or string.
+    :return: (real, imaginary) tuple of Decimals.
+    """
+
+    if isinstance(z, str):
+        return parse_complex_decimal(z)
+    z = complex(z)
+    return Decimal(z.real), Decimal(z.imag)
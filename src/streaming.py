@@ -0,0 +1,161 @@
+#  Copyright (c) 2019 AgentElement
+
+import struct
+import zlib
+import numpy as np
+from src.instrumentation import span
+
+################################################################################
+# STREAMING RENDERER
+################################################################################
+
+# Images too large to be held in memory (print renders of a gigapixel or more)
+# are rendered in horizontal strips. Every strip is computed, colored and
+# compressed into the output file before the next one is started, so the memory
+# used only depends on the width of the image and the strip height.
+
+# Bytes held per pixel of a strip, besides its iteration count: its RGB color
+# and the filtered PNG row passed to the compressor.
+COLOR_BYTES_PER_PIXEL = 3 + 3
+
+# Size of the IDAT chunks written to the PNG file.
+CHUNK_SIZE = 1 << 20
+
+
+class PNGWriter:
+
+    def __init__(self, path, width, height, compression=6):
+        """
+        Writes an 8-bit RGB PNG file one row at a time. Rows are compressed as
+        they come in, so the image is never held in memory.
+
+        :param path: Path of the file.
+        :param width: Width of the image.
+        :param height: Height of the image.
+        :param compression: zlib compression level.
+        """
+
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(compression)
+        self._pending = []
+        self._pending_size = 0
+
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        # 8 bits per channel, truecolor, no interlacing
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def _chunk(self, chunk_type, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def _write_data(self, data):
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= CHUNK_SIZE:
+            self._chunk(b'IDAT', b''.join(self._pending))
+            self._pending, self._pending_size = [], 0
+
+    def write_rows(self, rgb):
+        """
+        Appends rows to the image.
+
+        :param rgb: (rows, width, 3) uint8 array
+        :return: None
+        """
+
+        if rgb.shape[1:] != (self.width, 3):
+            raise ValueError('Rows must have shape (rows, {}, 3), not {}'.format(self.width, rgb.shape))
+        if self.rows + rgb.shape[0] > self.height:
+            raise ValueError('The image only has {} rows'.format(self.height))
+
+        # Every row starts with its filter type, 0 (none)
+        filtered = np.zeros((rgb.shape[0], 1 + 3 * self.width), dtype=np.uint8)
+        filtered[:, 1:] = rgb.reshape(rgb.shape[0], -1)
+        self._write_data(self._compressor.compress(filtered.tobytes()))
+        self.rows += rgb.shape[0]
+
+    def close(self):
+        """
+        Finishes the file. All rows must have been written.
+
+        :return: None
+        """
+
+        if self._file.closed:
+            return
+
+        try:
+            if self.rows != self.height:
+                raise ValueError('{} of {} rows were written'.format(self.rows, self.height))
+            self._write_data(self._compressor.flush())
+            self._chunk(b'IDAT', b''.join(self._pending))
+            self._chunk(b'IEND', b'')
+        finally:
+            self._file.close()
+
+
+def strip_height(width, memory, itemsize=2):
+    """
+    :param width: Width of the image.
+    :param memory: Number of bytes that a strip may use.
+    :param itemsize: Size of an iteration count, in bytes.
+    :return: Number of rows rendered at once.
+    """
+
+    return max(memory // (width * (itemsize + COLOR_BYTES_PER_PIXEL)), 1)
+
+
+def render_strips(generator, palette, path, memory=1 << 28, raw=None):
+    """
+    Renders the image of a generator straight to a PNG file, strip by strip.
+    The pixels are identical to those of Imager.generate_image().
+
+    :param generator: Generator of the image.
+    :param palette: (iterations + 1, 3) uint8 lookup table, see
+    color_functions.build_palette()
+    :param path: Path of the PNG file.
+    :param memory: Approximate number of bytes used by a strip.
+    :param raw: Optional path of a .npy file that receives the iteration
+    counts, as a (height, width) array. It is written through a memory map, and
+    can be opened with np.load(raw, mmap_mode='r').
+    :return: Number of strips.
+    """
+
+    width, height = generator._resolution
+    rows = strip_height(width, memory, np.dtype(generator.dtype).itemsize)
+
+    iterations = None
+    if raw is not None:
+        iterations = np.lib.format.open_memmap(raw, mode='w+', dtype=generator.dtype, shape=(height, width))
+
+    strips = 0
+    with PNGWriter(path, width, height) as writer:
+        for y0 in range(0, height, rows):
+            y1 = min(y0 + rows, height)
+            strip = generator.generate_strip(y0, y1)
+            with span('colorize'):
+                rgb = palette[strip.T]
+            # The file is written as it is compressed
+            with span('encode'):
+                writer.write_rows(rgb)
+            if iterations is not None:
+                with span('save'):
+                    iterations[y0:y1] = strip.T
+            strips += 1
+
+    if iterations is not None:
+        iterations.flush()
+        del iterations
+
+    return strips
@@ -0,0 +1,111 @@
+#  Copyright (c) 2019 AgentElement
+
+import numpy as np
+
+################################################################################
+# ADAPTIVE SUPERSAMPLING
+################################################################################
+
+# Rendering at a higher resolution and downscaling anti-aliases an image, but
+# multiplies the cost of every pixel. Only the pixels on an edge (where the
+# iteration count jumps from one pixel to the next) alias visibly, so they are
+# the only ones refined: after the base pass, the pixels with the highest
+# contrast with their neighbours get jittered subsamples, until the sample
+# budget of the frame is spent. Their color is the mean color of all their
+# samples.
+
+# Smallest difference of iteration count with a neighbour that makes a pixel
+# an edge.
+EDGE_THRESHOLD = 4
+
+# Default number of subsamples per frame, per pixel of the frame.
+SAMPLE_BUDGET = 0.5
+
+
+def edge_contrast(arr):
+    """
+    :param arr: Iteration array, indexed [x, y].
+    :return: int64 array of the shape of arr, holding the largest difference
+    of every pixel with its 4 neighbours.
+    """
+
+    counts = arr.astype(np.int64)
+    contrast = np.zeros(counts.shape, dtype=np.int64)
+
+    horizontal = np.abs(np.diff(counts, axis=0))
+    np.maximum(contrast[:-1], horizontal, out=contrast[:-1])
+    np.maximum(contrast[1:], horizontal, out=contrast[1:])
+
+    vertical = np.abs(np.diff(counts, axis=1))
+    np.maximum(contrast[:, :-1], vertical, out=contrast[:, :-1])
+    np.maximum(contrast[:, 1:], vertical, out=contrast[:, 1:])
+
+    return contrast
+
+
+def select_edges(arr, samples, budget, threshold=EDGE_THRESHOLD):
+    """
+    Picks the pixels to be refined. If the budget doesn't cover every edge,
+    the edges with the highest contrast are refined first.
+
+    :param arr: Iteration array, indexed [x, y].
+    :param samples: Number of subsamples per refined pixel.
+    :param budget: Maximum number of subsamples.
+    :param threshold: Smallest contrast of an edge.
+    :return: (columns, rows) of the refined pixels.
+    """
+
+    contrast = edge_contrast(arr)
+    edges = np.flatnonzero(contrast >= threshold)
+
+    pixels = max(int(budget) // samples, 0)
+    if len(edges) > pixels:
+        strongest = np.argsort(-contrast.ravel()[edges], kind='stable')[:pixels]
+        edges = np.sort(edges[strongest])
+
+    return np.unravel_index(edges, arr.shape)
+
+
+def jitter(pixels, samples, seed=0):
+    """
+    Spreads samples over every pixel by jittered (stratified) sampling: the
+    pixel is split into a grid of cells, and every sample is put at a random
+    position inside its own cell.
+
+    :param pixels: Number of pixels.
+    :param samples: Number of subsamples per pixel.
+    :param seed: Seed of the random offsets, so a frame always gets the same
+    samples.
+    :return: (x, y) offsets from the center of the pixel, between -0.5 and
+    0.5, as (pixels, samples) arrays.
+    """
+
+    side = int(np.ceil(np.sqrt(samples)))
+    cells = np.arange(samples)
+    random = np.random.default_rng(seed).random((2, pixels, samples))
+
+    x = (cells % side + random[0]) / side - 0.5
+    y = (cells // side + random[1]) / side - 0.5
+    return x, y
+
+
+def blend(rgb, columns, rows, counts, palette):
+    """
+    Replaces the color of the refined pixels by the mean color of their base
+    sample and subsamples.
+
+    :param rgb: (height, width, 3) uint8 image, changed in place.
+    :param columns: Column of every refined pixel.
+    :param rows: Row of every refined pixel.
+    :param counts: (pixels, samples) iteration counts of the subsamples.
+    :param palette: (iterations + 1, 3) uint8 lookup table, see
+    color_functions.build_palette()
+    :return: rgb
+    """
+
+    if len(columns) == 0:
+        return rgb
+
+    total = rgb[rows, columns].astype(np.float64) + palette[counts].sum(axis=1, dtype=np.float64)
+    rgb[rows, columns] = (total / (counts.shape[1] + 1) + 0.5).astype(np.uint8)
+    return rgb
@@ -0,0 +1,115 @@
+#  Copyright (c) 2019 AgentElement
+
+import numpy as np
+from src import engine, kernels
+from src.instrumentation import span
+
+################################################################################
+# JULIA SWEEPS
+################################################################################
+
+# Julia animations often keep the view still and move c along a path. Every
+# frame then shares the same pixel grid, so the coordinates of the pixels are
+# computed once, and the frames are stacked into a single array that the tile
+# engine splits across the cores like one large image.
+
+# Frames rendered at once by JuliaSweep.frames().
+FRAMES_PER_BATCH = 8
+
+
+def line_path(start, end, frames):
+    """
+    :param start: c of the first frame.
+    :param end: c of the last frame.
+    :param frames: Number of frames.
+    :return: complex array of c values evenly spaced from start to end.
+    """
+
+    return np.linspace(complex(start), complex(end), frames)
+
+
+def circle_path(start, center, frames):
+    """
+    :param start: c of the first frame.
+    :param center: Center of the circle.
+    :param frames: Number of frames.
+    :return: complex array of c values evenly spaced on the circle around
+    center that goes through start. The last frame stops a step short of
+    start, so the sweep loops seamlessly.
+    """
+
+    start, center = complex(start), complex(center)
+    return center + (start - center) * np.exp(2j * np.pi * np.arange(frames) / frames)
+
+
+class JuliaSweep:
+
+    def __init__(self, generator):
+        """
+        Renders the julia sets of many values of c, in the view of generator
+        (its focus, zoom, resolution, iterations, interior check, workers and
+        iteration type). The frames are identical to those the generator
+        renders with precision='float64'.
+
+        :param generator: JuliaGenerator describing the view. Its own c is
+        ignored.
+        """
+
+        if generator.resolve_precision() == 'double-double':
+            raise ValueError('Sweeps are computed in float64, which is too coarse for this zoom')
+
+        self.generator = generator
+
+        with span('setup'):
+            bounds = generator.range_from_resolution(generator._resolution, generator.zoom, generator._focus,
+                                                     generator.framerate, generator.speed)
+            min_x, x_step, min_y, y_step = generator._pixel_grid(*bounds)
+            width, height = generator._resolution[0], generator._resolution[1]
+            self.columns = min_x + np.arange(width) * x_step
+            self.rows = min_y + np.arange(height) * y_step
+
+    def __repr__(self):
+        return "<julia_sweep of {}>".format(self.generator)
+
+    def __str__(self):
+        return self.__repr__()
+
+    def render(self, cs, out=None):
+        """
+        Renders a julia set for every value of c.
+
+        :param cs: Sequence of N values of c.
+        :param out: Optional (N, width, height) C-contiguous array to be
+        filled.
+        :return: (N, height, width) iteration array, frame by frame. It is a
+        transposed view of out, so frame n can be colored with palette[arr[n]].
+        """
+
+        cs = np.asarray(cs, dtype=np.complex128).ravel()
+        width, height = len(self.columns), len(self.rows)
+        if out is None:
+            out = np.zeros((len(cs), width, height), dtype=self.generator.dtype)
+        elif not out.flags.c_contiguous:
+            # Reshaping would copy it, and the frames would never reach out
+            raise ValueError('out must be C-contiguous')
+
+        # Frames are stacked along the x-axis, and split into tiles together
+        engine.render_tiles(kernels.sweep_tile, out.reshape(len(cs) * width, height),
+                            (self.columns, self.rows, cs, self.generator.iterations, self.generator.interior_check),
+                            workers=self.generator.workers)
+        return out.transpose(0, 2, 1)
+
+    def frames(self, cs, batch=FRAMES_PER_BATCH):
+        """
+        Renders the frames batch by batch, so that only a batch is held in
+        memory at once.
+
+        :param cs: Sequence of values of c.
+        :param batch: Number of frames rendered at once.
+        :return: Iterator over (height, width) iteration arrays, one per value
+        of c.
+        """
+
+        cs = np.asarray(cs, dtype=np.complex128).ravel()
+        for start in range(0, len(cs), batch):
+            yield from self.render(cs[start:start + batch])
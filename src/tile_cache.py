@@ -0,0 +1,139 @@
+#  Copyright (c) 2019 AgentElement
+
+from collections import OrderedDict
+import hashlib
+import os
+import numpy as np
+
+
+class TileCache:
+
+    def __init__(self, directory, max_bytes=1 << 30, tile_size=(128, 128), compress=False):
+        """
+        On-disk cache of iteration tiles. Every tile is stored in its own file,
+        named after a hash of everything that determines its content (see
+        key()). Once the files take more than max_bytes, the least recently
+        used ones are deleted.
+
+        :param directory: Directory holding the tiles. Created if needed, and
+        can be shared between runs and processes.
+        :param max_bytes: Maximum size of the cache.
+        :param tile_size: Size of the tiles the images are split into.
+        :param compress: Stores tiles as compressed .npz files instead of raw
+        .npy files, which are memory-mapped when read.
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.tile_size = tuple(tile_size)
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        # File name -> size, least recently used first
+        self._files = OrderedDict()
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith(('.npy', '.npz'))]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self._files[entry.name] = entry.stat().st_size
+        self._size = sum(self._files.values())
+        self._evict()
+
+    def __repr__(self):
+        return "<tile_cache in {}: {} tiles, {} bytes, {} hits, {} misses>".format(
+            self.directory, len(self._files), self._size, self.hits, self.misses)
+
+    def __str__(self):
+        return self.__repr__()
+
+    @staticmethod
+    def key(*parts):
+        """
+        Hashes the parameters that determine the content of a tile. Floats are
+        hashed exactly.
+
+        :param parts: Generator type, bounds, iteration limit, tile...
+        :return: Hex digest
+        """
+
+        description = repr(tuple(part.hex() if isinstance(part, float) else part for part in parts))
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _file_name(self, key):
+        return key + ('.npz' if self.compress else '.npy')
+
+    def get(self, key):
+        """
+        :param key: Key of the tile, see key()
+        :return: The tile, or None if it isn't cached.
+        """
+
+        name = self._file_name(key)
+        path = os.path.join(self.directory, name)
+        try:
+            if self.compress:
+                with np.load(path) as archive:
+                    tile = archive['tile']
+            else:
+                tile = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if name in self._files:
+            self._files.move_to_end(name)
+        return tile
+
+    def put(self, key, tile):
+        """
+        Stores a tile, evicting the least recently used tiles if the cache
+        gets too large.
+
+        :param key: Key of the tile, see key()
+        :param tile: Iteration array
+        """
+
+        name = self._file_name(key)
+        path = os.path.join(self.directory, name)
+
+        # Written under a temporary name, so readers never see a partial file
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'wb') as file:
+            if self.compress:
+                np.savez_compressed(file, tile=tile)
+            else:
+                np.save(file, tile)
+        os.replace(temporary, path)
+
+        self._size += os.path.getsize(path) - self._files.pop(name, 0)
+        self._files[name] = os.path.getsize(path)
+        self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        """
+        :return: Dictionary of hit/miss statistics.
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'tiles': len(self._files),
+            'bytes': self._size,
+        }
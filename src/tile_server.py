@@ -0,0 +1,351 @@
+#  Copyright (c) 2019 AgentElement
+
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from PIL import Image
+import io
+import json
+import re
+import threading
+import time
+from src import color_functions, engine
+from src.generator import JuliaGenerator, MandelbrotGenerator
+from src.precision import decimal_pair
+
+################################################################################
+# TILE SERVER
+################################################################################
+
+# Serves the sets as slippy map tiles, /{set}/{z}/{x}/{y}.png, for map viewers
+# such as Leaflet or OpenLayers. The world (zoom level 0) is a single tile
+# covering -2-2i to 2+2i, and every zoom level splits every tile of the one
+# above in four. x grows with the real part, and y with the imaginary part
+# (downwards, like the rows of the images of the command line program).
+#
+# The server is a long-running process: the kernels are compiled (or loaded
+# from the disk cache) once, and every tile is rendered by a generator on a
+# pool of threads. Encoded tiles are kept in a bounded LRU, and requests for a
+# tile that is already being rendered wait for that render instead of
+# starting another one.
+
+TILE_SIZE = 256
+
+# Past this zoom level, neighbouring pixels can't be told apart anymore.
+MAX_ZOOM = 45
+
+DEFAULT_ITERATIONS = 256
+
+# Number of recent requests the latency percentiles are computed from.
+LATENCY_WINDOW = 1000
+
+TILE_PATH = re.compile(r'^/(mandelbrot|julia)/(\d+)/(\d+)/(\d+)\.png$')
+
+
+def tile_focus(z, x, y):
+    """
+    :param z: Zoom level.
+    :param x: Column of the tile.
+    :param y: Row of the tile.
+    :return: Center of the tile. It is exact, since every tile is a power of
+    two wide.
+    """
+
+    width = 4.0 / 2 ** z
+    return complex(-2.0 + (x + 0.5) * width, -2.0 + (y + 0.5) * width)
+
+
+class TileLRU:
+
+    def __init__(self, max_bytes):
+        """
+        Thread-safe in-memory cache of encoded tiles. Once the tiles take more
+        than max_bytes, the least recently used ones are dropped.
+
+        :param max_bytes: Maximum size of the cache.
+        """
+
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._tiles = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def get(self, key):
+        """
+        :return: The encoded tile, or None if it isn't cached.
+        """
+
+        with self._lock:
+            data = self._tiles.get(key)
+            if data is not None:
+                self._tiles.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._size += len(data) - len(self._tiles.pop(key, b''))
+            self._tiles[key] = data
+            while self._size > self.max_bytes and len(self._tiles) > 1:
+                _, evicted = self._tiles.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'tiles': len(self._tiles), 'bytes': self._size, 'max_bytes': self.max_bytes,
+                    'evictions': self.evictions}
+
+
+class TileRenderer:
+
+    def __init__(self, threads=None, max_bytes=64 << 20, iterations=DEFAULT_ITERATIONS, color='linear'):
+        """
+        Renders and caches the tiles of the server. Can also be used without
+        the HTTP server.
+
+        :param threads: Number of tiles rendered at once. Defaults to the
+        number of cores.
+        :param max_bytes: Size of the LRU of encoded tiles.
+        :param iterations: Iteration limit of tiles that don't set one.
+        :param color: Color function of tiles that don't set one.
+        """
+
+        self.threads = threads or engine.default_workers()
+        self.iterations = iterations
+        self.color = color
+        self.cache = TileLRU(max_bytes)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.threads)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._palettes = {}
+
+        self._start = time.perf_counter()
+        self._counts = {'hit': 0, 'coalesced': 0, 'render': 0, 'error': 0}
+        self._latencies = {source: deque(maxlen=LATENCY_WINDOW) for source in self._counts}
+        self._renders = 0
+        self._render_seconds = 0.0
+
+    def __repr__(self):
+        return "<tile_renderer: {} threads, {} cached tiles>".format(self.threads, len(self.cache))
+
+    def __str__(self):
+        return self.__repr__()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _palette(self, color, iterations):
+        key = (color, iterations)
+        with self._lock:
+            palette = self._palettes.get(key)
+        if palette is None:
+            palette = color_functions.build_palette(color_functions.color_function_dict[color], iterations)
+            with self._lock:
+                self._palettes[key] = palette
+        return palette
+
+    def key(self, fractal, z, x, y, iterations=None, color=None, c=0j):
+        """
+        Checks the parameters of a tile, and fills in the defaults.
+
+        :param fractal: 'mandelbrot' or 'julia'
+        :param z: Zoom level, up to MAX_ZOOM.
+        :param x: Column of the tile, from 0 to 2 ** z - 1.
+        :param y: Row of the tile, from 0 to 2 ** z - 1.
+        :param iterations: Iteration limit.
+        :param color: Name of a color function of color_functions.color_function_dict
+        :param c: Constant of the julia set.
+        :return: Tuple identifying the tile.
+        :raises ValueError: If a parameter is invalid.
+        """
+
+        iterations = self.iterations if iterations is None else int(iterations)
+        color = self.color if color is None else color
+
+        if fractal not in ('mandelbrot', 'julia'):
+            raise ValueError('Unknown set: {}'.format(fractal))
+        if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+            raise ValueError('No tile {}/{}/{}'.format(z, x, y))
+        if iterations < 1:
+            raise ValueError('The iteration limit must be positive')
+        if color_functions.color_function_dict.get(color) in (None, color_functions.histogram_colorize):
+            # Every tile would be equalized on its own histogram
+            raise ValueError('Unknown color function: {}'.format(color))
+
+        return fractal, z, x, y, iterations, color, complex(c) if fractal == 'julia' else 0j
+
+    def tile(self, *key):
+        """
+        Returns a tile as PNG data, rendering it unless it is cached or
+        already being rendered for another request.
+
+        :param key: Parameters of the tile, see key()
+        :return: (data, source) where source is 'hit', 'coalesced' or 'render'
+        """
+
+        key = self.key(*key)
+        start = time.perf_counter()
+
+        data = self.cache.get(key)
+        if data is not None:
+            self._record('hit', start)
+            return data, 'hit'
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            source = 'coalesced' if future is not None else 'render'
+            if future is None:
+                # Checked again, the tile may have been rendered meanwhile
+                data = self.cache.get(key)
+                if data is None:
+                    future = self._executor.submit(self._render, key)
+                    self._in_flight[key] = future
+
+        if data is not None:
+            self._record('hit', start)
+            return data, 'hit'
+
+        try:
+            data = future.result()
+        except Exception:
+            self._record('error', start)
+            raise
+        self._record(source, start)
+        return data, source
+
+    def _render(self, key):
+        fractal, z, x, y, iterations, color, c = key
+        start = time.perf_counter()
+        try:
+            options = dict(focus=tile_focus(z, x, y), zoom=z, resolution=(TILE_SIZE, TILE_SIZE), framerate=-1,
+                           iterations=iterations, workers=1)
+            if fractal == 'julia':
+                generator = JuliaGenerator(c=c, **options)
+            else:
+                generator = MandelbrotGenerator(**options)
+
+            encoded = io.BytesIO()
+            Image.fromarray(generator.generate_rgb(self._palette(color, iterations))).save(encoded, format='PNG')
+            data = encoded.getvalue()
+            self.cache.put(key, data)
+            return data
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                self._renders += 1
+                self._render_seconds += time.perf_counter() - start
+
+    def _record(self, source, start):
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._counts[source] += 1
+            self._latencies[source].append(latency)
+
+    def stats(self):
+        """
+        :return: Dictionary of the number of requests served from the LRU,
+        coalesced with another request or rendered, their latency (in
+        milliseconds, over the last LATENCY_WINDOW requests), the throughput
+        since the renderer was created, the mean time to render a tile, and
+        the state of the LRU.
+        """
+
+        with self._lock:
+            uptime = time.perf_counter() - self._start
+            requests = sum(self._counts.values())
+            latency = OrderedDict()
+            for source, values in self._latencies.items():
+                values = sorted(values)
+                if values:
+                    latency[source] = OrderedDict([
+                        ('p50_ms', 1000 * values[len(values) // 2]),
+                        ('p95_ms', 1000 * values[int(len(values) * 0.95)]),
+                        ('max_ms', 1000 * values[-1]),
+                    ])
+
+            return OrderedDict([
+                ('uptime_seconds', uptime),
+                ('requests', requests),
+                ('hits', self._counts['hit']),
+                ('coalesced', self._counts['coalesced']),
+                ('renders', self._counts['render']),
+                ('errors', self._counts['error']),
+                ('in_flight', len(self._in_flight)),
+                ('requests_per_second', requests / uptime if uptime else 0.0),
+                ('renders_per_second', self._renders / uptime if uptime else 0.0),
+                ('mean_render_ms', 1000 * self._render_seconds / self._renders if self._renders else 0.0),
+                ('latency', latency),
+                ('cache', self.cache.stats()),
+            ])
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+
+    # Set by serve()
+    renderer = None
+    verbose = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/stats':
+            self._send(200, 'application/json', json.dumps(self.renderer.stats(), indent=2).encode())
+            return
+
+        match = TILE_PATH.match(url.path)
+        if match is None:
+            self._send(404, 'text/plain', b'Tiles are served as /{mandelbrot,julia}/{z}/{x}/{y}.png\n')
+            return
+
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            real, imag = decimal_pair(query.get('c', '0'))
+            key = self.renderer.key(match.group(1), *(int(group) for group in match.group(2, 3, 4)),
+                                    iterations=query.get('iterations'), color=query.get('color'),
+                                    c=complex(float(real), float(imag)))
+        except ValueError as error:
+            self._send(400, 'text/plain', '{}\n'.format(error).encode())
+            return
+
+        try:
+            data, source = self.renderer.tile(*key)
+        except Exception as error:
+            self._send(500, 'text/plain', '{}: {}\n'.format(type(error).__name__, error).encode())
+            return
+        self._send(200, 'image/png', data, {'X-Tile-Source': source, 'Cache-Control': 'max-age=86400'})
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, message_format, *args):
+        if self.verbose:
+            super().log_message(message_format, *args)
+
+
+def make_server(renderer, host='127.0.0.1', port=8000, verbose=False):
+    """
+    Creates the HTTP server of a renderer. Every request is handled on its own
+    thread, and waits for its tile on the renderer's pool.
+
+    :param renderer: TileRenderer
+    :param host: Address to listen on. Defaults to the loopback interface only.
+    :param port: Port to listen on, 0 for any free port.
+    :param verbose: Logs every request on stderr.
+    :return: ThreadingHTTPServer, see serve_forever()
+    """
+
+    handler = type('Handler', (TileRequestHandler,), {'renderer': renderer, 'verbose': verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,185 @@
+#  Copyright (c) 2019 AgentElement
+
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+from src.instrumentation import span
+
+################################################################################
+# VIDEO OUTPUT
+################################################################################
+
+# Sequences can be written straight into a video file instead of numbered
+# images. Frames are handed to the encoder as raw RGB, so they are never
+# compressed into PNGs and decompressed again, and nothing but the video is
+# written to the disk. If an ffmpeg executable is found, frames are piped into
+# its standard input. Otherwise, they are passed to imageio, which needs the
+# imageio-ffmpeg package for anything but GIFs.
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.webm', '.avi', '.gif')
+
+# Framerate of videos of sequences rendered without --framerate.
+DEFAULT_FRAMERATE = 30
+
+
+def is_video(path):
+    """
+    :param path: File name.
+    :return: Whether the extension of path is that of a video format.
+    """
+
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def ffmpeg_arguments(executable, path, width, height, framerate):
+    """
+    :param executable: Path of the ffmpeg executable.
+    :param path: Path of the video.
+    :param width: Width of the frames.
+    :param height: Height of the frames.
+    :param framerate: Frames per second.
+    :return: Command line of an ffmpeg process reading raw RGB frames from its
+    standard input.
+    """
+
+    arguments = [executable, '-y', '-loglevel', 'error',
+                 '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '{}x{}'.format(width, height), '-r', str(framerate),
+                 '-i', '-']
+    if not path.lower().endswith('.gif'):
+        # Most players only play yuv420p, whose chroma needs an even size
+        arguments += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p']
+    return arguments + [path]
+
+
+def pad_to_even(rgb):
+    """
+    Pads a frame with black to an even width and height, like the pad filter
+    of ffmpeg_arguments(), for encoders that need them.
+
+    :param rgb: (height, width, 3) uint8 array
+    :return: (height, width, 3) uint8 array, rgb itself if its size is even.
+    """
+
+    height, width = rgb.shape[:2]
+    if height % 2 == 0 and width % 2 == 0:
+        return rgb
+    return np.pad(rgb, ((0, height % 2), (0, width % 2), (0, 0)))
+
+
+class VideoWriter:
+
+    def __init__(self, path, framerate=DEFAULT_FRAMERATE, ffmpeg=None):
+        """
+        Writes frames into a video file as they are rendered. The size of the
+        video is that of the first frame.
+
+        :param path: Path of the video. The extension determines the format.
+        :param framerate: Frames per second.
+        :param ffmpeg: Path of the ffmpeg executable. Defaults to the one on
+        the PATH, and to imageio if there is none.
+        """
+
+        if not is_video(path):
+            raise ValueError('Unknown video format: {}'.format(path))
+
+        self.path = path
+        self.framerate = framerate
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self.frames = 0
+        self.shape = None
+        self._process = None
+        self._errors = None
+        self._writer = None
+
+    def __repr__(self):
+        return "<video_writer: {} frames to {} with {}>".format(self.frames, self.path,
+                                                                 'ffmpeg' if self.ffmpeg else 'imageio')
+
+    def __str__(self):
+        return self.__repr__()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def _open(self, height, width):
+        if self.ffmpeg:
+            self._errors = tempfile.TemporaryFile()
+            self._process = subprocess.Popen(ffmpeg_arguments(self.ffmpeg, self.path, width, height, self.framerate),
+                                             stdin=subprocess.PIPE, stderr=self._errors)
+            return
+
+        try:
+            import imageio
+        except ImportError:
+            raise RuntimeError('Writing videos needs ffmpeg on the PATH, or the imageio package')
+        if self.path.lower().endswith('.gif'):
+            self._writer = imageio.get_writer(self.path, duration=1000 / self.framerate)
+        else:
+            # imageio would resize frames to a multiple of 16 pixels, they are
+            # padded to an even size instead (see write_frame())
+            self._writer = imageio.get_writer(self.path, fps=self.framerate, macro_block_size=1)
+
+    def write_frame(self, rgb):
+        """
+        Appends a frame to the video.
+
+        :param rgb: (height, width, 3) uint8 array
+        :return: None
+        :raises RuntimeError: If ffmpeg exited before reading every frame.
+        """
+
+        if self.shape is None:
+            self.shape = rgb.shape
+            self._open(*rgb.shape[:2])
+        elif rgb.shape != self.shape:
+            raise ValueError('Frames must have shape {}, not {}'.format(self.shape, rgb.shape))
+        elif self._process is None and self._writer is None:
+            raise RuntimeError('{} is already closed'.format(self.path))
+
+        with span('encode'):
+            if self._process is not None:
+                try:
+                    self._process.stdin.write(np.ascontiguousarray(rgb, dtype=np.uint8).data)
+                except BrokenPipeError:
+                    # Raises if ffmpeg failed, and ffmpeg must not be written
+                    # to again even if it didn't
+                    self.close()
+                    raise RuntimeError('ffmpeg stopped reading the frames of {}'.format(self.path))
+            elif self.path.lower().endswith('.gif'):
+                self._writer.append_data(rgb)
+            else:
+                self._writer.append_data(pad_to_even(rgb))
+        self.frames += 1
+
+    def close(self):
+        """
+        Finishes the video.
+
+        :return: None
+        :raises RuntimeError: If ffmpeg failed.
+        """
+
+        if self._writer is not None:
+            with span('save'):
+                self._writer.close()
+            self._writer = None
+
+        if self._process is not None:
+            process, self._process = self._process, None
+            with span('save'):
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                process.wait()
+
+            self._errors.seek(0)
+            errors = self._errors.read().decode(errors='replace').strip()
+            self._errors.close()
+            if process.returncode != 0:
+                raise RuntimeError('ffmpeg failed to write {}: {}'.format(self.path, errors))
@@ -0,0 +1,79 @@
+#  Copyright (c) 2019 AgentElement
+
+from collections import OrderedDict
+import numpy as np
+
+
+class WorkStats:
+
+    def __init__(self, arr, max_iter, cost_map, tile_size):
+        """
+        Counters of the work done to render an image, collected by generators
+        created with collect_stats=True (see Generator.work_stats).
+
+        :param arr: Iteration array of the image.
+        :param max_iter: Iteration limit.
+        :param cost_map: [tile_x, tile_y] array of the iterations executed for
+        every tile.
+        :param tile_size: Size of the tiles.
+        """
+
+        self.max_iter = max_iter
+        self.tile_size = tuple(tile_size)
+        self.cost_map = cost_map
+        self.pixels = arr.size
+        self.iterations = int(cost_map.sum())
+
+        counts = np.bincount(arr.ravel(), minlength=max_iter + 1)
+        self.max_iter_pixels = int(counts[max_iter])
+        # Number of pixels escaping after every number of iterations
+        self.histogram = counts[:max_iter]
+
+    def __repr__(self):
+        return "<work_stats: {} iterations, {} of {} pixels at max_iter>".format(
+            self.iterations, self.max_iter_pixels, self.pixels)
+
+    def __str__(self):
+        return self.__repr__()
+
+    @property
+    def escaped_pixels(self):
+        return self.pixels - self.max_iter_pixels
+
+    @property
+    def iterations_per_pixel(self):
+        return self.iterations / self.pixels if self.pixels else 0.0
+
+    def as_dict(self):
+        """
+        :return: Dictionary of the counters, without the arrays.
+        """
+
+        return OrderedDict([
+            ('pixels', self.pixels),
+            ('iterations', self.iterations),
+            ('iterations_per_pixel', self.iterations_per_pixel),
+            ('max_iter_pixels', self.max_iter_pixels),
+            ('escaped_pixels', self.escaped_pixels),
+            ('tiles', self.cost_map.size),
+            ('max_tile_iterations', int(self.cost_map.max()) if self.cost_map.size else 0),
+            ('mean_tile_iterations', float(self.cost_map.mean()) if self.cost_map.size else 0.0),
+        ])
+
+    def cost_image(self, resolution=None):
+        """
+        Renders the cost map as a grayscale image, where white is the most
+        expensive tile.
+
+        :param resolution: Optional (width, height) to scale the map to, such
+        as the resolution of the image so that both can be overlaid.
+        :return: (height, width) uint8 array
+        """
+
+        peak = max(int(self.cost_map.max()), 1) if self.cost_map.size else 1
+        image = (self.cost_map.T * 255 // peak).astype(np.uint8)
+
+        if resolution is not None:
+            tile_height, tile_width = self.tile_size[1], self.tile_size[0]
+            image = image.repeat(tile_height, axis=0).repeat(tile_width, axis=1)[:resolution[1], :resolution[0]]
+        return image
@@ -0,0 +1,359 @@
+#  Copyright (c) 2019 AgentElement
+
+import math
+import numpy as np
+from src import engine, kernels
+from src.generator import Generator
+
+################################################################################
+# EXPONENTIAL MAP ZOOMS
+################################################################################
+
+# Consecutive frames of a zoom show the same picture, scaled by
+# 2 ** (speed / framerate). In polar coordinates around the focus, with a
+# logarithmic radius, that scaling becomes a shift: frame k is frame 0 moved
+# inwards by k * ln(2) * speed / framerate.
+#
+# The whole zoom is therefore sampled once, on rings around the focus whose
+# radii shrink exponentially (the 'exponential map'). Rings are as far apart as
+# neighbouring samples on a ring, so samples are evenly spread at every radius.
+# Every frame is then a lookup into the rings that cover it. Only the rings
+# that the current frame needs are kept in memory.
+#
+# A pixel takes its count from the rings only if the 4x4 samples around it
+# (on the four closest rings, at the four closest angles) agree. Near the
+# boundary of the set, counts change within a fraction of a pixel, so no
+# amount of resampling would reproduce them: those pixels are computed at
+# their exact position instead, like in a direct render. So are the pixels
+# close to the focus, where the rings hold many samples per pixel.
+#
+# The more of the boundary a frame shows, the more pixels are computed on top
+# of the rings, and the rings are only computed in float64. zoom_frames()
+# therefore only resamples float64 frames, and only while that takes fewer
+# iterations than rendering them one by one; other frames are rendered by the
+# generator itself.
+
+# Pixels closer to the focus than this fraction of the outer radius are
+# computed directly. Rings inside it would hold more than 4 samples per pixel
+# along every ring.
+INNER_RADIUS = 0.25
+
+# Pixels computed by a task of the engine.
+PIXELS_PER_TASK = 1024
+
+# Cost of the work around the iterations, measured in iterations: per pixel of
+# a direct render, per pixel looked up in the rings, and per ring sample or
+# pixel computed on its own.
+PIXEL_COST = 3
+LOOKUP_COST = 8
+SAMPLE_COST = 8
+
+
+class ExponentialZoom:
+
+    def __init__(self, generator: Generator, frames, oversample=1.0):
+        """
+        Prepares the zoom of a generator, starting at its current zoom and
+        zooming in by one step of the generator's zoom every frame.
+
+        :param generator: Mandelbrot or julia generator describing the first
+        frame. Only float64 precision is supported.
+        :param frames: Number of frames of the zoom.
+        :param oversample: Number of samples per pixel along each axis at the
+        edge of the frame. Samples get denser towards the center.
+        """
+
+        self.generator = generator
+        self.frames = frames
+        self.sampled_pixels = 0
+        self.computed_pixels = 0
+        # Iterations of the ring samples, of the computed pixels, and of every
+        # pixel of the frames (what direct renders would have iterated)
+        self.sampled_rings = 0
+        self.sampled_iterations = 0
+        self.computed_iterations = 0
+        self.frame_iterations = 0
+        self.rendered_frames = 0
+
+        framerate, speed = (1, 1) if generator.framerate == -1 else (generator.framerate, generator.speed)
+        min_x, x_step, min_y, y_step = generator._offset_grid()
+        width, height = generator._resolution[0], generator._resolution[1]
+
+        # Offsets of every pixel of the first frame from the focus
+        x_offsets = min_x + np.arange(width) * x_step
+        y_offsets = min_y + np.arange(height) * y_step
+        radius = np.hypot(x_offsets[:, np.newaxis], y_offsets[np.newaxis, :])
+        step = min(abs(x_step), abs(y_step))
+
+        self.outer_radius = radius.max()
+        self.angles = int(math.ceil(2 * math.pi * oversample * self.outer_radius / step))
+        self.angle_step = 2 * math.pi / self.angles
+        self.log_step = self.angle_step
+        self.rings_per_frame = math.log(2) * speed / framerate / self.log_step
+
+        # Pixels near the focus are computed in every frame
+        inner = radius < INNER_RADIUS * self.outer_radius
+        self._inner = np.nonzero(inner)
+        columns, rows = np.nonzero(~inner)
+
+        # Position of the other pixels in the rings, relative to the frame
+        ring = np.log(self.outer_radius / radius[columns, rows]) / self.log_step
+        angle = np.floor(np.arctan2(y_offsets[rows], x_offsets[columns]) / self.angle_step).astype(np.int64)
+        angle %= self.angles
+
+        # Sorted like the samples in the rings, which are then read in order
+        order = np.lexsort((angle, np.floor(ring)))
+        self._outer = columns[order], rows[order]
+        self._ring = ring[order]
+        self._ring_range = self._ring.min(), self._ring.max()
+        self._angle = angle[order]
+        self._next_angle = (self._angle + 1) % self.angles
+
+        # Frames whose pixels all lie on the rings computed for the first one
+        self.span = self._ring_range[1] / self.rings_per_frame
+
+        self._rings = np.zeros((0, self.angles), dtype=generator.dtype)
+        self._first_ring = 0
+
+    def __repr__(self):
+        return "<exponential_zoom of {} frames, {} samples per ring, {} rings per frame>".format(
+            self.frames, self.angles, round(self.rings_per_frame, 2))
+
+    def __str__(self):
+        return self.__repr__()
+
+    def rings(self, first, stop):
+        """
+        Makes sure rings first to stop - 1 are computed, and returns them.
+        Rings before first are discarded.
+
+        :param first: First ring needed.
+        :param stop: Ring after the last ring needed.
+        :return: [ring, angle] array starting at ring first.
+        """
+
+        last_stop = self._first_ring + len(self._rings)
+        if stop > last_stop:
+            # Computes a few frames ahead, to amortize the call overhead
+            stop = max(stop, last_stop + int(math.ceil(8 * self.rings_per_frame)))
+            start = max(last_stop, first)
+            new_rings = np.zeros((stop - start, self.angles), dtype=self.generator.dtype)
+
+            generator = self.generator
+            engine.render_tiles(kernels.polar_tile, new_rings,
+                                (generator._focus.real, generator._focus.imag,
+                                 self.outer_radius * math.exp(-start * self.log_step), self.log_step,
+                                 self.angle_step, generator.iterations) + generator._escape_args(),
+                                workers=generator.workers)
+            self.sampled_rings += stop - start
+            self.sampled_iterations += self.work(new_rings)
+
+            kept = self._rings[max(first - self._first_ring, 0):]
+            self._rings = np.concatenate((kept, new_rings)) if start == last_stop else new_rings
+            self._first_ring = max(first, self._first_ring) if start == last_stop else start
+
+        elif first > self._first_ring:
+            self._rings = self._rings[first - self._first_ring:]
+            self._first_ring = first
+
+        return self._rings
+
+    def frame(self, index):
+        """
+        Resamples one frame of the zoom, and computes the pixels that can't
+        be resampled. The number of pixels of either kind is added to
+        self.sampled_pixels and self.computed_pixels.
+
+        :param index: Number of the frame, starting at 0.
+        :return: Iteration array of the frame, laid out like Generator.arr.
+        """
+
+        shift = index * self.rings_per_frame
+        # The samples around a pixel start one ring further out than its own
+        first = max(int(math.floor(self._ring_range[0] + shift)) - 1, 0)
+        rings = self.rings(first, int(math.floor(self._ring_range[1] + shift)) + 3)
+
+        arr = np.empty(tuple(self.generator._resolution), dtype=self.generator.dtype)
+        missing = kernels.polar_lookup(arr, rings, first, shift, self._outer[0], self._outer[1], self._ring,
+                                       self._angle, self._next_angle)
+
+        columns = np.concatenate((self._inner[0], self._outer[0][missing]))
+        rows = np.concatenate((self._inner[1], self._outer[1][missing]))
+        self.compute(arr, index, columns, rows)
+
+        self.sampled_pixels += len(self._ring) - len(missing)
+        self.computed_pixels += len(columns)
+        self.computed_iterations += self.work(arr[columns, rows])
+        self.frame_iterations += self.work(arr)
+        self.rendered_frames += 1
+        return arr
+
+    def work(self, counts):
+        """
+        :param counts: Iteration counts.
+        :return: Number of iterations it took to compute them. Points in the
+        set are counted as free if the interior check stops them early.
+        """
+
+        total = int(counts.sum(dtype=np.int64))
+        if self.generator.interior_check:
+            total -= self.generator.iterations * int(np.count_nonzero(counts == self.generator.iterations))
+        return total
+
+    def cheaper(self, arr=None):
+        """
+        Compares the cost of resampling frames with that of direct renders of
+        them, in iterations (see PIXEL_COST). The rings computed ahead of the
+        first frame are already paid for, so every frame is charged the rings
+        it moves through.
+
+        :param arr: Iteration array of a direct render of the frame before
+        the first one resampled. The cost of resampling is then predicted
+        from it, before any ring is computed: pixels whose neighbours have a
+        different count are assumed to be computed, and ring samples to cost
+        as much as the pixels they cover. Otherwise, the cost is measured on
+        the frames resampled so far.
+        :return: Whether the next frames are likely to be cheaper resampled
+        than rendered directly.
+        """
+
+        if arr is not None:
+            padded = np.pad(arr, 1, mode='edge')
+            width, height = arr.shape
+            neighbours = [padded[x:x + width, y:y + height] for x in range(3) for y in range(3)]
+            computed = np.min(neighbours, axis=0) != np.max(neighbours, axis=0)
+            computed[self._inner] = True
+
+            outer = arr[self._outer]
+            sample = self.work(outer) / max(len(outer), 1)
+            resampled = self._resampled_cost(sample, self.work(arr[computed]), np.count_nonzero(computed))
+            return resampled < self._direct_cost(self.work(arr))
+
+        frames = self.rendered_frames
+        if frames == 0 or self.sampled_rings == 0:
+            return True
+
+        resampled = self._resampled_cost(self.sampled_iterations / self.sampled_rings / self.angles,
+                                         self.computed_iterations / frames, self.computed_pixels / frames)
+        return resampled < self._direct_cost(self.frame_iterations / frames)
+
+    def _resampled_cost(self, sample_iterations, computed_iterations, computed_pixels):
+        """
+        :param sample_iterations: Iterations of a ring sample.
+        :param computed_iterations: Iterations of the pixels of a frame
+        computed on their own.
+        :param computed_pixels: Number of these pixels.
+        :return: Cost of resampling a frame.
+        """
+
+        return self.rings_per_frame * self.angles * (sample_iterations + SAMPLE_COST) \
+            + LOOKUP_COST * len(self._ring) + computed_iterations + SAMPLE_COST * computed_pixels
+
+    def _direct_cost(self, frame_iterations):
+        """
+        :param frame_iterations: Iterations of every pixel of a frame.
+        :return: Cost of rendering a frame directly.
+        """
+
+        return frame_iterations + PIXEL_COST * self.generator._resolution[0] * self.generator._resolution[1]
+
+    def compute(self, arr, index, columns, rows):
+        """
+        Computes pixels of a frame at their exact position, like a direct
+        render of the frame.
+
+        :param arr: Iteration array of the frame, which receives the pixels.
+        :param index: Number of the frame.
+        :param columns: Column of every pixel.
+        :param rows: Row of every pixel.
+        :return: None
+        """
+
+        if len(columns) == 0:
+            return
+
+        generator = self.generator
+        bounds = generator.range_from_resolution(generator._resolution, generator.zoom + index, generator._focus,
+                                                 generator.framerate, generator.speed)
+        # Never written, only gives the extent of the tasks
+        packed = np.empty((len(columns), 1), dtype=np.uint8)
+        engine.render_tiles(kernels.scattered_tile, packed,
+                            (arr, columns, rows) + generator._pixel_grid(*bounds) + (generator.iterations,)
+                            + generator._escape_args(),
+                            workers=generator.workers, tile_size=(PIXELS_PER_TASK, 1))
+
+    def __iter__(self):
+        for index in range(self.frames):
+            yield self.frame(index)
+
+
+def precision_at(generator, zoom):
+    """
+    :return: Arithmetic generate() would use at another zoom (see
+    Generator.resolve_precision()).
+    """
+
+    start_zoom = generator.zoom
+    generator.zoom = zoom
+    try:
+        return generator.resolve_precision()
+    finally:
+        generator.zoom = start_zoom
+
+
+def zoom_frames(generator, frames, start=0, stop=None):
+    """
+    Renders frames start to stop - 1 of a zoom, starting at the zoom of the
+    generator and zooming in by one step of it every frame. Float64 frames
+    are resampled from an ExponentialZoom, as long as a long enough stretch of
+    them remains to make up for the rings computed ahead of the first one,
+    and as long as that is cheaper than rendering them. Every other frame is
+    rendered by generate(), exactly like a single image.
+
+    :param generator: Mandelbrot or julia generator describing frame 0.
+    :param frames: Number of frames of the zoom.
+    :param start: First frame rendered.
+    :param stop: Frame after the last one rendered, frames by default.
+    :return: Iterator over iteration arrays, laid out like Generator.arr.
+    """
+
+    stop = frames if stop is None else stop
+    start_zoom = generator.zoom
+    float64 = [not generator.antialias and precision_at(generator, start_zoom + index) == 'float64'
+               for index in range(stop)]
+
+    zoom, resampling = None, True
+    for index in range(start, stop):
+        if resampling and float64[index]:
+            if zoom is None:
+                zoom = ExponentialZoom(generator, frames)
+                remaining = next((end for end in range(index, stop) if not float64[end]), stop) - index
+                resampling = remaining >= 2 * zoom.span
+                if resampling:
+                    # Renders this frame directly, to predict the cost of the next ones
+                    arr = render_frame(generator, start_zoom + index)
+                    resampling = zoom.cheaper(arr)
+                    yield arr
+                    continue
+
+            # Once resampling isn't worth it anymore, it is never tried again
+            resampling = resampling and zoom.cheaper()
+            if resampling:
+                yield zoom.frame(index)
+                continue
+
+        yield render_frame(generator, start_zoom + index)
+
+
+def render_frame(generator, zoom):
+    """
+    :return: Copy of the iteration array generate() gives at another zoom.
+    """
+
+    start_zoom = generator.zoom
+    generator.zoom = zoom
+    try:
+        generator.generate()
+    finally:
+        generator.zoom = start_zoom
+    return generator.arr.copy()
@@ -0,0 +1,77 @@
+"""
+Checks that a batch runs every job of a manifest, and records the failing
+ones in its summary without stopping the others. Run from the root of the
+repository:
+
+python -m pytest tests/batch_test.py
+"""
+
+from src.batch import job_arguments, read_manifest, run_batch
+from src.generator import MandelbrotGenerator
+import argparse
+import json
+import numpy as np
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('--focus', type=complex, default=0j)
+PARSER.add_argument('--iterations', type=int, default=64)
+PARSER.add_argument('--save', required=True)
+
+
+def render_counts(focus, iterations):
+    generator = MandelbrotGenerator(focus=focus, zoom=0, resolution=(48, 27), framerate=-1, iterations=iterations,
+                                    workers=1)
+    generator.generate()
+    return generator.arr
+
+
+def render(job):
+    # Runs in the worker processes, like the render_job() of the command line
+    args = PARSER.parse_args(job_arguments(job))
+    if args.iterations < 1:
+        raise ValueError('The iteration limit must be positive')
+    np.save(args.save, render_counts(args.focus, args.iterations))
+    return args.save
+
+
+def test_manifests(tmp_path):
+    jsonl, csv = tmp_path / 'jobs.jsonl', tmp_path / 'jobs.csv'
+    jsonl.write_text('{"focus": "-0.75+0.1j", "resolution": [64, 36], "subdivide": true}\n\n'
+                     '{"save": "a.png", "symmetry": false}\n')
+    csv.write_text('focus,resolution,subdivide,save\n-0.75+0.1j,64 36,true,\n,,false,a.png\n')
+
+    for manifest in (jsonl, csv):
+        assert [job_arguments(job) for job in read_manifest(str(manifest))] == [
+            ['--focus', '-0.75+0.1j', '--resolution', '64', '36', '--subdivide'],
+            ['--save', 'a.png'],
+        ]
+
+
+def test_failures_are_recorded(tmp_path):
+    summary = tmp_path / 'summary.json'
+    jobs = [
+        {'focus': '0.25+0.5j', 'iterations': 100, 'save': str(tmp_path / 'first.npy')},
+        {'iterations': 0, 'save': str(tmp_path / 'failed.npy')},
+        {'focus': 'nowhere', 'save': str(tmp_path / 'invalid.npy')},
+        {'focus': '0.25j'},
+        {'save': str(tmp_path / 'last.npy')},
+    ]
+
+    report = run_batch(render, jobs, processes=2, summary=str(summary))
+    assert json.loads(summary.read_text()) == report
+    assert (report['jobs'], report['failed'], report['processes']) == (5, 3, 2)
+
+    results = report['results']
+    assert [result['job'] for result in results] == list(range(5))
+    assert [result['status'] for result in results] == ['ok', 'failed', 'failed', 'failed', 'ok']
+    assert [result['output'] for result in results] == [job.get('save') for job in jobs]
+    assert all(result['seconds'] >= 0 for result in results)
+
+    # Exceptions, and the argparse messages of invalid options
+    assert results[1]['error'] == 'ValueError: The iteration limit must be positive'
+    assert results[2]['error'].endswith("argument --focus: invalid complex value: 'nowhere'")
+    assert results[3]['error'].endswith('the following arguments are required: --save')
+    assert 'error' not in results[0] and 'error' not in results[4]
+
+    assert np.array_equal(np.load(jobs[0]['save']), render_counts(0.25 + 0.5j, 100))
+    assert np.array_equal(np.load(jobs[4]['save']), render_counts(0j, 64))
@@ -0,0 +1,51 @@
+"""
+Checks the double-double kernels against the float64 ones, and that they use
+every digit of the focus. Run from the root of the repository:
+
+python -m pytest tests/double_double_test.py
+"""
+
+from src.generator import JuliaGenerator, MandelbrotGenerator
+from decimal import Decimal
+import numpy as np
+
+# Shallow enough for float64 to give the exact counts
+VIEWS = [
+    lambda **kwargs: MandelbrotGenerator(focus=0j, zoom=0, resolution=(480, 270), framerate=-1, iterations=256,
+                                         **kwargs),
+    lambda **kwargs: MandelbrotGenerator(focus=-0.75 + 0.05j, zoom=2, resolution=(241, 135), framerate=-1,
+                                         iterations=256, **kwargs),
+    lambda **kwargs: JuliaGenerator(focus=0.1 - 0.07j, zoom=1, resolution=(233, 141), framerate=-1, iterations=256,
+                                    c=0.285 + 0.01j, **kwargs),
+]
+
+# More digits than a float64 holds
+FOCUS = '-0.743643887037158704752191506114774+0.131825904205311970493132056385139j'
+
+
+def render(view, **kwargs):
+    generator = view(**kwargs)
+    generator.generate()
+    return generator.arr
+
+
+def test_double_double_matches_float64():
+    for view in VIEWS:
+        for interior_check in (True, False):
+            assert np.array_equal(render(view, precision='double-double', interior_check=interior_check),
+                                  render(view, precision='float64', interior_check=interior_check))
+
+
+def test_focus_digits_are_kept():
+    generator = MandelbrotGenerator(focus=FOCUS, zoom=50, resolution=(64, 36), framerate=-1, iterations=8192,
+                                    precision='double-double')
+    assert generator._focus_decimal == (Decimal('-0.743643887037158704752191506114774'),
+                                        Decimal('0.131825904205311970493132056385139'))
+
+    # The float64 focus is a third of a pixel away at this zoom, which moves
+    # nearly every count of such a detailed view
+    generator.generate()
+    rounded = MandelbrotGenerator(focus=complex(FOCUS), zoom=50, resolution=(64, 36), framerate=-1,
+                                  iterations=8192, precision='double-double')
+    rounded.generate()
+    assert np.count_nonzero(generator.arr != rounded.arr) > generator.arr.size // 2
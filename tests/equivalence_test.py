@@ -0,0 +1,228 @@
+"""
+Checks that the render paths that promise the output of a plain render
+deliver it exactly. Run from the root of the repository:
+
+python -m pytest tests/equivalence_test.py
+"""
+
+from src.color_functions import build_palette, color_function_dict
+from src import kernels
+from src.generator import JuliaGenerator, MandelbrotGenerator
+from src.zoom import ExponentialZoom, zoom_frames
+from tests.precision_test import neighbour_range
+from numba import jit
+import numpy as np
+
+# Fraction of the pixels that subdivision may fill with a wrong count
+MAX_SUBDIVISION_DIFFERENT = 0.001
+
+# Fraction of the pixels of zoom frames that may differ from a direct render,
+# and that may fall outside the range of their neighbourhood in it
+MAX_ZOOM_DIFFERENT = 0.002
+MAX_ZOOM_OUTSIDE = 0.0001
+
+# Views straddling the axes, centered on them or not, at even and odd sizes
+VIEWS = [
+    lambda **kwargs: MandelbrotGenerator(focus=0j, zoom=0, resolution=(480, 270), framerate=-1, iterations=256,
+                                         **kwargs),
+    lambda **kwargs: MandelbrotGenerator(focus=-0.75 + 0.05j, zoom=2, resolution=(241, 135), framerate=-1,
+                                         iterations=256, **kwargs),
+    lambda **kwargs: JuliaGenerator(focus=0j, zoom=0, resolution=(320, 180), framerate=-1, iterations=256,
+                                    c=-0.4 + 0.6j, **kwargs),
+    lambda **kwargs: JuliaGenerator(focus=0.1 - 0.07j, zoom=1, resolution=(233, 141), framerate=-1, iterations=256,
+                                    c=0.285 + 0.01j, **kwargs),
+]
+
+# Zooms that are cheaper to resample, and zooms that aren't: a float32 one,
+# a mostly boundary one, and one that crosses into double-double
+RESAMPLED_ZOOMS = [
+    lambda: MandelbrotGenerator(focus=-0.7435 + 0.1314j, zoom=384, resolution=(320, 180), framerate=24,
+                                iterations=5000),
+]
+RENDERED_ZOOMS = [
+    lambda: MandelbrotGenerator(focus=-0.743643887037151 + 0.13182590420533j, zoom=0, resolution=(160, 90),
+                                framerate=24, iterations=512),
+    lambda: JuliaGenerator(focus=0.1 - 0.07j, zoom=0, resolution=(233, 141), framerate=24, iterations=256,
+                           c=-0.4 + 0.6j, precision='float64'),
+    lambda: MandelbrotGenerator(focus='-0.743643887037158704752191506114774+0.131825904205311970493132056385139j',
+                                zoom=905, resolution=(120, 90), framerate=24, speed=1, iterations=512),
+]
+
+ZOOMS = [
+    lambda: MandelbrotGenerator(focus=-0.743643887037151 + 0.13182590420533j, zoom=0, resolution=(320, 180),
+                                framerate=24, iterations=512, precision='float64'),
+    lambda: JuliaGenerator(focus=0.1 - 0.07j, zoom=0, resolution=(233, 141), framerate=24, iterations=256,
+                           c=-0.4 + 0.6j, precision='float64'),
+]
+
+
+def render(view, **kwargs):
+    generator = view(**kwargs)
+    generator.generate()
+    return generator
+
+
+def reference(generator):
+    """
+    :return: Iteration array of the generator's view, computed pixel by pixel
+    on the grid spanning its bounds.
+    """
+
+    width, height = generator._resolution
+    min_x, max_x, min_y, max_y = generator.range_from_resolution(generator._resolution, generator.zoom,
+                                                                 generator._focus, generator.framerate,
+                                                                 generator.speed)
+    x_step, y_step = (max_x - min_x) / width, (max_y - min_y) / height
+
+    arr = np.zeros((width, height), dtype=np.int64)
+    for x in range(width):
+        for y in range(height):
+            z = complex(min_x + x * x_step, min_y + y * y_step)
+            if isinstance(generator, JuliaGenerator):
+                arr[x, y] = kernels.compute_julia(z, generator._c, generator.iterations, generator.interior_check)
+            else:
+                arr[x, y] = kernels.compute_mandelbrot(z, generator.iterations, generator.interior_check)
+    return arr
+
+
+@jit(nopython=True)
+def baseline_escape(z, c, max_iter):
+    # The escape loop of the first version of the generators
+    for i in range(max_iter):
+        if z.real * z.real + z.imag * z.imag > 4:
+            return i
+        z = z * z + c
+    return max_iter
+
+
+@jit(nopython=True)
+def baseline_set(arr, min_x, max_x, min_y, max_y, iterations, julia, c):
+    # The pixel loop of the first version of the generators
+    height = arr.shape[0]
+    width = arr.shape[1]
+    x_pixel = (max_x - min_x) / height
+    y_pixel = (max_y - min_y) / width
+    for x in range(height):
+        re = min_x + x * x_pixel
+        for y in range(width):
+            im = min_y + y * y_pixel
+            z = complex(re, im)
+            arr[x, y] = baseline_escape(z, c if julia else z, iterations)
+
+
+def test_mirrored_matches_reference():
+    for view in VIEWS:
+        mirrored = render(view, precision='float64')
+
+        assert np.array_equal(mirrored.arr, reference(mirrored))
+
+
+def test_mirrored_matches_full_render():
+    for view in VIEWS[:1] + VIEWS[2:3]:
+        assert render(view, precision='float64').mirrored_pixels > 0
+
+    for view in VIEWS:
+        for precision in ('float64', 'float32'):
+            mirrored = render(view, precision=precision)
+            full = render(view, precision=precision, symmetry=False)
+
+            assert np.array_equal(mirrored.arr, full.arr)
+
+
+def test_fused_matches_two_pass():
+    palette = build_palette(color_function_dict['sin'], 256)
+    for view in VIEWS:
+        for precision in ('auto', 'float64'):
+            two_pass = palette[render(view, precision=precision).arr.T]
+            assert np.array_equal(view(precision=precision).generate_rgb(palette), two_pass)
+
+
+def test_subdivision_matches_full_render():
+    for view in VIEWS:
+        different, computed, total = view(precision='float64', subdivide=True).compare_subdivision()
+
+        assert different <= MAX_SUBDIVISION_DIFFERENT * total
+        assert computed < total
+
+
+def test_progressive_matches_generate():
+    for view in VIEWS:
+        for precision in ('auto', 'float64'):
+            steps, previews = zip(*((step, preview.copy()) for step, preview in
+                                    view(precision=precision).generate_progressive()))
+
+            assert steps == (8, 4, 2, 1)
+            assert np.array_equal(previews[-1], render(view, precision=precision).arr)
+
+
+def test_resumed_matches_full_render():
+    for view in VIEWS:
+        resumed = view(precision='float64', resumable=True)
+        resumed.iterations = 64
+        resumed.generate()
+        resumed.iterations = 256
+        resumed.generate()
+
+        assert 0 < resumed.resumed_pixels < resumed.arr.size
+        assert np.array_equal(resumed.arr, render(view, precision='float64').arr)
+
+
+def test_zoom_matches_direct_renders():
+    for view in ZOOMS:
+        frames = list(ExponentialZoom(view(), 48))
+        generator = view()
+        for index in range(0, 48, 6):
+            generator.zoom = index
+            generator.generate()
+            low, high = neighbour_range(generator.arr)
+
+            assert np.count_nonzero(frames[index] != generator.arr) <= MAX_ZOOM_DIFFERENT * generator.arr.size
+            assert np.count_nonzero((frames[index] < low) | (frames[index] > high)) \
+                <= MAX_ZOOM_OUTSIDE * generator.arr.size
+
+
+def test_zoom_frames_match_generate():
+    for view in RENDERED_ZOOMS:
+        generator = view()
+        frames = list(zoom_frames(generator, 48, 0, 12))
+        start_zoom = generator.zoom
+        for index, frame in enumerate(frames):
+            generator.zoom = start_zoom + index
+            generator.generate()
+            assert np.array_equal(frame, generator.arr)
+
+
+def test_zoom_frames_resample_when_cheaper(monkeypatch):
+    resampled = []
+    frame = ExponentialZoom.frame
+    monkeypatch.setattr(ExponentialZoom, 'frame', lambda zoom, index: resampled.append(index) or frame(zoom, index))
+
+    for view in RESAMPLED_ZOOMS:
+        frames = list(zoom_frames(view(), 48))
+        # The first frame is rendered, to predict the cost of the others
+        assert resampled == list(range(1, 48))
+
+        generator = view()
+        generator.zoom += 47
+        generator.generate()
+        assert np.count_nonzero(frames[47] != generator.arr) <= MAX_ZOOM_DIFFERENT * generator.arr.size
+        resampled.clear()
+
+    # The double-double zoom never gets as far as predicting the cost
+    for view in RENDERED_ZOOMS[:2]:
+        list(zoom_frames(view(), 48))
+        assert resampled == []
+
+
+def test_no_interior_check_matches_baseline():
+    for view in VIEWS:
+        for symmetry in (True, False):
+            generator = render(view, precision='float64', interior_check=False, symmetry=symmetry)
+            julia = isinstance(generator, JuliaGenerator)
+
+            arr = np.zeros(generator._resolution, dtype=np.uint16)
+            baseline_set(arr, *generator.range_from_resolution(generator._resolution, generator.zoom,
+                                                               generator._focus, generator.framerate,
+                                                               generator.speed),
+                         generator.iterations, julia, generator._c if julia else 0j)
+            assert np.array_equal(generator.arr, arr)
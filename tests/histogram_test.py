@@ -0,0 +1,67 @@
+"""
+Checks histogram equalization: the cumulative distribution it colors by, and
+the palette frozen across the frames of a sequence. Run from the root of the
+repository:
+
+python -m pytest tests/histogram_test.py
+"""
+
+from src import color_functions
+from src.generator import MandelbrotGenerator
+from src.imager import Imager
+from src.zoom import zoom_frames
+import numpy as np
+import pytest
+
+FRAMES = 4
+
+
+def view():
+    return MandelbrotGenerator(focus=-0.743643887037151 + 0.13182590420533j, zoom=0, resolution=(160, 90),
+                               framerate=4, iterations=256)
+
+
+def test_cumulative_distribution():
+    arr = np.array([[1, 1, 2], [3, 4, 4]], dtype=np.uint8)
+    counts = color_functions.histogram(arr, 4)
+    assert counts.tolist() == [0, 2, 1, 1, 2]
+    # Fraction of the escaped pixels that escaped in fewer iterations
+    assert color_functions.cumulative_distribution(counts, 4).tolist() == [0, 0, 0.5, 0.75, 1]
+
+    # Nothing escaped
+    assert color_functions.cumulative_distribution(np.array([0, 0, 5]), 2).tolist() == [0, 0, 0]
+
+
+def test_colors_are_equalized():
+    generator = view()
+    generator.generate()
+    arr, iterations = generator.arr, generator.iterations
+    cdf = color_functions.frame_kwargs(arr, color_functions.histogram_colorize, iterations)['cdf']
+
+    # Every escaped pixel is colored by the fraction of those escaping sooner
+    escaped = arr[arr < iterations]
+    for count in np.unique(escaped):
+        assert cdf[count] == pytest.approx(np.mean(escaped < count))
+
+    rgb = color_functions.colorize(arr, color_functions.histogram_colorize, iterations)
+    palette = color_functions.build_palette(color_functions.histogram_colorize, iterations, cdf=cdf)
+    assert np.array_equal(rgb, palette[arr.T])
+    assert np.all(rgb[arr.T == iterations] == 0)
+
+
+def test_frozen_histogram():
+    arrs = list(zoom_frames(view(), FRAMES))
+    palettes = [color_functions.build_palette(color_functions.histogram_colorize, 256,
+                                              **color_functions.frame_kwargs(arr, color_functions.histogram_colorize,
+                                                                             256))
+                for arr in arrs]
+
+    frozen = list(Imager(view()).generate_zoom(FRAMES, 'histogram', freeze_histogram=True, rgb=True))
+    equalized = list(Imager(view()).generate_zoom(FRAMES, 'histogram', rgb=True))
+
+    for arr, palette, frozen_rgb, equalized_rgb in zip(arrs, palettes, frozen, equalized):
+        # Every frame uses the palette of the first one, or its own
+        assert np.array_equal(frozen_rgb, palettes[0][arr.T])
+        assert np.array_equal(equalized_rgb, palette[arr.T])
+
+    assert not np.array_equal(palettes[0], palettes[-1])
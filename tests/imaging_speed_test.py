@@ -1,34 +1,341 @@
-from src.generator import JuliaGenerator, MandelbrotGenerator
+"""
+Benchmark suite. Every scene is timed stage by stage (kernel, colorization,
+PNG encoding, and the whole pipeline), and the results can be saved as JSON
+and compared against an earlier run. Run from the root of the repository:
+
+PYTHONPATH=. python tests/imaging_speed_test.py --json baseline.json
+PYTHONPATH=. python tests/imaging_speed_test.py --compare baseline.json
+
+The run fails if the startup time misses STARTUP_TARGET.
+"""
+
+from src.generator import DeepMandelbrotGenerator, JuliaGenerator, MandelbrotGenerator
 from src.imager import Imager
+from src.zoom import ExponentialZoom, zoom_frames
+from src import color_functions
+from PIL import Image
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
 import time
-import matplotlib.pyplot as plt
+import numba
+import numpy as np
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'mandelbrot-set.py')
+C_REFERENCE = os.path.join(ROOT, 'tests', 'mandelbrot_test.c')
 
-def time_gen_res(resolution, show_image=False):
-    curr_time = time.process_time()
+# Seconds from launching the command line program to a rendered thumbnail,
+# once the kernels are cached on disk.
+STARTUP_TARGET = 1.0
 
-    generator = MandelbrotGenerator(focus=-0.761574-0.0847596j, zoom=12, resolution=resolution)
-    imager = Imager(generator)
-    image = imager.generate_image(color_type='linear', cutoff=None)
-    if show_image:
-        image.show()
-    return time.process_time() - curr_time
+# Relative slowdown tolerated by --compare before a metric is a regression.
+TOLERANCE = 0.1
 
+SCENES = {
+    # Mostly escapes within a few iterations
+    'exterior': lambda resolution: MandelbrotGenerator(
+        focus=0.6 + 0.6j, zoom=1, resolution=resolution, framerate=-1, iterations=1024),
+    # The period-3 bulb, which the analytic interior check doesn't cover
+    'interior': lambda resolution: MandelbrotGenerator(
+        focus=-0.122 + 0.745j, zoom=5, resolution=resolution, framerate=-1, iterations=1024),
+    'deep': lambda resolution: DeepMandelbrotGenerator(
+        focus='-1.7499637662000000000000000000001+0.0000000000000000000000000000001j', zoom=80,
+        resolution=resolution, framerate=-1, iterations=2048),
+    'julia': lambda resolution: JuliaGenerator(
+        focus=0j, zoom=0, resolution=resolution, framerate=-1, iterations=1024, c=-0.4 + 0.6j),
+}
+
+
+ZOOMS = {
+    # Mostly boundary, cheaper to render frame by frame
+    'seahorse': lambda resolution: MandelbrotGenerator(
+        focus=-0.743643887037151 + 0.13182590420533j, zoom=0, resolution=resolution, framerate=24,
+        iterations=512, precision='float64'),
+    # Slowly escaping points around a spiral, cheaper to resample
+    'spiral': lambda resolution: MandelbrotGenerator(
+        focus=-0.7435 + 0.1314j, zoom=384, resolution=resolution, framerate=24, iterations=5000,
+        precision='float64'),
+}
+
+
+def best_time(function, repeat):
+    """
+    :return: Shortest time of repeat calls to function, in seconds.
+    """
+
+    times = []
+    for _ in range(repeat):
+        curr_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - curr_time)
+    return min(times)
+
+
+def encode(rgb):
+    Image.fromarray(rgb).save(io.BytesIO(), format='PNG')
+
+
+def time_scene(name, resolution, repeat):
+    generator = SCENES[name](resolution)
+    pixels = resolution[0] * resolution[1]
+    color_function = color_functions.color_function_dict['linear']
+
+    generator.generate()
+    kernel = best_time(generator.generate, repeat)
+    colorize = best_time(lambda: color_functions.colorize(generator.arr, color_function, generator.iterations),
+                         repeat)
+    rgb = color_functions.colorize(generator.arr, color_function, generator.iterations)
+    encoding = best_time(lambda: encode(rgb), repeat)
+    end_to_end = best_time(lambda: Imager(generator).generate_image('linear', cutoff=None)
+                           .save(io.BytesIO(), format='PNG'), repeat)
+
+    return {
+        'kernel_seconds': kernel,
+        'kernel_mpixels_per_second': pixels / kernel / 1e6,
+        'colorize_seconds': colorize,
+        'encode_seconds': encoding,
+        'end_to_end_seconds': end_to_end,
+        'cold_kernel_seconds': time_cold(name, resolution),
+    }
+
+
+def time_cold(name, resolution):
+    """
+    Times the first render of a scene in a new process, with an empty kernel
+    cache, so the compilation of the kernels is included.
+    """
+
+    with tempfile.TemporaryDirectory() as cache:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--cold', name,
+                                 '-r', str(resolution[0]), str(resolution[1])],
+                                env=dict(os.environ, NUMBA_CACHE_DIR=cache, PYTHONPATH=ROOT),
+                                check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return float(output.split()[-1])
+
+
+def cold_render(name, resolution):
+    curr_time = time.perf_counter()
+    SCENES[name](resolution).generate()
+    print(time.perf_counter() - curr_time)
+
+
+def time_startup(runs=3):
+    # The first run would include the compilation of the kernels
+    subprocess.run([sys.executable, SCRIPT, '--warmup'], check=True, stdout=subprocess.DEVNULL)
 
-def main():
     times = []
-    resolutions = []
-    for i in range(0, 6):
-        resolution = (120 * 2 ** i, int(67.5 * 2 ** i))
-        resolutions.append(resolution)
-        time_to_generate = time_gen_res(resolution)
-        print(time_to_generate)
-        times.append(time_to_generate)
-
-    res_arr = [i[0] * i[1] for i in resolutions]
-
-    plt.plot(res_arr, times, 'ro', res_arr, times)
-    plt.show()
+    for _ in range(runs):
+        curr_time = time.perf_counter()
+        subprocess.run([sys.executable, SCRIPT, '-m', '-f', '0', '-r', '160', '90', '--hide'], check=True)
+        times.append(time.perf_counter() - curr_time)
+    return min(times)
+
+
+def time_c_reference(resolution, repeat):
+    """
+    Compiles tests/mandelbrot_test.c and renders the exterior scene with it,
+    next to the python kernel on a single thread without the interior check,
+    which does exactly the same work.
+
+    :return: Dictionary of results, or None if no C compiler is available.
+    """
+
+    generator = SCENES['exterior'](resolution)
+    generator.workers, generator.interior_check, generator.precision = 1, False, 'float64'
+    # The C reference computes every pixel, even in views that could be mirrored
+    generator.symmetry = False
+    bounds = generator.range_from_resolution(resolution, generator.zoom, generator._focus, -1)
+    grid = generator._pixel_grid(*bounds)
+    pixels = resolution[0] * resolution[1]
+
+    with tempfile.TemporaryDirectory() as directory:
+        executable = os.path.join(directory, 'mandelbrot_test')
+        try:
+            subprocess.run(['cc', '-O2', '-o', executable, C_REFERENCE], check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+        times = []
+        for _ in range(repeat):
+            output = subprocess.run([executable] + [str(value) for value in
+                                                    tuple(resolution) + (generator.iterations,) + grid],
+                                    check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+            times.append(float(re.search(r'in ([0-9.]+) seconds', output).group(1)))
+
+    generator.generate()
+    python = best_time(generator.generate, repeat)
+    c = min(times)
+
+    return {
+        'c_mpixels_per_second': pixels / c / 1e6,
+        'python_mpixels_per_second': pixels / python / 1e6,
+        'python_to_c_ratio': c / python,
+    }
+
+
+def time_zoom(name, resolution, frames=48):
+    """
+    Renders a zoom with zoom_frames(), with ExponentialZoom alone, and frame
+    by frame with generate(), and compares the frames of the first two with
+    those of generate().
+
+    :return: Dictionary of results.
+    """
+
+    def make_generator():
+        return ZOOMS[name](resolution)
+
+    # Compiles the kernels of every path
+    ExponentialZoom(make_generator(), 2).frame(1)
+    make_generator().generate()
+
+    curr_time = time.perf_counter()
+    sequence = list(zoom_frames(make_generator(), frames))
+    sequence_seconds = time.perf_counter() - curr_time
+
+    zoom = ExponentialZoom(make_generator(), frames)
+    curr_time = time.perf_counter()
+    resampled = list(zoom)
+    resampled_seconds = time.perf_counter() - curr_time
+
+    generator = make_generator()
+    start_zoom = generator.zoom
+    equal = resampled_equal = 0
+    curr_time = time.perf_counter()
+    for index in range(frames):
+        generator.zoom = start_zoom + index
+        generator.generate()
+        equal += np.count_nonzero(generator.arr == sequence[index])
+        resampled_equal += np.count_nonzero(generator.arr == resampled[index])
+    direct_seconds = time.perf_counter() - curr_time
+
+    pixels = frames * resolution[0] * resolution[1]
+    return {
+        'sequence_seconds': sequence_seconds,
+        'resampled_seconds': resampled_seconds,
+        'direct_seconds': direct_seconds,
+        'computed_fraction': zoom.computed_pixels / pixels,
+        'equal_fraction': equal / pixels,
+        'resampled_equal_fraction': resampled_equal / pixels,
+    }
+
+
+def run(resolution, repeat, scenes):
+    results = {
+        'python': platform.python_version(),
+        'numba': numba.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cores': os.cpu_count(),
+        'resolution': list(resolution),
+        'startup_seconds': time_startup(),
+        'startup_target_seconds': STARTUP_TARGET,
+        'scenes': {},
+        'c_reference': time_c_reference(resolution, repeat),
+        'zooms': {name: time_zoom(name, resolution) for name in ZOOMS},
+    }
+
+    for name in scenes:
+        results['scenes'][name] = time_scene(name, resolution, repeat)
+
+    return results
+
+
+def metrics(results):
+    """
+    Flattens results to {name: (value, higher_is_better)}.
+    """
+
+    flat = {'startup_seconds': (results['startup_seconds'], False)}
+    for scene, values in results['scenes'].items():
+        for key, value in values.items():
+            flat['{}.{}'.format(scene, key)] = (value, key.endswith('per_second'))
+    for zoom, values in results.get('zooms', {}).items():
+        flat['zoom_{}.sequence_seconds'.format(zoom)] = (values['sequence_seconds'], False)
+        flat['zoom_{}.equal_fraction'.format(zoom)] = (values['equal_fraction'], True)
+    return flat
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Prints every metric next to its baseline, flagging the ones that got more
+    than tolerance worse.
+
+    :return: List of regressed metrics.
+    """
+
+    regressions = []
+    old = metrics(baseline)
+    print('{:<40} {:>12} {:>12} {:>8}'.format('metric', 'baseline', 'current', 'change'))
+    for name, (value, higher_is_better) in sorted(metrics(results).items()):
+        if name not in old:
+            continue
+        reference = old[name][0]
+        change = (value - reference) / reference if reference else 0.0
+        regressed = -change > tolerance if higher_is_better else change > tolerance
+        if regressed:
+            regressions.append(name)
+        print('{:<40} {:>12.4f} {:>12.4f} {:>+8.1%} {}'.format(
+            name, reference, value, change, 'REGRESSION' if regressed else ''))
+
+    return regressions
+
+
+def missed_targets(results):
+    """
+    Prints the targets that the results miss.
+
+    :return: List of missed targets.
+    """
+
+    missed = []
+    if results['startup_seconds'] > results['startup_target_seconds']:
+        missed.append('startup_seconds')
+        print('startup_seconds {:.4f} misses its target of {:.4f}'.format(results['startup_seconds'],
+                                                                         results['startup_target_seconds']))
+    return missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the generators.')
+    parser.add_argument('-r', '--resolution', nargs=2, type=int, default=[640, 360])
+    parser.add_argument('--repeat', help='Runs per measure, the best is kept.', type=int, default=3)
+    parser.add_argument('--scenes', nargs='+', choices=SCENES.keys(), default=list(SCENES.keys()))
+    parser.add_argument('--json', help='Saves the results as FILE.', metavar='FILE')
+    parser.add_argument('--compare', help='Compares the results to a saved baseline, and exits with status 1 '
+                                          'if any metric regressed.', metavar='BASELINE')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--cold', help=argparse.SUPPRESS, choices=SCENES.keys())
+    args = parser.parse_args()
+
+    if args.cold is not None:
+        cold_render(args.cold, args.resolution)
+        return
+
+    results = run(args.resolution, args.repeat, args.scenes)
+
+    if args.json is not None:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare is None:
+        print(json.dumps(results, indent=2))
+        regressions = []
+    else:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print('{} metrics regressed'.format(len(regressions)))
+
+    if missed_targets(results) or regressions:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
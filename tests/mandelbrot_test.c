@@ -1,36 +1,71 @@
 #include <stdio.h>
+#include <stdlib.h>
 #include <time.h>
-#include <complex.h>
+
+/*
+ * Speed of light reference for the python kernels: renders the same pixel grid
+ * as MandelbrotGenerator (without the interior check) on a single thread.
+ *
+ * Usage: mandelbrot_test [width height max_iter min_x x_step min_y y_step]
+ */
 
 #define WIDTH 1920
 #define HEIGHT 1080
 
 
-int compute_mandelbrot(float real, float imag, int max_iter)
+int compute_mandelbrot(double real, double imag, int max_iter)
 {
-    float creal = real;
-    float cimag = imag;
-    for (size_t i = 0; i < max_iter; i++)
+    double creal = real;
+    double cimag = imag;
+    for (int i = 0; i < max_iter; i++)
     {
         if (real * real + imag * imag > 4)
         {
             return i;
         }
-        real = real * real - imag * imag + creal;
-        imag = (real * imag * 2 + cimag);
+        double next_real = real * real - imag * imag + creal;
+        imag = real * imag * 2 + cimag;
+        real = next_real;
     }
     return max_iter;
 }
 
 
-int main()
+int main(int argc, char *argv[])
 {
-    int numberOfPixels = WIDTH * HEIGHT;
+    int width = WIDTH, height = HEIGHT, max_iter = 1024;
+    double min_x = -2 - 2 * (double) (WIDTH - HEIGHT) / HEIGHT, min_y = -2;
+    double x_step = -2 * min_x / WIDTH, y_step = 4.0 / HEIGHT;
+
+    if (argc == 8)
+    {
+        width = atoi(argv[1]);
+        height = atoi(argv[2]);
+        max_iter = atoi(argv[3]);
+        min_x = atof(argv[4]);
+        x_step = atof(argv[5]);
+        min_y = atof(argv[6]);
+        y_step = atof(argv[7]);
+    }
+    else if (argc != 1)
+    {
+        fprintf(stderr, "Usage: %s [width height max_iter min_x x_step min_y y_step]\n", argv[0]);
+        return 1;
+    }
+
+    long long total = 0;
     clock_t programTime = clock();
-    for (size_t i = 0; i < numberOfPixels; i++)
+    for (int x = 0; x < width; x++)
     {
-        compute_mandelbrot(0, 0, 1024);
+        for (int y = 0; y < height; y++)
+        {
+            total += compute_mandelbrot(min_x + x * x_step, min_y + y * y_step, max_iter);
+        }
     }
     programTime = clock() - programTime;
-    printf("%d pixels computed in %f seconds\n", numberOfPixels, (float) programTime / CLOCKS_PER_SEC);
+
+    /* The total keeps the loop from being optimized away, and checks the result */
+    printf("%d pixels computed in %f seconds, %lld iterations\n", width * height,
+           (double) programTime / CLOCKS_PER_SEC, total);
+    return 0;
 }
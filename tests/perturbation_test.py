@@ -0,0 +1,40 @@
+"""
+Checks the perturbation renders of --deep against the double-double kernels,
+at zooms both can render. Run from the root of the repository:
+
+python -m pytest tests/perturbation_test.py
+"""
+
+from src.generator import DeepMandelbrotGenerator, MandelbrotGenerator
+import numpy as np
+
+# Focus, zoom and fraction of pixels allowed to differ. Pixels iterated
+# thousands of times along the boundary are chaotic: the rounding of float64
+# differences can still move a few of their counts, which double-double
+# precision doesn't.
+VIEWS = [
+    ('-0.743643887037158704752191506114774+0.131825904205311970493132056385139j', 40, 0.002),
+    ('-1.25066+0.02012j', 38, 0),
+    ('-1.768778833+0.001738996j', 40, 0),
+]
+
+
+def render(generator):
+    generator.generate()
+    return generator.arr
+
+
+def test_deep_matches_double_double():
+    for focus, zoom, max_different in VIEWS:
+        options = dict(focus=focus, zoom=zoom, resolution=(120, 90), framerate=-1, iterations=4096)
+        reference = render(MandelbrotGenerator(precision='double-double', interior_check=False, **options))
+
+        different = []
+        for series_approximation in (False, True):
+            generator = DeepMandelbrotGenerator(series_approximation=series_approximation, **options)
+            different.append(np.count_nonzero(render(generator) != reference))
+            assert different[-1] <= max_different * reference.size
+
+        # Skipping iterations doesn't move more counts than iterating them
+        assert generator.skipped_iterations > 100
+        assert different[1] <= different[0]
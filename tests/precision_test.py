@@ -0,0 +1,80 @@
+"""
+Checks the automatic choice of arithmetic, and that the float32 kernels agree
+with the float64 ones. Run from the root of the repository:
+
+python -m pytest tests/precision_test.py
+"""
+
+from src.generator import JuliaGenerator, MandelbrotGenerator
+import numpy as np
+
+# The default view of the command line program, and a thumbnail of a julia set
+VIEWS = [
+    lambda **kwargs: MandelbrotGenerator(focus=0j, zoom=0, resolution=(1920, 1080), framerate=-1,
+                                         iterations=1024, **kwargs),
+    lambda **kwargs: JuliaGenerator(focus=0j, zoom=0, resolution=(320, 180), framerate=-1, iterations=1024,
+                                    c=-0.4 + 0.6j, **kwargs),
+]
+
+# Fraction of the pixels whose iteration count may differ from float64
+MAX_DIFFERENT = 0.01
+
+# Fraction of the pixels whose iteration count may lie outside the range of
+# their neighbours in float64. float32 moves every point by a tiny fraction of
+# a pixel, which only changes pixels that differ from their neighbours anyway.
+MAX_OUTSIDE_NEIGHBOURS = 0.005
+
+
+def neighbour_range(arr):
+    """
+    :return: Smallest and largest value of every pixel's 3x3 neighbourhood.
+    """
+
+    padded = np.pad(arr.astype(np.int64), 1, mode='edge')
+    width, height = arr.shape
+    shifted = [padded[x:x + width, y:y + height] for x in range(3) for y in range(3)]
+    return np.min(shifted, axis=0), np.max(shifted, axis=0)
+
+
+def render(view, precision):
+    generator = view(precision=precision)
+    generator.generate()
+    return generator.arr.astype(np.int64)
+
+
+def test_auto_selection():
+    for view in VIEWS:
+        assert view().resolve_precision() == 'float32'
+
+    zooms = [MandelbrotGenerator(focus=-0.75 + 0.1j, zoom=zoom, resolution=(3840, 2160), framerate=-1)
+             .resolve_precision() for zoom in (0, 10, 50)]
+    assert zooms == ['float32', 'float64', 'double-double']
+
+
+def test_override():
+    generator = MandelbrotGenerator(focus=-0.75 + 0.1j, zoom=10, resolution=(64, 36), framerate=-1,
+                                    precision='float32')
+    assert generator.resolve_precision() == 'float32'
+
+    for view in VIEWS:
+        assert view(precision='float64').resolve_precision() == 'float64'
+
+
+def test_float32_matches_float64():
+    for view in VIEWS:
+        single = render(view, 'auto')
+        double = render(view, 'float64')
+
+        assert np.mean(single != double) < MAX_DIFFERENT
+
+        low, high = neighbour_range(double)
+        assert np.mean((single < low) | (single > high)) < MAX_OUTSIDE_NEIGHBOURS
+
+
+def test_float32_without_interior_check():
+    for view in VIEWS:
+        single = render(lambda **kwargs: view(interior_check=False, **kwargs), 'float32')
+        double = render(lambda **kwargs: view(interior_check=False, **kwargs), 'float64')
+
+        assert np.mean(single != double) < MAX_DIFFERENT
+
@@ -0,0 +1,51 @@
+"""
+Checks that images streamed to PNG files in strips are identical to those
+rendered in one piece. Run from the root of the repository:
+
+python -m pytest tests/streaming_test.py
+"""
+
+from PIL import Image
+from src.generator import DeepMandelbrotGenerator, JuliaGenerator, MandelbrotGenerator
+from src.imager import Imager
+from src import streaming
+import numpy as np
+
+VIEWS = [
+    # The default view of the command line program, in float32
+    lambda: MandelbrotGenerator(focus=0j, zoom=0, resolution=(1920, 1080), framerate=-1, iterations=1024,
+                                workers=1),
+    lambda: JuliaGenerator(focus=0.1 - 0.07j, zoom=1, resolution=(233, 141), framerate=-1, iterations=256,
+                           c=-0.4 + 0.6j, precision='float64'),
+    lambda: DeepMandelbrotGenerator(focus='-1.25066+0.02012j', zoom=38, resolution=(120, 90), framerate=-1,
+                                    iterations=4096),
+]
+
+
+def test_strips_match_render():
+    generator = VIEWS[0]()
+    generator.generate()
+
+    height = generator.arr.shape[1]
+    strips = np.concatenate([generator.generate_strip(y0, min(y0 + 100, height)) for y0 in range(0, height, 100)],
+                            axis=1)
+    assert np.array_equal(strips, generator.arr)
+
+
+def test_stream_matches_image(tmp_path):
+    for index, view in enumerate(VIEWS):
+        path, raw = str(tmp_path / '{}.png'.format(index)), str(tmp_path / '{}.npy'.format(index))
+        generator = view()
+        width = generator._resolution[0]
+
+        # Strips of 8 rows, the last one shorter
+        memory = 8 * width * (np.dtype(generator.dtype).itemsize + streaming.COLOR_BYTES_PER_PIXEL)
+        for color in ('sin', 'linear'):
+            strips = Imager(generator).stream_image(path, color, memory=memory, raw=raw)
+            assert strips == -(-generator._resolution[1] // 8)
+
+            expected = np.asarray(Imager(generator).generate_image(color, cutoff=None))
+            with Image.open(path) as image:
+                assert image.mode == 'RGB'
+                assert np.array_equal(np.asarray(image), expected)
+            assert np.array_equal(np.load(raw, mmap_mode='r'), generator.arr.T)
@@ -0,0 +1,54 @@
+"""
+Checks that the frames of a julia sweep are the julia sets a generator
+renders for the same values of c. Run from the root of the repository:
+
+python -m pytest tests/sweep_test.py
+"""
+
+from src import sweep
+from src.generator import JuliaGenerator
+from src.imager import Imager
+import numpy as np
+import pytest
+
+OPTIONS = dict(focus=0.1 - 0.07j, zoom=1, resolution=(233, 141), framerate=-1, iterations=256)
+
+
+def render(c, **kwargs):
+    generator = JuliaGenerator(c=c, precision='float64', **dict(OPTIONS, **kwargs))
+    generator.generate()
+    return generator.arr.T
+
+
+def test_frames_match_generator():
+    cs = np.concatenate((sweep.line_path(-0.8 + 0.156j, 0.285 + 0.01j, 6), sweep.circle_path(-0.4 + 0.6j, 0j, 5)))
+    for interior_check in (True, False):
+        julia_sweep = sweep.JuliaSweep(JuliaGenerator(interior_check=interior_check, **OPTIONS))
+        # Batches of 4 frames, the last one shorter
+        frames = list(julia_sweep.frames(cs, batch=4))
+        assert len(frames) == len(cs)
+        for c, frame in zip(cs, frames):
+            assert np.array_equal(frame, render(c, interior_check=interior_check))
+
+
+def test_render_into_out():
+    julia_sweep = sweep.JuliaSweep(JuliaGenerator(**OPTIONS))
+    cs = [-0.4 + 0.6j, 0.285 + 0.01j]
+    out = np.zeros((2,) + OPTIONS['resolution'], dtype=np.uint16)
+
+    frames = julia_sweep.render(cs, out=out)
+    assert np.shares_memory(frames, out)
+    for c, frame in zip(cs, frames):
+        assert np.array_equal(frame, render(c))
+
+    with pytest.raises(ValueError):
+        julia_sweep.render(cs, out=np.zeros((2, 141, 233), dtype=np.uint16).transpose(0, 2, 1))
+
+
+def test_colored_frames_match_images():
+    cs = sweep.line_path(-0.8 + 0.156j, -0.4 + 0.6j, 3)
+    images = Imager(JuliaGenerator(**OPTIONS)).generate_sweep(cs, 'sin', rgb=True)
+    for c, rgb in zip(cs, images):
+        generator = JuliaGenerator(c=c, precision='float64', **OPTIONS)
+        expected = np.asarray(Imager(generator).generate_image('sin', cutoff=None))
+        assert np.array_equal(rgb, expected)
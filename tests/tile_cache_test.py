@@ -0,0 +1,79 @@
+"""
+Checks that cached tiles are the ones that would be rendered, and that the
+cache stays within its size. Run from the root of the repository:
+
+python -m pytest tests/tile_cache_test.py
+"""
+
+from src.generator import JuliaGenerator, MandelbrotGenerator
+from src.tile_cache import TileCache
+import numpy as np
+import os
+
+OPTIONS = dict(focus=-0.75 + 0.1j, zoom=2, resolution=(200, 150), framerate=-1, iterations=256)
+
+
+def render(generator_type=MandelbrotGenerator, cache=None, **kwargs):
+    generator = generator_type(cache=cache, **dict(OPTIONS, **kwargs))
+    generator.generate()
+    return generator.arr
+
+
+def tile(value):
+    return np.full((16, 16), value, dtype=np.uint16)
+
+
+def test_hits_match_render(tmp_path):
+    cache = TileCache(str(tmp_path), tile_size=(64, 64))
+    expected = render()
+
+    assert np.array_equal(render(cache=cache), expected)
+    assert cache.hits == 0 and cache.misses == 12
+
+    assert np.array_equal(render(cache=cache), expected)
+    assert cache.hits == 12 and cache.misses == 12
+
+
+def test_changed_parameters_miss(tmp_path):
+    cache = TileCache(str(tmp_path), tile_size=(64, 64))
+    render(cache=cache)
+    render(JuliaGenerator, cache=cache, c=-0.4 + 0.6j)
+
+    for kwargs in (dict(iterations=300), dict(focus=-0.75 + 0.11j), dict(zoom=3), dict(interior_check=False)):
+        misses = cache.misses
+        assert np.array_equal(render(cache=cache, **kwargs), render(**kwargs))
+        assert cache.misses == misses + 12
+
+    misses = cache.misses
+    assert np.array_equal(render(JuliaGenerator, cache=cache, c=-0.4 + 0.61j),
+                          render(JuliaGenerator, c=-0.4 + 0.61j))
+    assert cache.misses == misses + 12
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    size = TileCache(str(tmp_path / 'size'))
+    size.put('size', tile(0))
+    cache = TileCache(str(tmp_path / 'tiles'), max_bytes=3 * size.stats()['bytes'])
+
+    for name in 'abc':
+        cache.put(name, tile(ord(name)))
+    assert np.array_equal(cache.get('a'), tile(ord('a')))
+
+    cache.put('d', tile(ord('d')))
+    assert cache.get('b') is None
+    assert cache.evictions == 1
+    for name in 'acd':
+        assert np.array_equal(cache.get(name), tile(ord(name)))
+
+
+def test_existing_tiles_are_evicted(tmp_path):
+    cache = TileCache(str(tmp_path))
+    for name in 'abcd':
+        cache.put(name, tile(ord(name)))
+        # Files are ordered by modification time when the cache is opened
+        os.utime(os.path.join(str(tmp_path), name + '.npy'), (ord(name), ord(name)))
+    size = cache.stats()['bytes']
+
+    cache = TileCache(str(tmp_path), max_bytes=size // 2)
+    assert cache.stats()['bytes'] <= size // 2
+    assert sorted(os.listdir(str(tmp_path))) == ['c.npy', 'd.npy']
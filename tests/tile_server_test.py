@@ -0,0 +1,105 @@
+"""
+Checks the renderer of the tile server without starting a server: requests
+for the same tile share one render, the LRU stays within its size, and
+invalid tiles are rejected. Run from the root of the repository:
+
+python -m pytest tests/tile_server_test.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from src.tile_server import MAX_ZOOM, TileLRU, TileRenderer
+import pytest
+import threading
+
+REQUESTS = 8
+
+
+class CountingDict(dict):
+    """
+    Dictionary counting the calls to get(), to tell when every request has
+    looked for a render in progress.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = threading.Semaphore(0)
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        self.lookups.release()
+        return value
+
+
+def test_concurrent_requests_share_one_render():
+    renderer = TileRenderer(threads=2, iterations=64)
+    renderer._in_flight = CountingDict()
+
+    # The render waits until every request has found it in progress
+    render, renders, release = renderer._render, [], threading.Event()
+
+    def blocked_render(key):
+        renders.append(key)
+        assert release.wait(10)
+        return render(key)
+
+    renderer._render = blocked_render
+    try:
+        with ThreadPoolExecutor(max_workers=REQUESTS) as executor:
+            results = [executor.submit(renderer.tile, 'mandelbrot', 2, 1, 2) for _ in range(REQUESTS)]
+            for _ in range(REQUESTS):
+                assert renderer._in_flight.lookups.acquire(timeout=10)
+            release.set()
+            results = [result.result(timeout=10) for result in results]
+
+        assert len(renders) == 1
+        assert sorted(source for _, source in results) == ['coalesced'] * (REQUESTS - 1) + ['render']
+        assert len({data for data, _ in results}) == 1
+        assert renderer.tile('mandelbrot', 2, 1, 2) == (results[0][0], 'hit')
+
+        stats = renderer.stats()
+        assert (stats['renders'], stats['coalesced'], stats['hits'], stats['in_flight']) == (1, REQUESTS - 1, 1, 0)
+    finally:
+        release.set()
+        renderer.close()
+
+
+def test_lru_evicts_by_size():
+    cache = TileLRU(max_bytes=10)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    assert cache.get('a') == b'aaaa'
+
+    cache.put('c', b'cccc')
+    assert cache.get('b') is None
+    assert cache.stats() == {'tiles': 2, 'bytes': 8, 'max_bytes': 10, 'evictions': 1}
+
+    # Replacing a tile counts its new size only
+    cache.put('a', b'aaaaaa')
+    assert cache.stats()['bytes'] == 10 and len(cache) == 2
+
+    # A tile larger than the cache is still kept, alone
+    cache.put('d', b'd' * 20)
+    assert cache.get('d') == b'd' * 20
+    assert cache.stats() == {'tiles': 1, 'bytes': 20, 'max_bytes': 10, 'evictions': 3}
+
+
+def test_invalid_tiles_are_rejected():
+    renderer = TileRenderer(threads=1)
+    try:
+        assert renderer.key('julia', 1, 0, 1, c='-0.4+0.6j') == ('julia', 1, 0, 1, 256, 'linear', -0.4 + 0.6j)
+        assert renderer.key('mandelbrot', MAX_ZOOM, 2 ** MAX_ZOOM - 1, 0, iterations='100', c=1j) == \
+            ('mandelbrot', MAX_ZOOM, 2 ** MAX_ZOOM - 1, 0, 100, 'linear', 0j)
+
+        for z, x, y in ((-1, 0, 0), (MAX_ZOOM + 1, 0, 0), (0, 1, 0), (0, 0, 1), (3, 8, 0), (3, 0, -1)):
+            with pytest.raises(ValueError):
+                renderer.key('mandelbrot', z, x, y)
+
+        for options in (dict(iterations=0), dict(color='histogram'), dict(color='plasma')):
+            with pytest.raises(ValueError):
+                renderer.key('mandelbrot', 0, 0, 0, **options)
+        with pytest.raises(ValueError):
+            renderer.key('burning_ship', 0, 0, 0)
+        with pytest.raises(ValueError):
+            renderer.tile('mandelbrot', 1, 2, 0)
+    finally:
+        renderer.close()
@@ -0,0 +1,69 @@
+"""
+Checks that videos keep the size of their frames, and that encoders that
+stop reading frames are reported. Run from the root of the repository:
+
+python -m pytest tests/video_test.py
+"""
+
+from src import video
+from src.video import VideoWriter
+import numpy as np
+import pytest
+import shutil
+
+imageio = pytest.importorskip('imageio')
+imageio_ffmpeg = pytest.importorskip('imageio_ffmpeg')
+
+# Odd sizes, which most codecs don't accept
+HEIGHT, WIDTH = 37, 65
+
+
+def frames(count=5):
+    y, x = np.mgrid[:HEIGHT, :WIDTH]
+    for index in range(count):
+        rgb = np.stack((x * 255 // WIDTH, y * 255 // HEIGHT, np.full_like(x, index * 40)), axis=-1)
+        yield rgb.astype(np.uint8)
+
+
+def write_and_read(path, ffmpeg):
+    with VideoWriter(str(path), framerate=10, ffmpeg=ffmpeg) as writer:
+        for rgb in frames():
+            writer.write_frame(rgb)
+
+    with imageio.get_reader(str(path)) as reader:
+        return [frame for frame in reader]
+
+
+def test_frames_are_padded(tmp_path, monkeypatch):
+    ffmpeg_frames = write_and_read(tmp_path / 'ffmpeg.mp4', imageio_ffmpeg.get_ffmpeg_exe())
+    monkeypatch.setattr(video.shutil, 'which', lambda name: None)
+    imageio_frames = write_and_read(tmp_path / 'imageio.mp4', None)
+
+    for decoded in (ffmpeg_frames, imageio_frames):
+        assert len(decoded) == 5
+        for rgb, frame in zip(frames(), decoded):
+            # Padded by one black pixel, never scaled
+            assert frame.shape == (HEIGHT + 1, WIDTH + 1, 3)
+            assert np.abs(frame[:HEIGHT, :WIDTH].astype(int) - rgb).mean() < 8
+
+
+def test_gif_keeps_its_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(video.shutil, 'which', lambda name: None)
+    decoded = write_and_read(tmp_path / 'imageio.gif', None)
+    assert [frame.shape[:2] for frame in decoded] == [(HEIGHT, WIDTH)] * 5
+
+
+def test_ffmpeg_exiting_early_raises():
+    # Neither reads its standard input
+    for executable in ('true', 'false'):
+        if shutil.which(executable) is None:
+            pytest.skip('No {} executable'.format(executable))
+
+        writer = VideoWriter('unused.mp4', ffmpeg=shutil.which(executable))
+        rgb = np.zeros((480, 640, 3), dtype=np.uint8)
+        with pytest.raises(RuntimeError):
+            for _ in range(100):
+                writer.write_frame(rgb)
+        with pytest.raises(RuntimeError):
+            writer.write_frame(rgb)
+        writer.close()